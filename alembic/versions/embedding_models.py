@@ -0,0 +1,66 @@
+"""embedding model versions
+
+Revision ID: embedding_models
+Revises: rate_limit_buckets
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'embedding_models'
+down_revision = 'rate_limit_buckets'
+branch_labels = None
+depends_on = None
+
+# Every embedding stored before this revision came from this model.
+LEGACY_MODEL = 'text-embedding-ada-002'
+LEGACY_DIMENSION = 1536
+
+
+def upgrade() -> None:
+    op.add_column('book', sa.Column('embedding_model', sa.String(length=64), nullable=True))
+    op.add_column('book', sa.Column('embedding_dimension', sa.Integer(), nullable=True))
+    op.create_index(op.f('ix_book_embedding_model'), 'book', ['embedding_model'], unique=False)
+    op.execute(
+        sa.text(
+            "UPDATE book SET embedding_model = :model, embedding_dimension = :dimension WHERE embedding IS NOT NULL"
+        ).bindparams(model=LEGACY_MODEL, dimension=LEGACY_DIMENSION)
+    )
+
+    embedding_model = op.create_table(
+        'embeddingmodel',
+        sa.Column('name', sa.String(length=64), nullable=False),
+        sa.Column('dimension', sa.Integer(), nullable=True),
+        sa.Column('status', sa.String(length=16), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.Column('updated_at', sa.DateTime(), nullable=False, server_default=sa.func.now(), onupdate=sa.func.now()),
+        sa.PrimaryKeyConstraint('name')
+    )
+    op.create_index(op.f('ix_embeddingmodel_status'), 'embeddingmodel', ['status'], unique=False)
+    op.bulk_insert(embedding_model, [{'name': LEGACY_MODEL, 'dimension': LEGACY_DIMENSION, 'status': 'active'}])
+
+    op.create_table(
+        'bookembedding',
+        sa.Column('book_id', sa.Integer(), nullable=False),
+        sa.Column('model', sa.String(length=64), nullable=False),
+        sa.Column('dimension', sa.Integer(), nullable=True),
+        sa.Column('embedding', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.Column('updated_at', sa.DateTime(), nullable=False, server_default=sa.func.now(), onupdate=sa.func.now()),
+        sa.ForeignKeyConstraint(['book_id'], ['book.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('book_id', 'model')
+    )
+    op.create_index(op.f('ix_bookembedding_model'), 'bookembedding', ['model'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_bookembedding_model'), table_name='bookembedding')
+    op.drop_table('bookembedding')
+    op.drop_index(op.f('ix_embeddingmodel_status'), table_name='embeddingmodel')
+    op.drop_table('embeddingmodel')
+    op.drop_index(op.f('ix_book_embedding_model'), table_name='book')
+    op.drop_column('book', 'embedding_dimension')
+    op.drop_column('book', 'embedding_model')
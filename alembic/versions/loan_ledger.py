@@ -0,0 +1,57 @@
+"""loan ledger and circulation rollups
+
+Revision ID: loan_ledger
+Revises: overdue_loan_indexes
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'loan_ledger'
+down_revision = 'overdue_loan_indexes'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.create_table(
+        'loanevent',
+        sa.Column('id', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), nullable=False),
+        sa.Column('event_type', sa.String(length=16), nullable=False),
+        sa.Column('book_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('author', sa.String(length=255), nullable=True),
+        sa.Column('occurred_at', sa.DateTime(), nullable=False),
+        sa.Column('due_date', sa.DateTime(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.Column('updated_at', sa.DateTime(), nullable=False, server_default=sa.func.now(), onupdate=sa.func.now()),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_loanevent_book_id'), 'loanevent', ['book_id'], unique=False)
+    op.create_index(op.f('ix_loanevent_user_id'), 'loanevent', ['user_id'], unique=False)
+
+    op.create_table(
+        'circulationrollup',
+        sa.Column('dimension', sa.String(length=16), nullable=False),
+        sa.Column('key', sa.String(length=255), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('borrows', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('created_at', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.Column('updated_at', sa.DateTime(), nullable=False, server_default=sa.func.now(), onupdate=sa.func.now()),
+        sa.PrimaryKeyConstraint('dimension', 'key', 'day')
+    )
+    # Top-N queries read one dimension over a window of days
+    op.create_index('ix_circulationrollup_dimension_day', 'circulationrollup', ['dimension', 'day'], unique=False)
+
+    op.add_column('jobstate', sa.Column('position', sa.BigInteger(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('jobstate', 'position')
+    op.drop_index('ix_circulationrollup_dimension_day', table_name='circulationrollup')
+    op.drop_table('circulationrollup')
+    op.drop_index(op.f('ix_loanevent_user_id'), table_name='loanevent')
+    op.drop_index(op.f('ix_loanevent_book_id'), table_name='loanevent')
+    op.drop_table('loanevent')
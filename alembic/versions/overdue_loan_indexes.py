@@ -0,0 +1,62 @@
+"""overdue loan indexes and scanner state
+
+Revision ID: overdue_loan_indexes
+Revises: initial_migration
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'overdue_loan_indexes'
+down_revision = 'initial_migration'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    # CONCURRENTLY keeps the book table writable while the indexes build; it cannot run inside a transaction.
+    with op.get_context().autocommit_block():
+        # Partial index over loans only: checked-in books have is_available = true and never enter it.
+        # id is included so the overdue report can page by (due_date, id) straight from the index.
+        op.create_index(
+            'ix_book_on_loan_due_date', 'book', ['due_date', 'id'], unique=False,
+            postgresql_where=sa.text('is_available = false'), postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_book_checked_out_by_id_is_available', 'book', ['checked_out_by_id', 'is_available'], unique=False,
+            postgresql_concurrently=True,
+        )
+
+    op.create_table(
+        'jobstate',
+        sa.Column('name', sa.String(length=64), nullable=False),
+        sa.Column('high_water_mark', sa.DateTime(), nullable=True),
+        sa.Column('last_run_at', sa.DateTime(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.Column('updated_at', sa.DateTime(), nullable=False, server_default=sa.func.now(), onupdate=sa.func.now()),
+        sa.PrimaryKeyConstraint('name')
+    )
+    op.create_table(
+        'overdueloan',
+        sa.Column('book_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('due_date', sa.DateTime(), nullable=False),
+        sa.Column('detected_at', sa.DateTime(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.Column('updated_at', sa.DateTime(), nullable=False, server_default=sa.func.now(), onupdate=sa.func.now()),
+        sa.ForeignKeyConstraint(['book_id'], ['book.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('book_id')
+    )
+    op.create_index(op.f('ix_overdueloan_user_id'), 'overdueloan', ['user_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_overdueloan_user_id'), table_name='overdueloan')
+    op.drop_table('overdueloan')
+    op.drop_table('jobstate')
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_book_checked_out_by_id_is_available', table_name='book', postgresql_concurrently=True)
+        op.drop_index('ix_book_on_loan_due_date', table_name='book', postgresql_concurrently=True)
@@ -0,0 +1,24 @@
+"""lower bound for the overdue scanner's late-checkout pass
+
+Revision ID: overdue_scan_window
+Revises: user_read_primary_until
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'overdue_scan_window'
+down_revision = 'user_read_primary_until'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('jobstate', sa.Column('previous_high_water_mark', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('jobstate', 'previous_high_water_mark')
@@ -0,0 +1,24 @@
+"""per-user read-your-writes window
+
+Revision ID: user_read_primary_until
+Revises: embedding_models
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'user_read_primary_until'
+down_revision = 'embedding_models'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('user', sa.Column('read_primary_until', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('user', 'read_primary_until')
@@ -1,22 +1,27 @@
-from typing import Generator
+from typing import AsyncGenerator, Callable, Generator, Optional
 import logging
-from fastapi import Depends, HTTPException, status
+import uuid
+from fastapi import Depends, HTTPException, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2AuthorizationCodeBearer
 from jose import JWTError
 from sqlalchemy.orm import Session
-from google.oauth2 import id_token
-from google.auth.transport import requests
 
 from app.core.config import settings
 from app.crud.crud_user import user as crud_user
-from app.db.session import SessionLocal
+from app.db.replicas import reads_from_primary
+from app.db.session import ReadSessionLocal, SessionLocal
 from app.schemas.user import User as UserSchema, UserCreate
 from app.db.models.user import User as UserModel
+from app.core.request_context import get_request_context
 from app.core.roles import UserRole
+from app.core.sampling_profiler import RequestProfiler, profiling_requested, request_profiles
+from app.schemas.book import BatchSemanticSearchRequest
+from app.services.admission import AdmissionRejected, CostExceedsBurst, search_concurrency, search_rate_limiter
+from app.services.counts import row_counter
+from app.services.warmup import readiness
 
-# Configure logging
 logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.INFO)
 
 oauth2_scheme = OAuth2AuthorizationCodeBearer(
     authorizationUrl="https://accounts.google.com/o/oauth2/v2/auth",
@@ -30,19 +35,28 @@ def get_db() -> Generator:
     finally:
         db.close()
 
+def require_search_index() -> None:
+    """Reject search requests with 503 while the index is still loading at start-up."""
+    if readiness.index_loading:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Search index is loading",
+            headers={"Retry-After": "5"},
+        )
+
 def get_current_user_model(
     db: Session = Depends(get_db),
     token: str = Depends(oauth2_scheme)
 ) -> UserModel:
-    logger.info("Starting user authentication process")
-    
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        logger.info("Attempting to verify Google token")
+        # Google auth libraries are imported on first use to keep start-up fast.
+        from google.oauth2 import id_token
+        from google.auth.transport import requests
         idinfo = id_token.verify_oauth2_token(
             token, requests.Request(), settings.GOOGLE_CLIENT_ID
         )
@@ -51,25 +65,23 @@ def get_current_user_model(
             "accounts.google.com",
             "https://accounts.google.com",
         ]:
-            logger.error(f"Invalid token issuer: {idinfo.get('iss')}")
+            logger.error("Invalid token issuer: %s", idinfo.get('iss'))
             raise credentials_exception
             
         google_id = idinfo["sub"]
         email = idinfo["email"]
-        logger.info(f"Successfully verified Google token for email: {email}")
-        
+
     except JWTError as e:
-        logger.error(f"JWT Error: {str(e)}")
+        logger.error("JWT Error: %s", e)
         raise credentials_exception
     except ValueError as e:
-        logger.error(f"Token verification error: {str(e)}")
+        logger.error("Token verification error: %s", e)
         raise credentials_exception
         
-    logger.info(f"Looking up user with Google ID: {google_id}")
     db_user = crud_user.get_by_google_id(db, google_id=google_id)
     
     if not db_user:
-        logger.info(f"User not found, creating new user with email: {email}")
+        logger.info("Creating user for Google ID %s on first sign-in", google_id)
         try:
             user_in_create = UserCreate(
                 email=email,
@@ -78,18 +90,17 @@ def get_current_user_model(
                 role=UserRole.CUSTOMER,  # Explicitly set default role
                 is_active=True
             )
-            logger.info(f"Created UserCreate object: {user_in_create.model_dump()}")
-            
             db_user = crud_user.create(db, obj_in=user_in_create)
-            logger.info(f"Successfully created new user with ID: {db_user.id}")
+            row_counter.invalidate("user")
+            logger.info("Successfully created new user with ID: %s", db_user.id)
         except Exception as e:
-            logger.error(f"Error creating user: {str(e)}")
+            logger.error("Error creating user: %s", e)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Failed to create user: {str(e)}"
             )
     else:
-        logger.info(f"Found existing user with ID: {db_user.id}")
+        logger.debug("Authenticated user ID %s", db_user.id)
     
     return db_user
 
@@ -100,8 +111,24 @@ def get_current_active_user(
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="Inactive user"
         )
+    request_context = get_request_context()
+    if request_context is not None:
+        # Lets ReadYourWritesMiddleware pin this user's reads after a write.
+        request_context.user_id = current_user_db.id
     return current_user_db
 
+def get_read_db(request: Request, current_user: UserModel = Depends(get_current_active_user)) -> Generator:
+    """
+    Session for read-only routes: a read replica, or the primary while the user's
+    read-your-writes window after their own write is open. Read routes are all
+    authenticated; the user is resolved once per request and shared with the route.
+    """
+    db = ReadSessionLocal(primary=reads_from_primary(request.cookies, current_user.read_primary_until))
+    try:
+        yield db
+    finally:
+        db.close()
+
 def get_current_active_superuser(
     current_user: UserModel = Depends(get_current_active_user),
 ) -> UserModel:
@@ -120,6 +147,105 @@ def get_current_active_librarian_or_superuser(
         )
     return current_user
 
+def _rejected(e: AdmissionRejected) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=str(e),
+        headers={"Retry-After": e.retry_after_header},
+    )
+
+def _charge_search(user: UserModel, cost: int) -> None:
+    try:
+        search_rate_limiter.check(user.id, UserRole(user.role).value, cost)
+    except AdmissionRejected as e:
+        raise _rejected(e)
+    except CostExceedsBurst as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+def _admit_search(user: UserModel, cost: int, admitted: Optional[Callable[[], None]] = None) -> Generator:
+    if cost:
+        _charge_search(user, cost)
+    try:
+        search_concurrency.acquire()
+    except AdmissionRejected as e:
+        raise _rejected(e)
+    try:
+        yield admitted
+    finally:
+        search_concurrency.release()
+
+def admit_semantic_search(current_user: UserModel = Depends(get_current_active_user)) -> Generator:
+    """Rate limit and concurrency gate for one semantic search; 429 with Retry-After when shed."""
+    yield from _admit_search(current_user, 1)
+
+def admit_semantic_search_batch(
+    search_in: BatchSemanticSearchRequest,
+    current_user: UserModel = Depends(get_current_active_user),
+) -> Generator:
+    """
+    As `admit_semantic_search`, charging the rate limit once per query in the batch.
+    The batch size limit is checked first, so an oversized batch costs nothing.
+    """
+    if len(search_in.queries) > settings.SEARCH_BATCH_MAX_QUERIES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.SEARCH_BATCH_MAX_QUERIES} queries per batch",
+        )
+    yield from _admit_search(current_user, len(search_in.queries))
+
+def admit_semantic_search_page(
+    cursor: Optional[str] = None,
+    current_user: UserModel = Depends(get_current_active_user),
+) -> Generator:
+    """
+    As `admit_semantic_search`. A request with a cursor is not charged up front; it yields
+    a callable that the search calls if the cursor is not cached here and the search has
+    to be re-run, so only pages served from a cached cursor are free.
+    """
+    if not cursor:
+        yield from _admit_search(current_user, 1)
+        return
+    yield from _admit_search(current_user, 0, lambda: _charge_search(current_user, 1))
+
+def _authorize_profiling(token: str) -> None:
+    db = SessionLocal()
+    try:
+        get_current_active_superuser(get_current_active_user(get_current_user_model(db, token)))
+    finally:
+        db.close()
+
+async def profile_request(request: Request, response: Response) -> AsyncGenerator:
+    """
+    App-wide dependency: with `X-Profile: 1` or `?profile=1` a superuser gets a sampling
+    profile of this request, fetched by the `X-Profile-Id` response header from
+    `/profiling/requests/{id}`. Anyone else asking gets 401/403; requests without the
+    flag pass straight through.
+    """
+    request_context = get_request_context()
+    if (
+        not settings.PROFILING_ENABLED
+        or request_context is None
+        or not profiling_requested(request.headers, request.query_params)
+    ):
+        yield
+        return
+    token = await oauth2_scheme(request)
+    await run_in_threadpool(_authorize_profiling, token)
+
+    profile_id = uuid.uuid4().hex
+    profiler = RequestProfiler(
+        request_context, settings.PROFILE_SAMPLE_INTERVAL_MS / 1000.0, settings.PROFILE_MAX_SECONDS
+    )
+    response.headers["X-Profile-Id"] = profile_id
+    profiler.start()
+    try:
+        yield
+    finally:
+        # Runs once the response is sent, so serialization is in the profile too.
+        # Off the event loop: stopping joins the sampler and the profile may be written to disk.
+        await run_in_threadpool(lambda: request_profiles.put(profile_id, profiler.stop()))
+        logger.info("Profiled request %s as %s", request_context.correlation_id, profile_id)
+
 def get_current_user_schema(
     current_user_db: UserModel = Depends(get_current_active_user),
 ) -> UserSchema:
@@ -1,5 +1,6 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from typing import List, Optional
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
 import logging
 
@@ -7,34 +8,33 @@ from app.api import deps
 from app.crud import crud_book
 from app.schemas import book as book_schema
 from app.db.models.user import User as UserModel
+from app.core.config import settings
 from app.core.roles import UserRole
+from app.services.counts import row_counter, set_total_headers
+from app.services.index_scheduler import index_scheduler
 from app.services.search_service import search_service
 from app.db.models.book import Book
+from app.utils.cursor import decode_cursor, encode_cursor
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
-def update_faiss_index_background(db_session: Session):
-    logger.info("Scheduling FAISS index rebuild in background.")
-    try:
-        search_service.build_index(db_session)
-        logger.info("FAISS index rebuild completed in background.")
-    except Exception as e:
-        logger.error(f"Error rebuilding FAISS index in background: {e}", exc_info=True)
-    finally:
-        pass
-
 @router.get("/", response_model=List[book_schema.BookPublic])
 def list_books(
-    db: Session = Depends(deps.get_db),
+    response: Response,
+    db: Session = Depends(deps.get_read_db),
     skip: int = 0,
     limit: int = 100,
+    include_total: bool = False,
     current_user: UserModel = Depends(deps.get_current_active_user),
 ) -> List[book_schema.BookPublic]:
     """
-    Retrieve all books.
+    Retrieve all books. With `include_total`, the `X-Total-Count` header carries the
+    number of books, estimated on large tables (see `X-Total-Count-Exact`).
     """
     books_db = crud_book.book.get_multi(db, skip=skip, limit=limit)
+    if include_total:
+        set_total_headers(response, row_counter.count(db, crud_book.book.list_query(db), table="book"))
     return books_db
 
 @router.post("/", response_model=book_schema.Book)
@@ -42,20 +42,20 @@ def create_book(
     *,
     db: Session = Depends(deps.get_db),
     book_in: book_schema.BookCreate,
-    background_tasks: BackgroundTasks,
     current_user: UserModel = Depends(deps.get_current_active_librarian_or_superuser),
 ) -> book_schema.Book:
     """
     Create new book.
     """
     book = crud_book.book.create(db, obj_in=book_in)
-    background_tasks.add_task(update_faiss_index_background, db)
+    row_counter.invalidate("book")
+    index_scheduler.request_rebuild("book created", book.id)
     return book
 
 @router.get("/my-books", response_model=List[book_schema.BookPublic])
 def get_my_checked_out_books(
     *,
-    db: Session = Depends(deps.get_db),
+    db: Session = Depends(deps.get_read_db),
     current_user: UserModel = Depends(deps.get_current_active_user),
     skip: int = 0,
     limit: int = 100,
@@ -67,25 +67,108 @@ def get_my_checked_out_books(
         db, user_id=current_user.id, skip=skip, limit=limit
     )
 
+@router.get("/overdue", response_model=book_schema.OverdueReportPage)
+def get_overdue_books(
+    *,
+    db: Session = Depends(deps.get_read_db),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    current_user: UserModel = Depends(deps.get_current_active_librarian_or_superuser),
+) -> book_schema.OverdueReportPage:
+    """
+    Overdue loans, oldest due date first. Paged with an opaque cursor instead of
+    an offset, so each page is one index range scan however deep it is.
+    """
+    after = None
+    if cursor:
+        try:
+            payload = decode_cursor(cursor)
+            after = (datetime.fromisoformat(payload["due_date"]), int(payload["id"]))
+        except (ValueError, KeyError, TypeError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    now = datetime.utcnow()
+    books = crud_book.book.get_overdue(db, now=now, after=after, limit=limit + 1)
+    page, has_more = books[:limit], len(books) > limit
+    items = [
+        book_schema.OverdueBook(
+            id=b.id, title=b.title, author=b.author, isbn=b.isbn, checked_out_by_id=b.checked_out_by_id,
+            checked_out_at=b.checked_out_at, due_date=b.due_date, days_overdue=(now - b.due_date).days,
+        )
+        for b in page
+    ]
+    next_cursor = None
+    if has_more:
+        last = page[-1]
+        next_cursor = encode_cursor({"due_date": last.due_date.isoformat(), "id": last.id})
+    return book_schema.OverdueReportPage(items=items, next_cursor=next_cursor)
+
 @router.get("/search/{query}", response_model=List[book_schema.BookPublic])
 def search_books(
     *,
-    db: Session = Depends(deps.get_db),
+    db: Session = Depends(deps.get_read_db),
+    response: Response,
     query: str,
     skip: int = 0,
     limit: int = 100,
+    include_total: bool = False,
     current_user: UserModel = Depends(deps.get_current_active_user),
 ) -> List[book_schema.BookPublic]:
     """
-    Search books by title, author, or ISBN.
+    Search books by title, author, or ISBN. `include_total` adds `X-Total-Count`,
+    exact up to `COUNT_EXACT_LIMIT` matches and estimated beyond.
     """
     books_db = crud_book.book.search(db, query=query, skip=skip, limit=limit)
+    if include_total:
+        total = row_counter.count(db, crud_book.book.search_query(db, query=query), table="book", key=("search", query))
+        set_total_headers(response, total)
     return books_db
 
+@router.get("/batch", response_model=book_schema.BookBatch)
+def get_books_batch(
+    *,
+    db: Session = Depends(deps.get_read_db),
+    ids: List[str] = Query(..., description="Book ids, comma-separated and/or repeated"),
+    current_user: UserModel = Depends(deps.get_current_active_user),
+) -> book_schema.BookBatch:
+    """
+    Get several books by id in one query, in the order requested (e.g. `?ids=7,3,12`).
+    Ids with no book are listed in `missing_ids`.
+    """
+    try:
+        book_ids = [int(value) for values in ids for value in values.split(",") if value.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be integers")
+    return _get_books_batch(db, book_ids)
+
+@router.post("/batch", response_model=book_schema.BookBatch)
+def post_books_batch(
+    *,
+    db: Session = Depends(deps.get_read_db),
+    batch_in: book_schema.BookBatchRequest,
+    current_user: UserModel = Depends(deps.get_current_active_user),
+) -> book_schema.BookBatch:
+    """
+    As `GET /batch`, with the ids in the body (`{"ids": [...]}`) for lists too long for a URL.
+    """
+    return _get_books_batch(db, batch_in.ids)
+
+def _get_books_batch(db: Session, book_ids: List[int]) -> book_schema.BookBatch:
+    # Repeated ids are returned once, at their first position.
+    book_ids = list(dict.fromkeys(book_ids))
+    if not book_ids:
+        raise HTTPException(status_code=400, detail="No book ids given")
+    if len(book_ids) > settings.BOOKS_BATCH_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {settings.BOOKS_BATCH_MAX_IDS} ids per batch")
+    books = {book.id: book for book in crud_book.book.get_many(db, book_ids)}
+    return {
+        "items": [books[book_id] for book_id in book_ids if book_id in books],
+        "missing_ids": [book_id for book_id in book_ids if book_id not in books],
+    }
+
 @router.get("/{book_id}", response_model=book_schema.BookPublic)
 def get_book(
     *,
-    db: Session = Depends(deps.get_db),
+    db: Session = Depends(deps.get_read_db),
     book_id: int,
     current_user: UserModel = Depends(deps.get_current_active_user),
 ) -> book_schema.BookPublic:
@@ -97,23 +180,43 @@ def get_book(
         raise HTTPException(status_code=404, detail="Book not found")
     return book
 
+@router.get(
+    "/{book_id}/similar",
+    response_model=List[book_schema.BookSearchResultItem],
+    dependencies=[Depends(deps.require_search_index)],
+)
+def get_similar_books(
+    *,
+    db: Session = Depends(deps.get_read_db),
+    book_id: int,
+    k: int = Query(5, ge=1, le=settings.SEARCH_SIMILAR_MAX_K),
+    current_user: UserModel = Depends(deps.get_current_active_user),
+) -> List[book_schema.BookSearchResultItem]:
+    """
+    Get books similar to this one, searching with its stored vector.
+    """
+    book = crud_book.book.get(db, book_id=book_id)
+    if not book:
+        raise HTTPException(status_code=404, detail="Book not found")
+    return search_service.similar_books(db, book, k)
+
 @router.put("/{book_id}", response_model=book_schema.Book)
 def update_book(
     *,
     db: Session = Depends(deps.get_db),
     book_id: int,
     book_in: book_schema.BookUpdate,
-    background_tasks: BackgroundTasks,
     current_user: UserModel = Depends(deps.get_current_active_librarian_or_superuser),
 ) -> book_schema.Book:
     """
     Update book.
     """
-    book = crud_book.book.get(db, book_id=book_id)
-    if not book:
+    updated_book = crud_book.book.update(db, book_id=book_id, obj_in=book_in)
+    if updated_book is None:
         raise HTTPException(status_code=404, detail="Book not found")
-    updated_book = crud_book.book.update(db, db_obj=book, obj_in=book_in)
-    background_tasks.add_task(update_faiss_index_background, db)
+    search_service.invalidate_filter_columns()
+    row_counter.invalidate("book")
+    index_scheduler.request_rebuild("book updated", book_id)
     return updated_book
 
 @router.delete("/{book_id}", response_model=book_schema.Book)
@@ -121,19 +224,17 @@ def delete_book(
     *,
     db: Session = Depends(deps.get_db),
     book_id: int,
-    background_tasks: BackgroundTasks,
     current_user: UserModel = Depends(deps.get_current_active_librarian_or_superuser),
 ) -> book_schema.Book:
     """
     Delete book.
     """
-    book = crud_book.book.get(db, book_id=book_id)
-    if not book:
-        raise HTTPException(status_code=404, detail="Book not found")
     deleted_book = crud_book.book.delete(db, book_id=book_id)
     if deleted_book is None:
-        raise HTTPException(status_code=404, detail="Book not found during deletion attempt")
-    background_tasks.add_task(update_faiss_index_background, db)
+        raise HTTPException(status_code=404, detail="Book not found")
+    search_service.invalidate_filter_columns()
+    row_counter.invalidate("book")
+    index_scheduler.request_rebuild("book deleted", book_id)
     return deleted_book
 
 @router.post("/{book_id}/checkout", response_model=book_schema.BookPublic)
@@ -160,6 +261,7 @@ def checkout_book(
     )
     if not checked_out_book:
         raise HTTPException(status_code=500, detail="Failed to checkout book")
+    search_service.invalidate_filter_columns()
     return checked_out_book
 
 @router.post("/{book_id}/checkin", response_model=book_schema.BookPublic)
@@ -182,4 +284,5 @@ def checkin_book(
     checked_in_book = crud_book.book.checkin(db, book_id=book_id)
     if not checked_in_book:
         raise HTTPException(status_code=500, detail="Failed to checkin book")
+    search_service.invalidate_filter_columns()
     return checked_in_book 
\ No newline at end of file
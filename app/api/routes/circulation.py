@@ -0,0 +1,74 @@
+from typing import Optional
+from datetime import date, datetime, timedelta
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+from app.api import deps
+from app.crud.crud_circulation import DIMENSIONS, circulation as crud_circulation
+from app.schemas import circulation as circulation_schema
+from app.db.models.user import User as UserModel
+from app.services.circulation import circulation_rollups
+
+router = APIRouter()
+
+WINDOWS = {"7d": 7, "30d": 30, "90d": 90, "365d": 365, "all": None}
+
+
+def _since(window: str) -> Optional[date]:
+    if window not in WINDOWS:
+        raise HTTPException(status_code=400, detail=f"window must be one of: {', '.join(WINDOWS)}")
+    days = WINDOWS[window]
+    return None if days is None else datetime.utcnow().date() - timedelta(days=days - 1)
+
+
+def _check_dimension(dimension: str) -> None:
+    if dimension not in DIMENSIONS:
+        raise HTTPException(status_code=404, detail=f"Unknown dimension; use one of: {', '.join(DIMENSIONS)}")
+
+
+@router.get("/top/{dimension}", response_model=circulation_schema.CirculationTop)
+def top_borrowed(
+    dimension: str,
+    *,
+    db: Session = Depends(deps.get_read_db),
+    window: str = "30d",
+    limit: int = Query(10, ge=1, le=100),
+    current_user: UserModel = Depends(deps.get_current_active_librarian_or_superuser),
+) -> circulation_schema.CirculationTop:
+    """
+    Most borrowed books, authors or users over a window, summed from the daily rollups;
+    the loan ledger is never read. `window=all` sums every rollup day of the dimension,
+    so it grows with the days of history rather than with the number of loans.
+    """
+    _check_dimension(dimension)
+    rows = crud_circulation.top(db, dimension=dimension, since=_since(window), limit=limit)
+    return circulation_schema.CirculationTop(
+        dimension=dimension,
+        window=window,
+        items=[circulation_schema.CirculationCount(key=key, borrows=borrows) for key, borrows in rows],
+        refreshed_through=circulation_rollups.refreshed_through(db),
+    )
+
+
+@router.get("/{dimension}/{key}", response_model=circulation_schema.CirculationHistory)
+def borrow_history(
+    dimension: str,
+    key: str,
+    *,
+    db: Session = Depends(deps.get_read_db),
+    window: str = "30d",
+    current_user: UserModel = Depends(deps.get_current_active_librarian_or_superuser),
+) -> circulation_schema.CirculationHistory:
+    """
+    Borrows per day for one book id, author or user id over a window.
+    """
+    _check_dimension(dimension)
+    days = crud_circulation.daily(db, dimension=dimension, key=key, since=_since(window))
+    return circulation_schema.CirculationHistory(
+        dimension=dimension,
+        key=key,
+        window=window,
+        borrows=sum(borrows for _, borrows in days),
+        days=[circulation_schema.CirculationDay(day=day, borrows=borrows) for day, borrows in days],
+        refreshed_through=circulation_rollups.refreshed_through(db),
+    )
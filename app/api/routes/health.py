@@ -0,0 +1,21 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from app.services.warmup import readiness
+
+router = APIRouter()
+
+@router.get("/health/live", include_in_schema=False)
+async def live() -> JSONResponse:
+    """
+    Liveness probe. Async and dependency-free, so it answers as soon as the process serves HTTP.
+    """
+    return JSONResponse({"status": "ok"})
+
+@router.get("/health/ready", include_in_schema=False)
+async def ready() -> JSONResponse:
+    """
+    Readiness probe: 200 once the DB pool is warm and the search index has loaded, 503 before.
+    """
+    report = readiness.report()
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
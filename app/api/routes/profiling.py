@@ -0,0 +1,30 @@
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import PlainTextResponse
+
+from app.api import deps
+from app.core.sampling_profiler import continuous_profiler, request_profiles
+
+router = APIRouter(dependencies=[Depends(deps.get_current_active_superuser)])
+
+@router.get("/requests/{profile_id}", response_class=PlainTextResponse)
+def get_request_profile(profile_id: str) -> PlainTextResponse:
+    """
+    Collapsed stacks of a request profiled with `X-Profile: 1`, by its `X-Profile-Id`.
+    Feed it to flamegraph.pl, speedscope or inferno.
+    """
+    rendered = request_profiles.get(profile_id)
+    if rendered is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(rendered)
+
+@router.get("/continuous", response_class=PlainTextResponse)
+def get_continuous_profile(reset: bool = False) -> PlainTextResponse:
+    """
+    Stacks through the search service and CRUD modules sampled since start-up or the last
+    reset; `reset=true` returns them and starts a new aggregate.
+    """
+    profile = continuous_profiler.reset() if reset else continuous_profiler.profile
+    return PlainTextResponse(
+        profile.render(),
+        headers={"X-Profile-Samples": str(profile.samples), "X-Profile-Seconds": f"{profile.seconds:.1f}"},
+    )
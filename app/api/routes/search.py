@@ -1,22 +1,113 @@
-from typing import List, Dict, Any
-from fastapi import APIRouter, Depends
+from typing import Callable, List, Dict, Any, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from app.api import deps
+from app.core.config import settings
+from app.services.search_filters import SearchFilters
 from app.services.search_service import search_service
 from app.schemas.user import User
-from app.schemas.book import BookSearchResultItem
+from app.schemas.book import (
+    BatchSemanticSearchRequest, BatchSemanticSearchResult, BookSearchResultItem, SemanticSearchPage,
+)
+from app.utils.cursor import decode_cursor, encode_cursor
 
 router = APIRouter()
 
-@router.get("/semantic/{query}", response_model=List[BookSearchResultItem])
+@router.get(
+    "/semantic/{query}",
+    response_model=List[BookSearchResultItem],
+    dependencies=[Depends(deps.require_search_index), Depends(deps.admit_semantic_search)],
+)
 def semantic_search(
     *,
     query: str,
     k: int = 5,
-    db: Session = Depends(deps.get_db),
+    available: Optional[bool] = None,
+    author: Optional[str] = None,
+    publisher: Optional[str] = None,
+    year_from: Optional[int] = None,
+    year_to: Optional[int] = None,
+    db: Session = Depends(deps.get_read_db),
     current_user: User = Depends(deps.get_current_active_user),
 ) -> List[BookSearchResultItem]:
     """
     Perform semantic search on books using FAISS and OpenAI embeddings.
+    Optional filters (availability, exact author or publisher, publication year
+    range) are applied inside the index search, so up to k matching books are returned.
     """
-    return search_service.semantic_search(db, query, k) 
\ No newline at end of file
+    filters = _search_filters(available, author, publisher, year_from, year_to)
+    return search_service.semantic_search(db, query, k, filters)
+
+
+@router.get(
+    "/semantic/{query}/page",
+    response_model=SemanticSearchPage,
+    dependencies=[Depends(deps.require_search_index)],
+)
+def semantic_search_page(
+    *,
+    query: str,
+    limit: int = Query(20, ge=1, le=settings.SEARCH_PAGE_MAX_SIZE),
+    cursor: Optional[str] = None,
+    available: Optional[bool] = None,
+    author: Optional[str] = None,
+    publisher: Optional[str] = None,
+    year_from: Optional[int] = None,
+    year_to: Optional[int] = None,
+    db: Session = Depends(deps.get_read_db),
+    current_user: User = Depends(deps.get_current_active_user),
+    charge_rerun: Optional[Callable[[], None]] = Depends(deps.admit_semantic_search_page),
+) -> SemanticSearchPage:
+    """
+    Semantic search results a page at a time. The first page runs the search and
+    keeps the ranked candidates on the server; pass `next_cursor` back as `cursor`,
+    with the same query and filters, for the next page. Later pages only load
+    their own books, with no new embedding call or index search, and are not
+    rate limited; a cursor this worker no longer holds re-runs the search and is.
+    """
+    cursor_id, offset = None, 0
+    if cursor:
+        try:
+            payload = decode_cursor(cursor)
+            cursor_id, offset = str(payload["id"]), int(payload["offset"])
+        except (ValueError, KeyError, TypeError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        if offset < 0:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    filters = _search_filters(available, author, publisher, year_from, year_to)
+    items, next_page = search_service.semantic_search_page(
+        db, query, limit, filters, cursor_id, offset, on_rerun=charge_rerun
+    )
+    return SemanticSearchPage(items=items, next_cursor=encode_cursor(next_page) if next_page else None)
+
+
+@router.post(
+    "/semantic/batch",
+    response_model=List[BatchSemanticSearchResult],
+    dependencies=[Depends(deps.require_search_index), Depends(deps.admit_semantic_search_batch)],
+)
+def semantic_search_batch(
+    *,
+    search_in: BatchSemanticSearchRequest,
+    db: Session = Depends(deps.get_read_db),
+    current_user: User = Depends(deps.get_current_active_user),
+) -> List[BatchSemanticSearchResult]:
+    """
+    Run several semantic searches in one call, with one embedding request and one index search.
+    """
+    filters = _search_filters(
+        search_in.available, search_in.author, search_in.publisher, search_in.year_from, search_in.year_to
+    )
+    results = search_service.semantic_search_batch(db, search_in.queries, search_in.k, filters)
+    return [{"query": query, "results": hits} for query, hits in zip(search_in.queries, results)]
+
+
+def _search_filters(
+    available: Optional[bool], author: Optional[str], publisher: Optional[str],
+    year_from: Optional[int], year_to: Optional[int],
+) -> SearchFilters:
+    if year_from is not None and year_to is not None and year_from > year_to:
+        raise HTTPException(status_code=400, detail="year_from must not be after year_to")
+    return SearchFilters(
+        is_available=available, author=author, publisher=publisher, year_from=year_from, year_to=year_to
+    ) 
\ No newline at end of file
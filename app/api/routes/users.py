@@ -1,5 +1,5 @@
 from typing import List
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.orm import Session
 
 from app.api import deps
@@ -7,27 +7,33 @@ from app.crud.crud_user import user as crud_user
 from app.schemas.user import User as UserSchema, UserRoleUpdate
 from app.db.models.user import User as UserModel
 from app.core.roles import UserRole
+from app.services.counts import row_counter, set_total_headers
 
 router = APIRouter()
 
 @router.get("/", response_model=List[UserSchema])
 def read_users(
-    db: Session = Depends(deps.get_db),
+    response: Response,
+    db: Session = Depends(deps.get_read_db),
     skip: int = 0,
     limit: int = 100,
+    include_total: bool = False,
     # current_user: UserModel = Depends(deps.get_current_active_superuser) # Or specific role
     current_user: UserModel = Depends(deps.get_current_active_librarian_or_superuser)
 ) -> List[UserModel]: # Type hint with UserModel as CRUD returns it, Pydantic handles response_model
     """
     Retrieve users. (Protected for LIBRARIAN or SUPERUSER)
+    `include_total` adds an `X-Total-Count` header.
     """
     users = crud_user.get_multi(db, skip=skip, limit=limit)
+    if include_total:
+        set_total_headers(response, row_counter.count(db, crud_user.list_query(db), table="user"))
     return users
 
 @router.get("/{user_id}", response_model=UserSchema)
 def read_user_by_id(
     user_id: int,
-    db: Session = Depends(deps.get_db),
+    db: Session = Depends(deps.get_read_db),
     current_user: UserModel = Depends(deps.get_current_active_librarian_or_superuser)
 ) -> UserModel:
     """
@@ -1,4 +1,4 @@
-from typing import List
+from typing import Dict, List, Optional
 from pydantic_settings import BaseSettings
 from pydantic import AnyHttpUrl
 
@@ -10,6 +10,12 @@ class Settings(BaseSettings):
 
     # Database
     DATABASE_URL: str
+    # Read replicas for GET routes and index builds, used round-robin; empty reads from the primary.
+    DATABASE_REPLICA_URLS: List[str] = []
+    # How long a replica that dropped its connection is skipped.
+    DB_REPLICA_RETRY_SECONDS: float = 30.0
+    # After a client's own write, its reads go to the primary for this long; 0 disables it.
+    DB_READ_YOUR_WRITES_SECONDS: float = 5.0
 
     # JWT Token
     SECRET_KEY: str
@@ -23,6 +29,103 @@ class Settings(BaseSettings):
 
     # OpenAI
     OPENAI_API_KEY: str
+    # Model for new embeddings. Changing it starts a background re-embed; search keeps using
+    # the previous model until EMBEDDING_CUTOVER_COVERAGE of the catalog has new vectors.
+    EMBEDDING_MODEL: str = "text-embedding-ada-002"
+    EMBEDDING_CUTOVER_COVERAGE: float = 0.99
+    EMBEDDING_REEMBED_BATCH_SIZE: int = 256
+    EMBEDDING_REEMBED_INTERVAL_SECONDS: float = 30.0
+
+    # Semantic search index
+    # Directory for memory-mapped index snapshots shared by all workers on a host; unset keeps a per-process index.
+    SEARCH_INDEX_DIR: Optional[str] = None
+    # faiss.index_factory string: "Flat" (exact, 4 bytes/dim), "SQfp16" (2), "SQ8" (1) or "PQ<m>" (m bytes/vector).
+    SEARCH_INDEX_FACTORY: str = "Flat"
+    # Re-rank k * factor candidates from a compressed index against the stored embeddings; 0 disables.
+    SEARCH_RERANK_FACTOR: int = 0
+    SEARCH_INDEX_NOTIFY_CHANNEL: str = "search_index_version"
+    SEARCH_INDEX_POLL_SECONDS: float = 5.0
+    # Writes within this quiet window share one rebuild; no request waits longer than the max delay.
+    SEARCH_REBUILD_DEBOUNCE_SECONDS: float = 2.0
+    SEARCH_REBUILD_MAX_DELAY_SECONDS: float = 30.0
+    # Build in a separate process so rebuilds do not compete with requests for the GIL.
+    SEARCH_BUILD_OUT_OF_PROCESS: bool = False
+    # Split the index into this many shards by book id; each is searched on its own thread and rebuilt alone.
+    SEARCH_INDEX_SHARDS: int = 1
+    # Threads fanning a query out over shards (and building them); 0 means one per CPU.
+    SEARCH_QUERY_THREADS: int = 0
+    # Upper bound on how stale another worker's checkouts can make the cached filter columns.
+    SEARCH_FILTER_CACHE_TTL_SECONDS: float = 30.0
+    SEARCH_BATCH_MAX_QUERIES: int = 256
+    SEARCH_SIMILAR_CACHE_SIZE: int = 10000
+    # Largest `k` for similar books; each (book, k) is cached separately.
+    SEARCH_SIMILAR_MAX_K: int = 100
+    # Semantic search hits per (query, k, filters), dropped whenever a new index version is swapped in.
+    SEARCH_RESULT_CACHE_SIZE: int = 10000
+    SEARCH_RESULT_CACHE_TTL_SECONDS: float = 30.0
+    # Paged semantic search: candidates kept per cursor, and how many cursors are kept and for how long.
+    SEARCH_CURSOR_CANDIDATES: int = 500
+    SEARCH_CURSOR_CACHE_SIZE: int = 2000
+    SEARCH_CURSOR_TTL_SECONDS: float = 300.0
+    SEARCH_PAGE_MAX_SIZE: int = 100
+    # Paging stops after this many results, so no cursor can demand an unbounded index search.
+    SEARCH_CURSOR_MAX_RESULTS: int = 5000
+
+    # Semantic search admission control
+    # Searches per minute per user, by role; 0 means unlimited. A batch counts one per query,
+    # so rate-limited users cannot send batches of more than SEARCH_RATE_BURST queries.
+    SEARCH_RATE_LIMITS: Dict[str, float] = {"CUSTOMER": 30, "LIBRARIAN": 120, "SUPERUSER": 0}
+    SEARCH_RATE_BURST: int = 10
+    # "local" keeps buckets per worker; "database" shares them through the ratelimitbucket table.
+    RATE_LIMIT_BACKEND: str = "local"
+    # Concurrent searches per worker (0 disables the cap) and how many more may wait, and for how long.
+    SEARCH_MAX_CONCURRENT: int = 8
+    SEARCH_MAX_QUEUE: int = 16
+    SEARCH_QUEUE_TIMEOUT_SECONDS: float = 2.0
+
+    # Books
+    # Ids accepted by one GET or POST /books/batch.
+    BOOKS_BATCH_MAX_IDS: int = 500
+
+    # List totals
+    # Filtered lists are counted exactly up to this many rows; larger totals are planner estimates.
+    COUNT_EXACT_LIMIT: int = 10000
+    COUNT_CACHE_TTL_SECONDS: float = 10.0
+
+    # Loans
+    # Seconds between incremental overdue scans; 0 disables the scanner.
+    OVERDUE_SCAN_INTERVAL_SECONDS: float = 300.0
+    # Seconds between folding new loan events into the circulation rollups; 0 disables it.
+    CIRCULATION_ROLLUP_INTERVAL_SECONDS: float = 60.0
+
+    # Start-up
+    # Pooled connections opened by the background warm-up before the app reports ready.
+    WARMUP_DB_CONNECTIONS: int = 5
+
+    # Observability
+    DEBUG: bool = False
+    LOG_LEVEL: str = "INFO"
+    # "json" (one object per line) or "text".
+    LOG_FORMAT: str = "json"
+    # Fraction of INFO/DEBUG records kept per logger name; warnings and errors are never sampled.
+    LOG_SAMPLING: Dict[str, float] = {}
+    METRICS_ENABLED: bool = True
+    DB_PROFILER_ENABLED: bool = True
+    DB_SLOW_QUERY_MS: float = 200.0
+    DB_N_PLUS_ONE_THRESHOLD: int = 5
+    # Superusers may profile single requests with `X-Profile: 1` or `?profile=1`.
+    PROFILING_ENABLED: bool = True
+    PROFILE_SAMPLE_INTERVAL_MS: float = 5.0
+    # Sampling of a profiled request stops after this long.
+    PROFILE_MAX_SECONDS: float = 60.0
+    # Request profiles kept per worker; PROFILE_DIR also writes them to a (shared) directory.
+    PROFILE_CACHE_SIZE: int = 50
+    PROFILE_DIR: Optional[str] = None
+    # Always-on stack sampling of the hot paths below, in samples per second; 0 disables it.
+    PROFILER_CONTINUOUS_HZ: float = 0.0
+    PROFILER_CONTINUOUS_PATHS: List[str] = [
+        "app/services/search_service.py", "app/services/search_filters.py", "app/services/sharded_index.py", "app/crud/",
+    ]
 
     class Config:
         case_sensitive = True
@@ -0,0 +1,376 @@
+"""
+Minimal in-process Prometheus metrics.
+
+Counters, gauges and histograms are kept in plain Python objects guarded by a
+single lock per metric, so recording a sample costs a dict lookup and a few
+additions. The text exposition format is only rendered when `/metrics` is scraped.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from app.core.request_context import get_request_context
+
+CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape_label(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape_label(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children: Dict[Tuple[str, ...], object] = {}
+
+    def labels(self, *values: str):
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {key}")
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _default(self):
+        return self.labels()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        with self._lock:
+            children = list(self._children.items())
+        for key, child in children:
+            lines.extend(child.render(self.name, self.labelnames, key))
+        return lines
+
+
+class _CounterChild:
+    __slots__ = ("_lock", "value")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def render(self, name, labelnames, key) -> List[str]:
+        return [f"{name}{_format_labels(labelnames, key)} {_format_value(self.value)}"]
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._default().inc(amount)
+
+
+class _GaugeChild:
+    __slots__ = ("_lock", "value", "_function")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0.0
+        self._function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float) -> None:
+        self.value = float(value)
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value -= amount
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """Compute the value lazily at scrape time instead of on every update."""
+        self._function = function
+
+    def render(self, name, labelnames, key) -> List[str]:
+        value = self.value
+        if self._function is not None:
+            try:
+                value = float(self._function())
+            except Exception:
+                value = float("nan")
+        return [f"{name}{_format_labels(labelnames, key)} {_format_value(value)}"]
+
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float) -> None:
+        self._default().set(value)
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._default().inc(amount)
+
+    def dec(self, amount: float = 1.0) -> None:
+        self._default().dec(amount)
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        self._default().set_function(function)
+
+
+class _HistogramChild:
+    __slots__ = ("_lock", "_bounds", "_counts", "sum", "count")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self._lock = threading.Lock()
+        self._bounds = bounds
+        self._counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        position = bisect_left(self._bounds, value)
+        with self._lock:
+            self._counts[position] += 1
+            self.sum += value
+            self.count += 1
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def render(self, name, labelnames, key) -> List[str]:
+        with self._lock:
+            counts = list(self._counts)
+            total, count = self.sum, self.count
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self._bounds + (float("inf"),), counts):
+            cumulative += bucket_count
+            labels = _format_labels(labelnames + ("le",), key + (_format_value(bound),))
+            lines.append(f"{name}_bucket{labels} {cumulative}")
+        labels = _format_labels(labelnames, key)
+        lines.append(f"{name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{name}_count{labels} {count}")
+        return lines
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(float(b) for b in buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self._default().observe(value)
+
+    def time(self):
+        return self._default().time()
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# HTTP
+HTTP_REQUESTS = REGISTRY.counter(
+    "http_requests_total", "Total HTTP requests by route and status.", ("method", "route", "status")
+)
+HTTP_REQUEST_DURATION = REGISTRY.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route.", ("method", "route")
+)
+HTTP_IN_FLIGHT = REGISTRY.gauge("http_requests_in_flight", "HTTP requests currently being served.")
+
+# Database
+DB_QUERIES_PER_REQUEST = REGISTRY.histogram(
+    "db_queries_per_request", "Number of SQL statements executed per request.", ("route",),
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 250),
+)
+DB_TIME_PER_REQUEST = REGISTRY.histogram(
+    "db_time_per_request_seconds", "Total SQL execution time per request.", ("route",)
+)
+DB_SLOW_QUERIES = REGISTRY.counter("db_slow_queries_total", "SQL statements slower than DB_SLOW_QUERY_MS.")
+DB_N_PLUS_ONE = REGISTRY.counter(
+    "db_n_plus_one_total", "Requests that repeated one SELECT at least DB_N_PLUS_ONE_THRESHOLD times.", ("route",)
+)
+
+# Profiling
+PROFILER_SAMPLES = REGISTRY.counter(
+    "profiler_samples_total", "Stack samples taken, for profiled requests and by the continuous profiler.", ("mode",)
+)
+
+# Semantic search
+SEARCH_PHASE_DURATION = REGISTRY.histogram(
+    "search_phase_duration_seconds", "Duration of each semantic search phase.", ("phase",),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+SEARCH_RESULT_CACHE = REGISTRY.counter(
+    "search_result_cache_total", "Semantic queries answered from the result cache, by a shared in-flight search, or searched.",
+    ("outcome",),
+)
+SEARCH_CURSOR_PAGES = REGISTRY.counter(
+    "search_cursor_pages_total",
+    "Paged semantic search requests: first pages, pages served from a cached cursor, and pages whose cursor had to be re-run.",
+    ("outcome",),
+)
+SEARCH_INDEX_VECTORS = REGISTRY.gauge("search_index_vectors", "Number of vectors in the search index.")
+SEARCH_INDEX_DIMENSION = REGISTRY.gauge("search_index_dimension", "Dimension of the vectors in the search index.")
+SEARCH_INDEX_BYTES = REGISTRY.gauge("search_index_bytes", "Approximate memory held by the search index and its id maps.")
+SEARCH_INDEX_REBUILDS = REGISTRY.counter(
+    "search_index_rebuilds_total", "Search index rebuilds by outcome.", ("outcome",)
+)
+SEARCH_ADMISSION_IN_FLIGHT = REGISTRY.gauge("search_admission_in_flight", "Semantic searches holding a concurrency slot.")
+SEARCH_ADMISSION_QUEUE_DEPTH = REGISTRY.gauge(
+    "search_admission_queue_depth", "Semantic searches waiting for a concurrency slot."
+)
+SEARCH_ADMISSION_REJECTIONS = REGISTRY.counter(
+    "search_admission_rejections_total", "Semantic searches rejected with 429, by reason.", ("reason",)
+)
+SEARCH_INDEX_REBUILD_REQUESTS = REGISTRY.counter(
+    "search_index_rebuild_requests_total", "Rebuild requests received; compare with rebuilds to see coalescing."
+)
+SEARCH_INDEX_REBUILD_DURATION = REGISTRY.histogram(
+    "search_index_rebuild_duration_seconds", "Duration of search index rebuilds.",
+    buckets=(0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0),
+)
+
+# Loans
+OVERDUE_LOANS = REGISTRY.gauge("overdue_loans", "Loans past their due date, as of the last overdue scan.")
+OVERDUE_LOANS_DETECTED = REGISTRY.counter("overdue_loans_detected_total", "Loans found newly overdue by the overdue scanner.")
+OVERDUE_SCAN_DURATION = REGISTRY.histogram(
+    "overdue_scan_duration_seconds", "Duration of incremental overdue scans.",
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+def route_template(scope) -> str:
+    """Route path template (e.g. `/api/v1/books/{book_id}`) to keep label cardinality bounded."""
+    return getattr(scope.get("route"), "path", None) or UNMATCHED_ROUTE
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording latency, status and DB usage per route template.
+
+    Latency is taken when the last body chunk is sent, so background tasks that run
+    after the response (e.g. index rebuilds) do not inflate the route's numbers.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        context = get_request_context()
+        state = {"status": 500, "recorded": False}
+
+        def record() -> None:
+            if state["recorded"]:
+                return
+            state["recorded"] = True
+            route_path = route_template(scope)
+            method = scope.get("method", "")
+            HTTP_REQUEST_DURATION.labels(method, route_path).observe(time.perf_counter() - start)
+            HTTP_REQUESTS.labels(method, route_path, state["status"]).inc()
+            if context is not None:
+                DB_QUERIES_PER_REQUEST.labels(route_path).observe(context.db_queries)
+                DB_TIME_PER_REQUEST.labels(route_path).observe(context.db_time)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                record()
+
+        HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            record()
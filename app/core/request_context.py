@@ -0,0 +1,85 @@
+import re
+import uuid
+from contextvars import Context, ContextVar, Token
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+
+@dataclass
+class RequestContext:
+    """
+    Mutable per-request state shared between middleware, dependencies and endpoints.
+
+    Sync endpoints and dependencies run in the threadpool with a *copy* of the
+    request's context, so values must be mutated on this object rather than set
+    on new context variables.
+    """
+    db_queries: int = 0
+    db_time: float = 0.0
+    db_statements: Dict[str, int] = field(default_factory=dict)
+    correlation_id: Optional[str] = None
+    # The authenticated user, once a dependency has resolved one.
+    user_id: Optional[int] = None
+
+
+_request_context: ContextVar[Optional[RequestContext]] = ContextVar("request_context", default=None)
+
+
+def get_request_context() -> Optional[RequestContext]:
+    return _request_context.get()
+
+
+def context_request(context: Context) -> Optional[RequestContext]:
+    """The RequestContext held by `context`, e.g. one a threadpool thread is running a call in."""
+    return context.get(_request_context)
+
+
+def start_request_context(correlation_id: Optional[str] = None) -> Token:
+    return _request_context.set(RequestContext(correlation_id=correlation_id))
+
+
+def reset_request_context(token: Token) -> None:
+    _request_context.reset(token)
+
+
+CORRELATION_HEADER = "x-request-id"
+# Client-supplied ids are only trusted if short and plain, since they end up in logs.
+_VALID_CORRELATION_ID = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+
+def _correlation_id(scope) -> str:
+    for name, value in scope.get("headers", []):
+        if name == CORRELATION_HEADER.encode():
+            candidate = value.decode("latin-1")
+            if _VALID_CORRELATION_ID.match(candidate):
+                return candidate
+            break
+    return uuid.uuid4().hex
+
+
+class RequestContextMiddleware:
+    """
+    Outermost ASGI middleware: gives every HTTP request a fresh RequestContext and a
+    correlation id (the caller's `X-Request-ID` or a new one), echoed in the response.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        correlation_id = _correlation_id(scope)
+        token = start_request_context(correlation_id)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", [])) + [(CORRELATION_HEADER.encode(), correlation_id.encode())]
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            reset_request_context(token)
@@ -0,0 +1,230 @@
+"""
+Stack-sampling profiler.
+
+A sampler thread reads every thread's current frame with `sys._current_frames()`
+at a fixed interval and counts the stacks it sees. These are wall-clock samples:
+a thread waiting on the database or the embedding API is counted where it waits.
+Profiles are rendered in the collapsed ("folded") format, one `frame;frame;...
+count` line per distinct stack, which `flamegraph.pl`, speedscope and inferno
+read directly.
+
+Two modes:
+
+  * `RequestProfiler` samples only the threadpool threads running one request,
+    recognised by the `contextvars.Context` each worker thread runs the call in,
+    which carries the request's `RequestContext`. A superuser turns it on for a
+    single request (`deps.profile_request`), and the result is kept in
+    `request_profiles`.
+  * `ContinuousProfiler` samples every thread at a low rate and keeps the stacks
+    that pass through `PROFILER_CONTINUOUS_PATHS` (the search service and CRUD
+    modules by default), aggregated since start-up or the last reset.
+"""
+import contextvars
+import logging
+import os
+import queue
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from functools import lru_cache
+from types import CodeType, FrameType
+from typing import Dict, List, Optional, Sequence
+
+from app.core.config import settings
+from app.core.metrics import PROFILER_SAMPLES
+from app.core.request_context import RequestContext, context_request
+from app.utils.cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# A threadpool worker holds the Context of its current call a few frames below the thread's start.
+_CONTEXT_SEARCH_DEPTH = 8
+_PROFILE_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+@lru_cache(maxsize=8192)
+def _label(code: CodeType) -> str:
+    """`path:qualified_name`, with paths relative to the project or site-packages."""
+    filename = code.co_filename
+    if filename.startswith(_ROOT + os.sep):
+        filename = filename[len(_ROOT) + 1:]
+    else:
+        _, marker, rest = filename.rpartition("-packages" + os.sep)
+        filename = rest if marker else os.path.basename(filename)
+    return f"{filename}:{getattr(code, 'co_qualname', code.co_name)}".replace(";", ",")
+
+
+def _frames(frame: Optional[FrameType]) -> List[FrameType]:
+    """The stack ending at `frame`, outermost first."""
+    frames = []
+    while frame is not None:
+        frames.append(frame)
+        frame = frame.f_back
+    frames.reverse()
+    return frames
+
+
+class StackProfile:
+    """Counts of collapsed stacks, safe to add to from one thread while another renders."""
+
+    def __init__(self):
+        self.samples = 0
+        self.started = time.time()
+        self.seconds = 0.0
+        self._stacks: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def add(self, frames: Sequence[FrameType]) -> None:
+        stack = ";".join(_label(frame.f_code) for frame in frames)
+        with self._lock:
+            self._stacks[stack] += 1
+
+    def render(self) -> str:
+        with self._lock:
+            stacks = self._stacks.most_common()
+        return "".join(f"{stack} {count}\n" for stack, count in stacks)
+
+
+class RequestProfiler:
+    """Samples the threads serving one request until `stop` or `max_seconds`."""
+
+    def __init__(self, request_context: RequestContext, interval: float, max_seconds: float):
+        self.request_context = request_context
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.profile = StackProfile()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> StackProfile:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.profile
+
+    def _request_frames(self, frames: List[FrameType]) -> Optional[List[FrameType]]:
+        """The frames above the worker loop if this thread is running the request, else None."""
+        for depth, frame in enumerate(frames[:_CONTEXT_SEARCH_DEPTH]):
+            for value in frame.f_locals.values():
+                if isinstance(value, contextvars.Context):
+                    if context_request(value) is not self.request_context:
+                        return None
+                    calls = frames[depth + 1:]
+                    # An idle worker still holds the context of its last call while it waits for the next.
+                    if not calls or calls[0].f_code.co_filename == queue.__file__:
+                        return None
+                    return calls
+        return None
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        started = time.monotonic()
+        while not self._stop.wait(self.interval) and time.monotonic() - started < self.max_seconds:
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                calls = self._request_frames(_frames(frame))
+                if calls:
+                    self.profile.add(calls)
+            self.profile.samples += 1
+            PROFILER_SAMPLES.labels("request").inc()
+        self.profile.seconds = time.monotonic() - started
+
+
+class ProfileStore:
+    """Recent request profiles in memory, and as `<id>.folded` files in `directory` when set."""
+
+    def __init__(self, maxsize: int, directory: Optional[str] = None):
+        self._profiles: LRUCache[str] = LRUCache(maxsize)
+        self.directory = directory
+
+    def put(self, profile_id: str, profile: StackProfile) -> None:
+        rendered = profile.render()
+        self._profiles.put(profile_id, rendered)
+        if self.directory:
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                with open(os.path.join(self.directory, f"{profile_id}.folded"), "w") as f:
+                    f.write(rendered)
+            except OSError as e:
+                logger.warning("Could not write profile %s: %s", profile_id, e)
+
+    def get(self, profile_id: str) -> Optional[str]:
+        """The folded profile, also read from `directory` so any worker can serve it."""
+        if not _PROFILE_ID.match(profile_id):
+            return None
+        rendered = self._profiles.get(profile_id)
+        if rendered is None and self.directory:
+            try:
+                with open(os.path.join(self.directory, f"{profile_id}.folded")) as f:
+                    rendered = f.read()
+            except OSError:
+                return None
+        return rendered
+
+
+class ContinuousProfiler:
+    def __init__(self, rate_hz: float, paths: Sequence[str]):
+        self.rate_hz = rate_hz
+        self._prefixes = tuple(os.path.join(_ROOT, path) for path in paths)
+        self.profile = StackProfile()
+        self._hot: Dict[CodeType, bool] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self.rate_hz <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="continuous-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def reset(self) -> StackProfile:
+        """Start a new aggregate; returns the one it replaces."""
+        old, self.profile = self.profile, StackProfile()
+        return old
+
+    def _is_hot(self, code: CodeType) -> bool:
+        hot = self._hot.get(code)
+        if hot is None:
+            hot = self._hot[code] = code.co_filename.startswith(self._prefixes)
+        return hot
+
+    def sample(self) -> None:
+        own = threading.get_ident()
+        profile = self.profile
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own:
+                continue
+            frames = _frames(frame)
+            if any(self._is_hot(f.f_code) for f in frames):
+                profile.add(frames)
+        profile.samples += 1
+        profile.seconds = time.time() - profile.started
+        PROFILER_SAMPLES.labels("continuous").inc()
+
+    def _run(self) -> None:
+        while not self._stop.wait(1.0 / self.rate_hz):
+            try:
+                self.sample()
+            except Exception as e:
+                logger.error("Error sampling stacks: %s", e, exc_info=True)
+
+
+def profiling_requested(headers, query_params) -> bool:
+    """`X-Profile: 1` or `?profile=1` (also `true`)."""
+    flag = headers.get("x-profile") or query_params.get("profile")
+    return flag is not None and flag.lower() in ("1", "true")
+
+
+request_profiles = ProfileStore(settings.PROFILE_CACHE_SIZE, settings.PROFILE_DIR)
+continuous_profiler = ContinuousProfiler(settings.PROFILER_CONTINUOUS_HZ, settings.PROFILER_CONTINUOUS_PATHS)
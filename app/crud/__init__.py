@@ -1,2 +1,5 @@
 from .crud_book import book
-from .crud_user import user 
\ No newline at end of file
+from .crud_user import user
+from .crud_overdue_loan import overdue_loan
+from .crud_job_state import job_state
+from .crud_circulation import circulation
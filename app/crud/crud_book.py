@@ -1,32 +1,94 @@
-from typing import List, Optional
+from typing import Iterable, List, Optional, Tuple
 from datetime import datetime
-from sqlalchemy.orm import Session
-from sqlalchemy import or_
+from sqlalchemy.orm import Query, Session, defer
+from sqlalchemy import case, delete, func, insert, null, or_, tuple_, update
 import json
 import logging
 
+from app.crud.crud_embedding import embedding as crud_embedding
 from app.db.models.book import Book
+from app.db.models.book_embedding import BookEmbedding
+from app.db.models.loan_event import LoanEvent
 from app.schemas.book import BookCreate, BookUpdate
 from app.utils.embedding import get_embedding
 
 logger = logging.getLogger(__name__)
 
+# The book fields its embedding is generated from.
+EMBEDDED_FIELDS = ("title", "author", "description")
+
+
+def embedding_text(title: Optional[str], author: Optional[str], description: Optional[str]) -> str:
+    """The text a book's embedding is generated from; empty if there is none."""
+    return f"{title or ''} {author or ''} {description or ''}".strip()
+
 class CRUDBook:
     def get(self, db: Session, book_id: int) -> Optional[Book]:
         return db.query(Book).filter(Book.id == book_id).first()
 
+    def get_many(self, db: Session, book_ids: Iterable[int]) -> List[Book]:
+        """
+        Fetch several books in one query, without their stored embeddings; order is
+        unspecified and missing ids are skipped.
+        """
+        book_ids = list(book_ids)
+        if not book_ids:
+            return []
+        return db.query(Book).options(defer(Book.embedding)).filter(Book.id.in_(book_ids)).all()
+
     def get_by_isbn(self, db: Session, isbn: str) -> Optional[Book]:
         return db.query(Book).filter(Book.isbn == isbn).first()
 
     def get_multi(
         self, db: Session, *, skip: int = 0, limit: int = 10000
     ) -> List[Book]:
-        return db.query(Book).offset(skip).limit(limit).all()
+        return self.list_query(db).offset(skip).limit(limit).all()
+
+    def list_query(self, db: Session) -> Query:
+        return db.query(Book)
+
+    def get_stored_embeddings(
+        self,
+        db: Session,
+        book_ids: Optional[Iterable[int]] = None,
+        shard: Optional[Tuple[int, int]] = None,
+        model: Optional[str] = None,
+    ) -> List[Tuple[int, Optional[str]]]:
+        """
+        Return `(id, embedding)` for every book (or just `book_ids`) without loading full rows.
+        `shard=(s, count)` restricts the result to books with `id % count == s`, and
+        `model` to embeddings produced by that model.
+        """
+        query = db.query(Book.id, Book.embedding)
+        if model is not None:
+            query = query.filter(Book.embedding_model == model)
+        if shard is not None:
+            query = query.filter(Book.id % shard[1] == shard[0])
+        if book_ids is not None:
+            book_ids = list(book_ids)
+            if not book_ids:
+                return []
+            query = query.filter(Book.id.in_(book_ids))
+        return query.order_by(Book.id).all()
+
+    def get_filter_columns(self, db: Session) -> List[Tuple[int, bool, str, Optional[str], Optional[int]]]:
+        """Return `(id, is_available, author, publisher, publication_year)` for every book, ordered by id."""
+        return (
+            db.query(Book.id, Book.is_available, Book.author, Book.publisher, Book.publication_year)
+            .order_by(Book.id)
+            .all()
+        )
+
+    def get_catalog_fingerprint(self, db: Session) -> str:
+        """Cheap change marker for the catalog: row count plus latest update time."""
+        count, last_updated = db.query(func.count(Book.id), func.max(Book.updated_at)).one()
+        return f"{count}:{last_updated.isoformat() if last_updated else ''}"
 
     def get_user_checked_out_books(
         self, db: Session, *, user_id: int, skip: int = 0, limit: int = 100
     ) -> List[Book]:
         """Get all books currently checked out by a specific user."""
+        # Served by ix_book_checked_out_by_id_is_available.
         return (
             db.query(Book)
             .filter(
@@ -38,80 +100,124 @@ class CRUDBook:
             .all()
         )
 
+    def get_overdue(
+        self, db: Session, *, now: datetime, after: Optional[Tuple[datetime, int]] = None, limit: int = 100
+    ) -> List[Book]:
+        """
+        Loans past due as of `now`, oldest due date first, keyset-paged on `(due_date, id)`.
+        `is_available == False` matches the predicate of ix_book_on_loan_due_date.
+        """
+        query = db.query(Book).filter(Book.is_available == False, Book.due_date < now)
+        if after is not None:
+            query = query.filter(tuple_(Book.due_date, Book.id) > tuple_(*after))
+        return query.order_by(Book.due_date, Book.id).limit(limit).all()
+
     def search(
         self, db: Session, *, query: str, skip: int = 0, limit: int = 100
     ) -> List[Book]:
-        return (
-            db.query(Book)
-            .filter(
-                or_(
-                    Book.title.ilike(f"%{query}%"),
-                    Book.author.ilike(f"%{query}%"),
-                    Book.isbn.ilike(f"%{query}%"),
-                )
+        return self.search_query(db, query=query).offset(skip).limit(limit).all()
+
+    def search_query(self, db: Session, *, query: str) -> Query:
+        return db.query(Book).filter(
+            or_(
+                Book.title.ilike(f"%{query}%"),
+                Book.author.ilike(f"%{query}%"),
+                Book.isbn.ilike(f"%{query}%"),
             )
-            .offset(skip)
-            .limit(limit)
-            .all()
         )
 
-    def _generate_and_set_embedding(self, book_obj: Book):
-        text_for_embedding = f"{book_obj.title} {book_obj.author} {book_obj.description or ''}".strip()
-        if text_for_embedding:
-            try:
-                embedding_vector = get_embedding(text_for_embedding)
-                book_obj.embedding = json.dumps(embedding_vector)
-                logger.info(f"Generated and stored embedding for book ID {book_obj.id}")
-            except Exception as e:
-                logger.error(f"Error generating embedding for book ID {book_obj.id if hasattr(book_obj, 'id') else 'NEW'}: {e}", exc_info=True)
-                book_obj.embedding = None
-        else:
-            logger.warning(f"No text content to generate embedding for book ID {book_obj.id if hasattr(book_obj, 'id') else 'NEW'}. Setting embedding to None.")
-            book_obj.embedding = None
+    def _embedding_for(
+        self, model: str, title: Optional[str], author: Optional[str], description: Optional[str],
+        book_id: Optional[int] = None,
+    ) -> Tuple[Optional[str], Optional[int]]:
+        """
+        The stored (JSON) embedding of a book's text under `model` and its dimension,
+        or `(None, None)` if there is no text or the call fails.
+        """
+        text_for_embedding = embedding_text(title, author, description)
+        if not text_for_embedding:
+            logger.warning("No text content to generate embedding for book ID %s. Setting embedding to None.", book_id or "NEW")
+            return None, None
+        try:
+            vector = get_embedding(text_for_embedding, model)
+        except Exception as e:
+            logger.error("Error generating embedding for book ID %s: %s", book_id or "NEW", e, exc_info=True)
+            return None, None
+        logger.info("Generated %s embedding for book ID %s", model, book_id or "NEW")
+        return json.dumps(vector), len(vector)
+
+    @staticmethod
+    def _commit_returned(db: Session, obj: Optional[Book]) -> Optional[Book]:
+        # RETURNING already loaded every column. Detach the row so the commit does not
+        # expire it; otherwise serializing it would cost another SELECT.
+        if obj is not None and obj in db:
+            db.expunge(obj)
+        db.commit()
+        return obj
 
     def create(self, db: Session, *, obj_in: BookCreate) -> Book:
-        db_obj = Book(
-            title=obj_in.title,
-            author=obj_in.author,
-            isbn=obj_in.isbn,
-            description=obj_in.description,
-            publication_year=obj_in.publication_year,
-            publisher=obj_in.publisher,
+        """
+        One INSERT ... RETURNING; the embedding is computed before the statement, with the
+        active model (looked up at most every `ACTIVE_MODEL_CACHE_SECONDS`).
+        """
+        values = obj_in.model_dump()
+        model = crud_embedding.active_model_name(db, cached=True)
+        values["embedding"], values["embedding_dimension"] = self._embedding_for(
+            model, obj_in.title, obj_in.author, obj_in.description
         )
-        self._generate_and_set_embedding(db_obj)
-        
-        db.add(db_obj)
-        db.commit()
-        db.refresh(db_obj)
-        return db_obj
+        values["embedding_model"] = model if values["embedding"] is not None else None
+        db_obj = db.scalars(insert(Book).values(**values).returning(Book)).one()
+        return self._commit_returned(db, db_obj)
 
-    def update(
-        self, db: Session, *, db_obj: Book, obj_in: BookUpdate
-    ) -> Book:
+    def update(self, db: Session, *, book_id: int, obj_in: BookUpdate) -> Optional[Book]:
+        """
+        Apply `obj_in` without reading the book first; None if it does not exist.
+        Other fields are one UPDATE ... RETURNING and one commit. Changing the title,
+        author or description clears the embedding in that statement (compared against
+        the old values in SQL), and after it commits, so that no row lock is held during
+        the embedding call, a second transaction deletes the vectors staged for a model
+        migration and stores the new embedding: up to four statements in two commits,
+        counting the active model lookup.
+        """
         update_data = obj_in.model_dump(exclude_unset=True)
-        needs_embedding_update = False
-
-        for field, value in update_data.items():
-            if field in ["title", "author", "description"] and getattr(db_obj, field) != value:
-                needs_embedding_update = True
-            setattr(db_obj, field, value)
-        
-        if needs_embedding_update:
-            logger.info(f"Book content changed for ID {db_obj.id}. Regenerating embedding.")
-            self._generate_and_set_embedding(db_obj)
-        
-        db.add(db_obj)
+        if not update_data:
+            return self.get(db, book_id)
+        values = dict(update_data)
+        content = {field: value for field, value in update_data.items() if field in EMBEDDED_FIELDS}
+        if content:
+            changed = or_(*(getattr(Book, field).is_distinct_from(value) for field, value in content.items()))
+            values["embedding"] = case((changed, null()), else_=Book.embedding)
+            values["embedding_model"] = case((changed, null()), else_=Book.embedding_model)
+        db_obj = db.scalars(
+            update(Book).where(Book.id == book_id).values(**values).returning(Book)
+            .execution_options(synchronize_session=False, populate_existing=True)
+        ).one_or_none()
+        db_obj = self._commit_returned(db, db_obj)
+        if db_obj is None or not content or db_obj.embedding is not None:
+            return db_obj
+
+        logger.info("Book content changed for ID %s. Regenerating embedding.", db_obj.id)
+        model = crud_embedding.active_model_name(db, cached=True)
+        embedding, dimension = self._embedding_for(model, db_obj.title, db_obj.author, db_obj.description, db_obj.id)
+        db.execute(delete(BookEmbedding).where(BookEmbedding.book_id == db_obj.id))
+        if embedding is not None:
+            updated_at = db.execute(
+                update(Book.__table__).where(Book.id == db_obj.id)
+                .values(embedding=embedding, embedding_model=model, embedding_dimension=dimension)
+                .returning(Book.updated_at)
+            ).scalar_one_or_none()
+            if updated_at is not None:
+                db_obj.embedding, db_obj.embedding_model, db_obj.embedding_dimension = embedding, model, dimension
+                db_obj.updated_at = updated_at
         db.commit()
-        db.refresh(db_obj)
         return db_obj
 
     def delete(self, db: Session, *, book_id: int) -> Optional[Book]:
-        obj = db.query(Book).get(book_id)
-        if obj:
-            db.delete(obj)
-            db.commit()
-            return obj
-        return None
+        """One DELETE ... RETURNING; None if the book did not exist."""
+        db_obj = db.scalars(
+            delete(Book).where(Book.id == book_id).returning(Book).execution_options(synchronize_session=False)
+        ).one_or_none()
+        return self._commit_returned(db, db_obj)
 
     def checkout(
         self, db: Session, *, book_id: int, user_id: int, due_date: datetime
@@ -119,13 +225,18 @@ class CRUDBook:
         db_obj = self.get(db, book_id)
         if db_obj:
             if not db_obj.is_available:
-                logger.warning(f"Attempt to check out already unavailable book ID: {book_id}")
+                logger.warning("Attempt to check out already unavailable book ID: %s", book_id)
                 return db_obj
             db_obj.is_available = False
             db_obj.checked_out_at = datetime.utcnow()
             db_obj.checked_out_by_id = user_id
             db_obj.due_date = due_date
             db.add(db_obj)
+            # Ledger entry commits atomically with the loan itself.
+            db.add(LoanEvent(
+                event_type="checkout", book_id=db_obj.id, user_id=user_id, author=db_obj.author,
+                occurred_at=db_obj.checked_out_at, due_date=due_date,
+            ))
             db.commit()
             db.refresh(db_obj)
         return db_obj
@@ -133,6 +244,10 @@ class CRUDBook:
     def checkin(self, db: Session, *, book_id: int) -> Optional[Book]:
         db_obj = self.get(db, book_id)
         if db_obj:
+            db.add(LoanEvent(
+                event_type="checkin", book_id=db_obj.id, user_id=db_obj.checked_out_by_id, author=db_obj.author,
+                occurred_at=datetime.utcnow(), due_date=db_obj.due_date,
+            ))
             db_obj.is_available = True
             db_obj.checked_out_at = None
             db_obj.checked_out_by_id = None
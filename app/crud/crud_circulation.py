@@ -0,0 +1,64 @@
+from typing import Dict, List, Optional, Tuple
+from datetime import date, datetime
+from sqlalchemy.orm import Session
+from sqlalchemy import func
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app.db.models.circulation_rollup import CirculationRollup
+from app.db.models.loan_event import LoanEvent
+
+DIMENSIONS = ("book", "author", "user")
+
+RollupKey = Tuple[str, str, date]
+
+
+class CRUDCirculation:
+    def events_after(self, db: Session, *, position: int, limit: int) -> List[LoanEvent]:
+        """Ledger rows with id > `position`, in id order."""
+        return (
+            db.query(LoanEvent)
+            .filter(LoanEvent.id > position)
+            .order_by(LoanEvent.id)
+            .limit(limit)
+            .all()
+        )
+
+    def add_borrows(self, db: Session, counts: Dict[RollupKey, int]) -> None:
+        """Add `counts` onto the daily rollup rows, creating missing ones, in one statement."""
+        if not counts:
+            return
+        now = datetime.utcnow()
+        rows = [
+            {"dimension": dimension, "key": key, "day": day, "borrows": borrows, "created_at": now, "updated_at": now}
+            for (dimension, key, day), borrows in counts.items()
+        ]
+        dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+        stmt = dialect.insert(CirculationRollup).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["dimension", "key", "day"],
+            set_={"borrows": CirculationRollup.borrows + stmt.excluded.borrows, "updated_at": stmt.excluded.updated_at},
+        )
+        db.execute(stmt)
+
+    def top(self, db: Session, *, dimension: str, since: Optional[date], limit: int) -> List[Tuple[str, int]]:
+        """Keys with the most borrows since `since` (all time if None)."""
+        total = func.sum(CirculationRollup.borrows).label("borrows")
+        query = db.query(CirculationRollup.key, total).filter(CirculationRollup.dimension == dimension)
+        if since is not None:
+            query = query.filter(CirculationRollup.day >= since)
+        return [
+            (key, int(borrows))
+            for key, borrows in query.group_by(CirculationRollup.key).order_by(total.desc(), CirculationRollup.key).limit(limit)
+        ]
+
+    def daily(self, db: Session, *, dimension: str, key: str, since: Optional[date]) -> List[Tuple[date, int]]:
+        """Borrows per day for one key since `since`, oldest first; days without borrows are omitted."""
+        query = db.query(CirculationRollup.day, CirculationRollup.borrows).filter(
+            CirculationRollup.dimension == dimension, CirculationRollup.key == key
+        )
+        if since is not None:
+            query = query.filter(CirculationRollup.day >= since)
+        return [(day, int(borrows)) for day, borrows in query.order_by(CirculationRollup.day)]
+
+
+circulation = CRUDCirculation()
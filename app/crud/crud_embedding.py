@@ -0,0 +1,198 @@
+from typing import List, Optional, Tuple
+from datetime import datetime
+from sqlalchemy.orm import Session
+from sqlalchemy import and_, bindparam, func, or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app.core.config import settings
+from app.db.models.book import Book
+from app.db.models.book_embedding import BookEmbedding
+from app.db.models.embedding_model import EmbeddingModel
+from app.utils.cache import LRUCache
+
+ACTIVE = "active"
+PENDING = "pending"
+RETIRED = "retired"
+
+# How long writers may keep embedding with a model after another worker has cut over.
+# Vectors written in that window carry the old model id and are re-embedded by the job.
+ACTIVE_MODEL_CACHE_SECONDS = 5.0
+
+# (book_id, stored embedding or None, dimension or None)
+EmbeddedRow = Tuple[int, Optional[str], Optional[int]]
+
+
+class CRUDEmbedding:
+    def __init__(self):
+        self._active_cache: LRUCache[str] = LRUCache(1, ttl=ACTIVE_MODEL_CACHE_SECONDS)
+
+    def active_model(self, db: Session) -> Optional[EmbeddingModel]:
+        return db.query(EmbeddingModel).filter(EmbeddingModel.status == ACTIVE).first()
+
+    def active_model_name(self, db: Session, cached: bool = False) -> str:
+        """
+        The model whose vectors are searched, `EMBEDDING_MODEL` until one is registered.
+        `cached=True` allows an answer up to `ACTIVE_MODEL_CACHE_SECONDS` old, for the write path.
+        """
+        name = self._active_cache.get(None) if cached else None
+        if name is None:
+            model = self.active_model(db)
+            name = model.name if model is not None else settings.EMBEDDING_MODEL
+            self._active_cache.put(None, name)
+        return name
+
+    def ensure_active_model(self, db: Session) -> EmbeddingModel:
+        """`active_model`, registering `EMBEDDING_MODEL` as active on an empty table."""
+        model = self.active_model(db)
+        if model is None:
+            now = datetime.utcnow()
+            dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+            db.execute(
+                dialect.insert(EmbeddingModel)
+                .values(name=settings.EMBEDDING_MODEL, status=ACTIVE, created_at=now, updated_at=now)
+                .on_conflict_do_nothing(index_elements=["name"])
+            )
+            db.commit()
+            model = db.query(EmbeddingModel).filter(EmbeddingModel.status == ACTIVE).one()
+        return model
+
+    def set_pending(self, db: Session, name: str) -> None:
+        """Mark `name` as the model being migrated to; any other pending model is retired."""
+        db.query(EmbeddingModel).filter(EmbeddingModel.status == PENDING, EmbeddingModel.name != name).update(
+            {EmbeddingModel.status: RETIRED}, synchronize_session=False
+        )
+        model = db.get(EmbeddingModel, name)
+        if model is None:
+            db.add(EmbeddingModel(name=name, status=PENDING))
+        elif model.status != PENDING:
+            model.status = PENDING
+        db.commit()
+
+    def books_without(self, db: Session, name: str, *, limit: int) -> List[Tuple[int, str, str, Optional[str]]]:
+        """`(id, title, author, description)` of books with no staged vector for `name`, in id order."""
+        staged = select(BookEmbedding.book_id).where(BookEmbedding.model == name)
+        return (
+            db.query(Book.id, Book.title, Book.author, Book.description)
+            .filter(Book.id.not_in(staged))
+            .order_by(Book.id)
+            .limit(limit)
+            .all()
+        )
+
+    def books_on_other_models(self, db: Session, name: str, *, limit: int) -> List[Tuple[int, str, str, Optional[str]]]:
+        """
+        `(id, title, author, description)` of books whose searched vector came from another
+        model, including vectors with no model recorded (written by code older than model
+        tracking, e.g. during a rolling upgrade), which are never indexed until re-embedded.
+        """
+        legacy = and_(Book.embedding_model.is_(None), Book.embedding.is_not(None))
+        return (
+            db.query(Book.id, Book.title, Book.author, Book.description)
+            .filter(or_(Book.embedding_model != name, legacy))
+            .order_by(Book.id)
+            .limit(limit)
+            .all()
+        )
+
+    def stage(self, db: Session, name: str, rows: List[EmbeddedRow]) -> None:
+        """Store vectors for the pending model `name`, replacing any staged earlier, in one statement."""
+        if not rows:
+            return
+        now = datetime.utcnow()
+        values = [
+            {"book_id": book_id, "model": name, "embedding": embedding, "dimension": dimension,
+             "created_at": now, "updated_at": now}
+            for book_id, embedding, dimension in rows
+        ]
+        dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+        stmt = dialect.insert(BookEmbedding).values(values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["book_id", "model"],
+            set_={"embedding": stmt.excluded.embedding, "dimension": stmt.excluded.dimension, "updated_at": now},
+        )
+        db.execute(stmt)
+        db.commit()
+
+    def replace_active(self, db: Session, name: str, rows: List[EmbeddedRow]) -> int:
+        """
+        Overwrite the searched vectors of books still on another model with `name`'s.
+        Books changed meanwhile (already on `name`) are left alone. Returns the rows updated.
+        """
+        if not rows:
+            return 0
+        stmt = (
+            update(Book.__table__)
+            .where(Book.id == bindparam("b_id"), or_(Book.embedding_model != name, Book.embedding_model.is_(None)))
+            .values(embedding=bindparam("b_embedding"), embedding_model=name, embedding_dimension=bindparam("b_dimension"))
+        )
+        result = db.execute(
+            stmt, [{"b_id": book_id, "b_embedding": embedding, "b_dimension": dimension} for book_id, embedding, dimension in rows]
+        )
+        db.commit()
+        return result.rowcount
+
+    def coverage(self, db: Session, name: str) -> Tuple[int, int]:
+        """`(books with a staged vector for name, all books)`."""
+        staged = (
+            db.query(func.count(BookEmbedding.book_id))
+            .join(Book, Book.id == BookEmbedding.book_id)
+            .filter(BookEmbedding.model == name)
+            .scalar()
+        )
+        return int(staged or 0), int(db.query(func.count(Book.id)).scalar() or 0)
+
+    def staged_embeddings(self, db: Session, name: str) -> List[Tuple[int, Optional[str]]]:
+        """`(book_id, embedding)` staged for `name`, ordered by book id, in the shape the index builder reads."""
+        return (
+            db.query(BookEmbedding.book_id, BookEmbedding.embedding)
+            .join(Book, Book.id == BookEmbedding.book_id)
+            .filter(BookEmbedding.model == name)
+            .order_by(BookEmbedding.book_id)
+            .all()
+        )
+
+    def cut_over(self, db: Session, name: str, dimension: Optional[int]) -> int:
+        """
+        In one transaction: move every staged vector of `name` into Book, drop the staged
+        copies, and make `name` the active model. Books without a staged vector keep
+        their old one, which is no longer indexed, until the job re-embeds them.
+        Returns the number of books switched.
+        """
+        try:
+            # Serializes concurrent cutovers; the loser finds nothing staged and an active `name`.
+            model = db.query(EmbeddingModel).filter(EmbeddingModel.name == name).with_for_update().one()
+            staged = select(BookEmbedding).where(BookEmbedding.model == name, BookEmbedding.book_id == Book.id)
+            switched = db.execute(
+                update(Book.__table__)
+                .where(staged.exists())
+                .values(
+                    embedding=staged.with_only_columns(BookEmbedding.embedding).scalar_subquery(),
+                    embedding_dimension=staged.with_only_columns(BookEmbedding.dimension).scalar_subquery(),
+                    embedding_model=name,
+                )
+            ).rowcount
+            db.query(BookEmbedding).filter(BookEmbedding.model == name).delete(synchronize_session=False)
+            db.query(EmbeddingModel).filter(EmbeddingModel.status == ACTIVE, EmbeddingModel.name != name).update(
+                {EmbeddingModel.status: RETIRED}, synchronize_session=False
+            )
+            model.status = ACTIVE
+            if dimension is not None:
+                model.dimension = dimension
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        self._active_cache.clear()
+        return switched
+
+    def clean_up(self, db: Session) -> int:
+        """Outside a migration: drop all staged vectors and retire stray pending models. Returns rows deleted."""
+        deleted = db.query(BookEmbedding).delete(synchronize_session=False)
+        db.query(EmbeddingModel).filter(EmbeddingModel.status == PENDING).update(
+            {EmbeddingModel.status: RETIRED}, synchronize_session=False
+        )
+        db.commit()
+        return deleted
+
+
+embedding = CRUDEmbedding()
@@ -0,0 +1,32 @@
+from typing import Optional
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.db.models.job_state import JobState
+
+
+class CRUDJobState:
+    def get(self, db: Session, name: str) -> Optional[JobState]:
+        return db.query(JobState).filter(JobState.name == name).first()
+
+    def lock(self, db: Session, name: str) -> JobState:
+        """Row lock on the job's state, held until commit, so concurrent runs serialize."""
+        state = db.query(JobState).filter(JobState.name == name).with_for_update().first()
+        if state is None:
+            state = JobState(name=name)
+            db.add(state)
+            db.flush()
+        return state
+
+    def try_lock(self, db: Session, name: str) -> Optional[JobState]:
+        """Like `lock`, but returns None at once while another transaction holds the row."""
+        if self.get(db, name) is None:
+            try:
+                db.add(JobState(name=name))
+                db.commit()
+            except IntegrityError:
+                db.rollback()
+        return db.query(JobState).filter(JobState.name == name).with_for_update(skip_locked=True).first()
+
+
+job_state = CRUDJobState()
@@ -0,0 +1,78 @@
+from typing import List, Optional
+from datetime import datetime
+from sqlalchemy.orm import Session
+from sqlalchemy import or_
+
+from app.db.models.book import Book
+from app.db.models.overdue_loan import OverdueLoan
+
+
+class CRUDOverdueLoan:
+    def find_newly_due(self, db: Session, *, since: Optional[datetime], until: datetime) -> List[Book]:
+        """Loans whose due date falls in [since, until): a range scan of ix_book_on_loan_due_date."""
+        query = db.query(Book).filter(Book.is_available == False, Book.due_date < until)
+        if since is not None:
+            query = query.filter(Book.due_date >= since)
+        return query.all()
+
+    def find_late_checkouts(
+        self, db: Session, *, checked_out_since: datetime, due_since: Optional[datetime], due_before: datetime
+    ) -> List[Book]:
+        """
+        Loans created since the last run with a due date in the window that run scanned,
+        [due_since, due_before): committed too late for it to see them. Bounded on both
+        sides so it is a range scan of ix_book_on_loan_due_date, not of every past-due loan.
+        """
+        query = db.query(Book).filter(
+            Book.is_available == False,
+            Book.due_date < due_before,
+            Book.checked_out_at >= checked_out_since,
+        )
+        if due_since is not None:
+            query = query.filter(Book.due_date >= due_since)
+        return query.all()
+
+    def upsert(self, db: Session, books: List[Book], detected_at: datetime) -> int:
+        """Record `books` as overdue; returns how many were not already in the set."""
+        if not books:
+            return 0
+        existing = {
+            row.book_id: row
+            for row in db.query(OverdueLoan).filter(OverdueLoan.book_id.in_([b.id for b in books])).all()
+        }
+        added = 0
+        for book_obj in books:
+            row = existing.get(book_obj.id)
+            if row is None:
+                db.add(OverdueLoan(
+                    book_id=book_obj.id, user_id=book_obj.checked_out_by_id,
+                    due_date=book_obj.due_date, detected_at=detected_at,
+                ))
+                added += 1
+            elif row.user_id != book_obj.checked_out_by_id or row.due_date != book_obj.due_date:
+                # A different loan of the same book.
+                row.user_id = book_obj.checked_out_by_id
+                row.due_date = book_obj.due_date
+                row.detected_at = detected_at
+                added += 1
+        return added
+
+    def resolve(self, db: Session, *, now: datetime) -> int:
+        """Drop loans that are no longer overdue (returned or renewed); cost scales with the overdue set."""
+        resolved_ids = [
+            book_id for (book_id,) in (
+                db.query(OverdueLoan.book_id)
+                .join(Book, Book.id == OverdueLoan.book_id)
+                .filter(or_(Book.is_available == True, Book.due_date.is_(None), Book.due_date >= now))
+                .all()
+            )
+        ]
+        if resolved_ids:
+            db.query(OverdueLoan).filter(OverdueLoan.book_id.in_(resolved_ids)).delete(synchronize_session=False)
+        return len(resolved_ids)
+
+    def count(self, db: Session) -> int:
+        return db.query(OverdueLoan).count()
+
+
+overdue_loan = CRUDOverdueLoan()
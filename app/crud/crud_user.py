@@ -1,5 +1,6 @@
 from typing import Optional, List
-from sqlalchemy.orm import Session
+from datetime import datetime
+from sqlalchemy.orm import Query, Session
 
 from app.db.models.user import User
 from app.schemas.user import UserCreate, UserUpdate
@@ -19,7 +20,10 @@ class CRUDUser:
     def get_multi(
         self, db: Session, *, skip: int = 0, limit: int = 100
     ) -> List[User]:
-        return db.query(User).offset(skip).limit(limit).all()
+        return self.list_query(db).offset(skip).limit(limit).all()
+
+    def list_query(self, db: Session) -> Query:
+        return db.query(User)
 
     def create(self, db: Session, *, obj_in: UserCreate) -> User:
         db_obj = User(
@@ -63,6 +67,13 @@ class CRUDUser:
         db.refresh(db_obj)
         return db_obj
 
+    def pin_reads_to_primary(self, db: Session, *, user_id: int, until: datetime) -> None:
+        """Send the user's reads to the primary until `until` (UTC), e.g. after one of their writes."""
+        db.query(User).filter(User.id == user_id).update(
+            {User.read_primary_until: until}, synchronize_session=False
+        )
+        db.commit()
+
     def is_active(self, user: User) -> bool:
         return user.is_active
 
@@ -1,2 +1,9 @@
 from .book import Book
-from .user import User 
\ No newline at end of file
+from .user import User
+from .job_state import JobState
+from .overdue_loan import OverdueLoan
+from .loan_event import LoanEvent
+from .circulation_rollup import CirculationRollup
+from .rate_limit_bucket import RateLimitBucket
+from .embedding_model import EmbeddingModel
+from .book_embedding import BookEmbedding
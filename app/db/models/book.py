@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, Text, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, Boolean, Text, ForeignKey, DateTime, Index, false
 from sqlalchemy.orm import relationship
 from app.db.base import Base
 
@@ -20,6 +20,20 @@ class Book(Base):
     
     # Vector embedding for semantic search
     embedding = Column(Text, nullable=True)
+    # Model and dimension that produced `embedding`; only vectors of the active model are indexed
+    embedding_model = Column(String(64), nullable=True, index=True)
+    embedding_dimension = Column(Integer, nullable=True)
     
     # Relationships
-    checked_out_by = relationship("User", back_populates="checked_out_books") 
\ No newline at end of file
+    checked_out_by = relationship("User", back_populates="checked_out_books")
+
+    __table_args__ = (
+        # Only loans are indexed: overdue scans and the overdue report never touch available books.
+        # Queries must filter on `is_available == False` to match the predicate.
+        Index(
+            "ix_book_on_loan_due_date", due_date, id,
+            postgresql_where=is_available == false(), sqlite_where=is_available == false(),
+        ),
+        # "Books checked out by this user".
+        Index("ix_book_checked_out_by_id_is_available", checked_out_by_id, is_available),
+    ) 
\ No newline at end of file
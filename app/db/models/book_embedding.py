@@ -0,0 +1,11 @@
+from sqlalchemy import Column, ForeignKey, Integer, String, Text
+from app.db.base import Base
+
+
+class BookEmbedding(Base):
+    # A book's vector under a model being migrated to, kept apart from the searched
+    # Book.embedding until cutover; embedding is NULL when the book has no text to embed
+    book_id = Column(Integer, ForeignKey("book.id", ondelete="CASCADE"), primary_key=True)
+    model = Column(String(64), primary_key=True, index=True)
+    dimension = Column(Integer, nullable=True)
+    embedding = Column(Text, nullable=True)
@@ -0,0 +1,15 @@
+from sqlalchemy import Column, Integer, String, Date, Index
+from app.db.base import Base
+
+
+class CirculationRollup(Base):
+    # Checkouts per day for one book, author or user, folded in incrementally from LoanEvent
+    dimension = Column(String(16), primary_key=True)  # "book", "author" or "user"
+    key = Column(String(255), primary_key=True)
+    day = Column(Date, primary_key=True)
+    borrows = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        # Top-N queries read one dimension over a window of days
+        Index("ix_circulationrollup_dimension_day", "dimension", "day"),
+    )
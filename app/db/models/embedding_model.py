@@ -0,0 +1,10 @@
+from sqlalchemy import Column, Integer, String
+from app.db.base import Base
+
+
+class EmbeddingModel(Base):
+    # One row per embedding model the catalog has used; exactly one is "active" (searched),
+    # at most one "pending" (being re-embedded into), the rest "retired"
+    name = Column(String(64), primary_key=True)
+    dimension = Column(Integer, nullable=True)
+    status = Column(String(16), nullable=False, index=True)
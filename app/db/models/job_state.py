@@ -0,0 +1,14 @@
+from sqlalchemy import Column, String, DateTime, BigInteger
+from app.db.base import Base
+
+
+class JobState(Base):
+    # One row per incremental background job
+    name = Column(String(64), primary_key=True)
+    # Everything up to this point has been processed; the next run starts here
+    high_water_mark = Column(DateTime, nullable=True)
+    # The mark before that: the start of the window the previous run scanned
+    previous_high_water_mark = Column(DateTime, nullable=True)
+    # For jobs that consume an append-only table: the last row id processed
+    position = Column(BigInteger, nullable=True)
+    last_run_at = Column(DateTime, nullable=True)
@@ -0,0 +1,15 @@
+from sqlalchemy import Column, BigInteger, Integer, String, DateTime
+from app.db.base import Base
+
+
+class LoanEvent(Base):
+    # Append-only loan ledger: rows are never updated or deleted. Book and user ids
+    # are not foreign keys so history survives deleting either.
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    event_type = Column(String(16), nullable=False)  # "checkout" or "checkin"
+    book_id = Column(Integer, nullable=False, index=True)
+    user_id = Column(Integer, nullable=True, index=True)
+    # Copied at event time so per-author history does not change when a book is edited
+    author = Column(String(255), nullable=True)
+    occurred_at = Column(DateTime, nullable=False)
+    due_date = Column(DateTime, nullable=True)
@@ -0,0 +1,10 @@
+from sqlalchemy import Column, Integer, ForeignKey, DateTime
+from app.db.base import Base
+
+
+class OverdueLoan(Base):
+    # Current overdue set, maintained incrementally by the overdue scanner
+    book_id = Column(Integer, ForeignKey("book.id", ondelete="CASCADE"), primary_key=True)
+    user_id = Column(Integer, ForeignKey("user.id", ondelete="CASCADE"), nullable=True, index=True)
+    due_date = Column(DateTime, nullable=False)
+    detected_at = Column(DateTime, nullable=False)
@@ -0,0 +1,9 @@
+from sqlalchemy import Column, String, Float, DateTime
+from app.db.base import Base
+
+
+class RateLimitBucket(Base):
+    # Shared token bucket for one rate-limited key (RATE_LIMIT_BACKEND="database")
+    key = Column(String(128), primary_key=True)
+    tokens = Column(Float, nullable=False)
+    refilled_at = Column(DateTime, nullable=False)
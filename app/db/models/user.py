@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, Enum as SAEnum
+from sqlalchemy import Column, DateTime, Integer, String, Boolean, Enum as SAEnum
 from sqlalchemy.orm import relationship
 from app.db.base import Base
 from app.core.roles import UserRole
@@ -13,6 +13,9 @@ class User(Base):
     google_id = Column(String(255), unique=True, nullable=True)
     
     role = Column(SAEnum(UserRole), default=UserRole.CUSTOMER, nullable=False)
+    # Until then (UTC) the user's reads go to the primary, after one of their own writes.
+    # Read with the user on every authenticated request, so it holds on every worker.
+    read_primary_until = Column(DateTime, nullable=True)
     
     # Relationships
     checked_out_books = relationship("Book", back_populates="checked_out_by")
@@ -0,0 +1,162 @@
+"""
+SQLAlchemy query profiler.
+
+Cursor-level event hooks count statements and accumulate execution time on the
+current RequestContext, log slow statements with redacted bind parameters and
+flag requests that repeat the same SELECT (the N+1 pattern).
+"""
+import logging
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Iterator, List, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+from app.core.metrics import DB_N_PLUS_ONE, DB_SLOW_QUERIES, route_template
+from app.core.request_context import RequestContext, get_request_context
+
+logger = logging.getLogger(__name__)
+
+
+def redact_parameters(parameters: Any) -> Any:
+    """Keep the shape of bind parameters (names, arity) but never their values."""
+    if isinstance(parameters, dict):
+        return {key: "?" for key in parameters}
+    if isinstance(parameters, (list, tuple)):
+        if parameters and isinstance(parameters[0], (dict, list, tuple)):
+            return f"<{len(parameters)} parameter sets>"
+        return ["?"] * len(parameters)
+    return "?" if parameters is not None else None
+
+
+def repeated_statements(statements: Counter, threshold: int) -> List[Tuple[str, int]]:
+    return [
+        (statement, count)
+        for statement, count in statements.items()
+        if count >= threshold and statement.lstrip()[:6].upper() == "SELECT"
+    ]
+
+
+class QueryCollector:
+    """Records every statement executed on instrumented engines while active."""
+
+    def __init__(self):
+        self.count = 0
+        self.total_time = 0.0
+        self.statements: Counter = Counter()
+
+    def record(self, statement: str, elapsed: float) -> None:
+        self.count += 1
+        self.total_time += elapsed
+        self.statements[statement] += 1
+
+
+_collectors: List[QueryCollector] = []
+_collectors_lock = threading.Lock()
+
+
+def _record(statement: str, parameters: Any, elapsed: float) -> None:
+    request_context = get_request_context()
+    if request_context is not None:
+        request_context.db_queries += 1
+        request_context.db_time += elapsed
+        statements = request_context.db_statements
+        statements[statement] = statements.get(statement, 0) + 1
+
+    if _collectors:
+        with _collectors_lock:
+            for collector in _collectors:
+                collector.record(statement, elapsed)
+
+    if elapsed * 1000 >= settings.DB_SLOW_QUERY_MS:
+        DB_SLOW_QUERIES.inc()
+        logger.warning(
+            "Slow query (%.1f ms): %s | params=%s",
+            elapsed * 1000, statement, redact_parameters(parameters),
+        )
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Attach cursor-level hooks that feed the request profile, collectors and slow-query log."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start_time"].pop()
+        _record(statement, parameters, elapsed)
+
+
+def _report_repeated_statements(request_context: RequestContext, route: str) -> int:
+    repeated = repeated_statements(Counter(request_context.db_statements), settings.DB_N_PLUS_ONE_THRESHOLD)
+    if repeated:
+        DB_N_PLUS_ONE.labels(route).inc()
+        for statement, count in repeated:
+            logger.warning("Possible N+1 on %s: statement executed %d times: %s", route, count, statement)
+    return len(repeated)
+
+
+class QueryProfilerMiddleware:
+    """
+    Flags N+1 patterns per request and, when DEBUG is on, reports DB usage in
+    `Server-Timing` and `X-DB-Queries` response headers.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        request_context = get_request_context()
+        if scope["type"] != "http" or request_context is None:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message):
+            if settings.DEBUG and message["type"] == "http.response.start":
+                repeated = len(repeated_statements(
+                    Counter(request_context.db_statements), settings.DB_N_PLUS_ONE_THRESHOLD
+                ))
+                headers = list(message.get("headers", []))
+                headers.append((
+                    b"server-timing",
+                    f'db;dur={request_context.db_time * 1000:.2f};desc="{request_context.db_queries} queries"'.encode(),
+                ))
+                headers.append((b"x-db-queries", str(request_context.db_queries).encode()))
+                headers.append((b"x-db-repeated-queries", str(repeated).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _report_repeated_statements(request_context, route_template(scope))
+
+
+@contextmanager
+def assert_max_queries(max_queries: int) -> Iterator[QueryCollector]:
+    """
+    Test helper: fail if the block executes more than `max_queries` statements.
+
+        with assert_max_queries(3):
+            client.get(f"/api/v1/books/{book_id}", headers=auth_headers)
+
+    Collection is process-wide (not context-local) so it also sees statements run
+    by the app under `TestClient`, which executes requests in another thread.
+    """
+    collector = QueryCollector()
+    with _collectors_lock:
+        _collectors.append(collector)
+    try:
+        yield collector
+    finally:
+        with _collectors_lock:
+            _collectors.remove(collector)
+    if collector.count > max_queries:
+        details = "\n".join(f"  {count}x {statement}" for statement, count in collector.statements.most_common())
+        raise AssertionError(f"Expected at most {max_queries} queries, got {collector.count}:\n{details}")
@@ -0,0 +1,123 @@
+"""
+Read-replica routing.
+
+`ReplicaRouter` hands out replica engines round-robin and skips a replica for a
+while after it drops a connection. `ReadYourWritesMiddleware` keeps a client on
+the primary for a short window after it changed something, so it never reads
+its own write back from a replica that has not replayed it yet. The window is
+recorded on the authenticated user's row, which every request reads from the
+primary anyway, so it holds for Bearer-token clients on whichever worker serves
+the next request; a cookie carries it too, for requests made before sign-in.
+"""
+import itertools
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.core.request_context import get_request_context
+from app.crud.crud_user import user as crud_user
+
+logger = logging.getLogger(__name__)
+
+READ_PRIMARY_COOKIE = "read_primary_until"
+SAFE_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+
+class ReplicaRouter:
+    def __init__(self, primary: Engine, replicas: List[Engine], retry_seconds: float):
+        self.primary = primary
+        self.replicas = replicas
+        self.retry_seconds = retry_seconds
+        self._cycle = itertools.cycle(range(len(replicas)))
+        # Replica position -> monotonic time it may be tried again.
+        self._down_until: Dict[int, float] = {}
+        self._lock = threading.Lock()
+        for position, replica in enumerate(replicas):
+            self._watch(position, replica)
+
+    def next_engine(self) -> Engine:
+        """The next healthy replica in turn; the primary if there is none."""
+        if not self.replicas:
+            return self.primary
+        now = time.monotonic()
+        with self._lock:
+            for _ in range(len(self.replicas)):
+                position = next(self._cycle)
+                if self._down_until.get(position, 0.0) <= now:
+                    return self.replicas[position]
+        return self.primary
+
+    def mark_down(self, position: int) -> None:
+        with self._lock:
+            self._down_until[position] = time.monotonic() + self.retry_seconds
+        logger.warning("Read replica %s lost its connection; using the others for %.0fs.", position, self.retry_seconds)
+
+    def _watch(self, position: int, replica: Engine) -> None:
+        @event.listens_for(replica, "handle_error")
+        def _handle_error(context):
+            if context.is_disconnect:
+                self.mark_down(position)
+
+
+def reads_from_primary(
+    cookies: Dict[str, str], user_until: Optional[datetime] = None, now: Optional[float] = None
+) -> bool:
+    """True while the client's read-your-writes window is open, by its user row or its cookie."""
+    now = now if now is not None else time.time()
+    if user_until is not None and user_until > datetime.utcfromtimestamp(now):
+        return True
+    try:
+        until = float(cookies.get(READ_PRIMARY_COOKIE, 0))
+    except ValueError:
+        return False
+    return until > now
+
+
+class ReadYourWritesMiddleware:
+    """
+    Pure ASGI middleware: after a successful non-GET request, send the client's reads
+    to the primary for `window_seconds`. The window is stored on the authenticated
+    user's row before the response goes out, and also set as a cookie.
+    """
+
+    def __init__(self, app, window_seconds: float, session_factory: Callable[[], Session]):
+        self.app = app
+        self.window_seconds = window_seconds
+        self._session_factory = session_factory
+
+    def _pin_user(self, user_id: int, until: float) -> None:
+        db = self._session_factory()
+        try:
+            crud_user.pin_reads_to_primary(db, user_id=user_id, until=datetime.utcfromtimestamp(until))
+        except Exception as e:
+            db.rollback()
+            logger.warning("Could not pin reads of user %s to the primary: %s", user_id, e)
+        finally:
+            db.close()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope.get("method") in SAFE_METHODS or self.window_seconds <= 0:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                until = time.time() + self.window_seconds
+                request_context = get_request_context()
+                if request_context is not None and request_context.user_id is not None:
+                    await run_in_threadpool(self._pin_user, request_context.user_id, until)
+                cookie = (
+                    f"{READ_PRIMARY_COOKIE}={until:.3f}; Max-Age={int(self.window_seconds) + 1}; "
+                    f"Path=/; HttpOnly; SameSite=Lax"
+                )
+                message = {**message, "headers": list(message.get("headers", [])) + [(b"set-cookie", cookie.encode())]}
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
@@ -1,14 +1,38 @@
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
+from app.db.profiler import instrument_engine
+from app.db.replicas import ReplicaRouter
 
-engine = create_engine(settings.DATABASE_URL)
+
+def _create_engine(url: str):
+    connect_args = {}
+    if url.startswith("sqlite"):
+        # Local/benchmark runs: FastAPI serves sync routes from a threadpool.
+        connect_args = {"check_same_thread": False, "timeout": 30}
+    db_engine = create_engine(url, connect_args=connect_args)
+    if settings.DB_PROFILER_ENABLED:
+        instrument_engine(db_engine)
+    return db_engine
+
+
+engine = _create_engine(settings.DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Read-only traffic is spread over the replicas; with none configured it stays on the primary.
+replica_engines = [_create_engine(url) for url in settings.DATABASE_REPLICA_URLS]
+replica_router = ReplicaRouter(engine, replica_engines, settings.DB_REPLICA_RETRY_SECONDS)
+
+
+def ReadSessionLocal(primary: bool = False):
+    """Session for reads only: bound to the next healthy replica, or the primary if asked or none is up."""
+    bind = engine if primary else replica_router.next_engine()
+    return SessionLocal(bind=bind)
+
 
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
@@ -1,19 +1,32 @@
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-import logging # Added for logging
+import logging
 
-from app.api.routes import books, auth, search, users # Added users router
+from app.api import deps
+from app.api.routes import books, auth, search, users, metrics, health, circulation, profiling # Added users router
 from app.core.config import settings
-from app.db.session import SessionLocal # For startup event
-from app.services.search_service import search_service # For startup event
+from app.core.logging_config import configure_logging, shutdown_logging
+from app.core.metrics import MetricsMiddleware
+from app.core.request_context import RequestContextMiddleware
+from app.core.sampling_profiler import continuous_profiler
+from app.db.profiler import QueryProfilerMiddleware
+from app.db.replicas import ReadYourWritesMiddleware
+from app.db.session import SessionLocal
+from app.services.search_service import search_service # For shutdown
+from app.services.index_scheduler import index_scheduler
+from app.services.overdue_scanner import overdue_scanner
+from app.services.circulation import circulation_rollups
+from app.services.reembed import reembed_job
+from app.services.warmup import start_background_warmup
 
-# Configure basic logging
-logging.basicConfig(level=logging.INFO)
+configure_logging(settings.LOG_LEVEL, settings.LOG_FORMAT, settings.LOG_SAMPLING)
 logger = logging.getLogger(__name__)
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
-    openapi_url=f"{settings.API_V1_STR}/openapi.json"
+    openapi_url=f"{settings.API_V1_STR}/openapi.json",
+    # Opt-in per-request profiling for superusers; a no-op unless the request asks for it.
+    dependencies=[Depends(deps.profile_request)],
 )
 
 # Set all CORS enabled origins
@@ -24,25 +37,51 @@ if settings.BACKEND_CORS_ORIGINS:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=["X-Total-Count", "X-Total-Count-Exact", "X-Request-ID", "X-Profile-Id"],
     )
 
+# Middleware added last runs first: RequestContext -> Metrics -> QueryProfiler -> ReadYourWrites.
+if settings.DATABASE_REPLICA_URLS:
+    app.add_middleware(
+        ReadYourWritesMiddleware, window_seconds=settings.DB_READ_YOUR_WRITES_SECONDS, session_factory=SessionLocal
+    )
+if settings.DB_PROFILER_ENABLED:
+    app.add_middleware(QueryProfilerMiddleware)
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+app.add_middleware(RequestContextMiddleware)
+
 @app.on_event("startup")
 def on_startup():
-    logger.info("Application startup: Building FAISS index...")
-    db = SessionLocal()
-    try:
-        search_service.build_index(db)
-        logger.info("FAISS index built successfully on startup.")
-    except Exception as e:
-        logger.error(f"Error building FAISS index on startup: {e}", exc_info=True)
-    finally:
-        db.close()
+    # The index load can take minutes on a large catalog; do it in the background so
+    # the process answers liveness probes at once. /health/ready reports when it is done.
+    logger.info("Application startup: loading search index and warming pools in the background...")
+    start_background_warmup()
+    overdue_scanner.start()
+    circulation_rollups.start()
+    reembed_job.start()
+    continuous_profiler.start()
+
+@app.on_event("shutdown")
+def on_shutdown():
+    index_scheduler.stop()
+    overdue_scanner.stop()
+    circulation_rollups.stop()
+    reembed_job.stop()
+    continuous_profiler.stop()
+    search_service.shutdown()
+    shutdown_logging()
 
 # Include routers
 app.include_router(auth.router, prefix=f"{settings.API_V1_STR}/auth", tags=["auth"])
 app.include_router(users.router, prefix=f"{settings.API_V1_STR}/users", tags=["users"]) # Added users router
 app.include_router(books.router, prefix=f"{settings.API_V1_STR}/books", tags=["books"])
 app.include_router(search.router, prefix=f"{settings.API_V1_STR}/search", tags=["search"])
+app.include_router(circulation.router, prefix=f"{settings.API_V1_STR}/circulation", tags=["circulation"])
+app.include_router(profiling.router, prefix=f"{settings.API_V1_STR}/profiling", tags=["profiling"])
+if settings.METRICS_ENABLED:
+    app.include_router(metrics.router, tags=["metrics"])
+app.include_router(health.router, tags=["health"])
 
 @app.get("/")
 def root():
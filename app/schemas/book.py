@@ -1,6 +1,6 @@
 from typing import Optional, List
 from datetime import datetime
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class BookBase(BaseModel):
@@ -74,4 +74,58 @@ class BookSearchResultItem(BaseModel):
     # then BookSearchResultItem's Config might still need from_attributes = True, or ensure BookPublic.from_orm is called.
     # For now, assuming the data structure from search_service is compatible or BookPublic handles it.
     class Config:
-        from_attributes = True # Keep this for safety if the book object could be a raw model instance 
\ No newline at end of file
+        from_attributes = True # Keep this for safety if the book object could be a raw model instance 
+
+# One overdue loan in the overdue report
+class OverdueBook(BaseModel):
+    id: int
+    title: str
+    author: str
+    isbn: Optional[str] = None
+    checked_out_by_id: Optional[int] = None
+    checked_out_at: Optional[datetime] = None
+    due_date: datetime
+    days_overdue: int
+
+    class Config:
+        from_attributes = True
+
+
+# A page of the overdue report; pass next_cursor back as `cursor` for the next page
+class OverdueReportPage(BaseModel):
+    items: List[OverdueBook]
+    next_cursor: Optional[str] = None
+
+
+# Request body for POST /books/batch
+class BookBatchRequest(BaseModel):
+    ids: List[int] = Field(..., min_length=1)
+
+
+# Books found, in the order their ids were requested, and the requested ids that do not exist
+class BookBatch(BaseModel):
+    items: List[BookPublic]
+    missing_ids: List[int]
+
+
+# Request body for batched semantic search; filters apply to every query
+class BatchSemanticSearchRequest(BaseModel):
+    queries: List[str] = Field(..., min_length=1)
+    k: int = Field(5, ge=1)
+    available: Optional[bool] = None
+    author: Optional[str] = None
+    publisher: Optional[str] = None
+    year_from: Optional[int] = None
+    year_to: Optional[int] = None
+
+
+# Results for one query of a batch, in request order
+class BatchSemanticSearchResult(BaseModel):
+    query: str
+    results: List[BookSearchResultItem]
+
+
+# A page of semantic search results; pass next_cursor back as `cursor`, with the same query and filters
+class SemanticSearchPage(BaseModel):
+    items: List[BookSearchResultItem]
+    next_cursor: Optional[str] = None
@@ -0,0 +1,31 @@
+from typing import List, Optional
+from datetime import date, datetime
+from pydantic import BaseModel
+
+
+# Borrow counts read from the incrementally refreshed rollups; `refreshed_through`
+# is the newest loan event they include.
+class CirculationCount(BaseModel):
+    key: str
+    borrows: int
+
+
+class CirculationTop(BaseModel):
+    dimension: str
+    window: str
+    items: List[CirculationCount]
+    refreshed_through: Optional[datetime] = None
+
+
+class CirculationDay(BaseModel):
+    day: date
+    borrows: int
+
+
+class CirculationHistory(BaseModel):
+    dimension: str
+    key: str
+    window: str
+    borrows: int
+    days: List[CirculationDay]
+    refreshed_through: Optional[datetime] = None
@@ -0,0 +1,215 @@
+"""
+Admission control for semantic search.
+
+Two independent gates run before a search starts:
+
+* a token bucket per user, refilled at the rate configured for the user's role,
+  so one client cannot monopolize the endpoint;
+* a process-wide cap on concurrent searches with a short, bounded wait queue, so
+  semantic searches never hold every threadpool slot and cheap endpoints stay fast.
+
+Both reject with `AdmissionRejected`, which carries a Retry-After hint, instead of
+letting requests pile up. Buckets live in this process by default; with
+`RATE_LIMIT_BACKEND="database"` they are shared by all workers through the
+`ratelimitbucket` table, and the in-process buckets stand in while the database
+is unreachable.
+"""
+import logging
+import math
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.metrics import SEARCH_ADMISSION_IN_FLIGHT, SEARCH_ADMISSION_QUEUE_DEPTH, SEARCH_ADMISSION_REJECTIONS
+from app.db.models.rate_limit_bucket import RateLimitBucket
+from app.db.session import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Local buckets kept before idle (refilled) ones are dropped.
+LOCAL_BUCKET_LIMIT = 10000
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+class CostExceedsBurst(Exception):
+    """A request costing more than the user's bucket can ever hold; retrying cannot help."""
+
+
+def _refill(tokens: float, elapsed: float, rate: float, capacity: float) -> float:
+    return min(capacity, tokens + max(0.0, elapsed) * rate)
+
+
+def _wait_for(tokens: float, cost: float, rate: float) -> float:
+    return (cost - tokens) / rate
+
+
+class LocalRateLimitBackend:
+    """Token buckets in this process: exact per worker, so the effective limit is per worker."""
+
+    def __init__(self):
+        self._buckets: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def take(self, key: str, cost: float, rate: float, capacity: float) -> float:
+        """Take `cost` tokens; returns 0 on success, or the seconds until they would be available."""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= LOCAL_BUCKET_LIMIT:
+                    self._prune(now, rate, capacity)
+                bucket = self._buckets[key] = [capacity, now]
+            tokens = _refill(bucket[0], now - bucket[1], rate, capacity)
+            bucket[1] = now
+            if tokens < cost:
+                bucket[0] = tokens
+                return _wait_for(tokens, cost, rate)
+            bucket[0] = tokens - cost
+            return 0.0
+
+    def _prune(self, now: float, rate: float, capacity: float) -> None:
+        full = [key for key, (tokens, at) in self._buckets.items() if _refill(tokens, now - at, rate, capacity) >= capacity]
+        for key in full:
+            del self._buckets[key]
+
+
+class DatabaseRateLimitBackend:
+    """
+    Token buckets shared by every worker, one row per key, updated under a row lock.
+    Costs one short transaction per admission.
+    """
+
+    def __init__(self, session_factory: Callable[[], Session], fallback: LocalRateLimitBackend):
+        self._session_factory = session_factory
+        self._fallback = fallback
+
+    def take(self, key: str, cost: float, rate: float, capacity: float) -> float:
+        db = self._session_factory()
+        try:
+            now = datetime.utcnow()
+            dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+            db.execute(
+                dialect.insert(RateLimitBucket)
+                .values(key=key, tokens=capacity, refilled_at=now, created_at=now, updated_at=now)
+                .on_conflict_do_nothing(index_elements=["key"])
+            )
+            bucket = db.query(RateLimitBucket).filter(RateLimitBucket.key == key).with_for_update().one()
+            tokens = _refill(bucket.tokens, (now - bucket.refilled_at).total_seconds(), rate, capacity)
+            bucket.refilled_at = now
+            if tokens < cost:
+                bucket.tokens = tokens
+                wait = _wait_for(tokens, cost, rate)
+            else:
+                bucket.tokens = tokens - cost
+                wait = 0.0
+            db.commit()
+            return wait
+        except Exception as e:
+            db.rollback()
+            logger.warning("Shared rate limit unavailable, using local buckets: %s", e)
+            return self._fallback.take(key, cost, rate, capacity)
+        finally:
+            db.close()
+
+
+class RateLimiter:
+    def __init__(self, backend, limits_per_minute: Dict[str, float], burst: int):
+        self.backend = backend
+        self.limits_per_minute = limits_per_minute
+        self.burst = burst
+
+    def check(self, user_id: int, role: str, cost: int = 1) -> None:
+        """Charge `cost` requests to the user's bucket; raises AdmissionRejected when it is empty."""
+        per_minute = self.limits_per_minute.get(role, 0)
+        if per_minute <= 0:
+            return
+        rate = per_minute / 60.0
+        capacity = float(max(self.burst, 1))
+        if cost > capacity:
+            SEARCH_ADMISSION_REJECTIONS.labels("cost_exceeds_burst").inc()
+            raise CostExceedsBurst(f"A batch may cost at most {int(capacity)} searches, got {cost}")
+        wait = self.backend.take(f"search:{user_id}", float(cost), rate, capacity)
+        if wait > 0:
+            SEARCH_ADMISSION_REJECTIONS.labels("rate_limited").inc()
+            raise AdmissionRejected("Rate limit exceeded", wait)
+
+
+class ConcurrencyLimiter:
+    """
+    At most `max_concurrent` holders at once; up to `max_queue` more wait in FIFO
+    order for at most `queue_timeout` seconds. Anything beyond that is rejected at once.
+    """
+
+    def __init__(self, max_concurrent: int, max_queue: int, queue_timeout: float):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._active = 0
+        self._waiting: List[threading.Event] = []
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        if self.max_concurrent <= 0:
+            return
+        with self._lock:
+            if self._active < self.max_concurrent and not self._waiting:
+                self._active += 1
+                SEARCH_ADMISSION_IN_FLIGHT.set(self._active)
+                return
+            if len(self._waiting) >= self.max_queue:
+                SEARCH_ADMISSION_REJECTIONS.labels("queue_full").inc()
+                raise AdmissionRejected("Too many concurrent searches", self.queue_timeout or 1.0)
+            turn = threading.Event()
+            self._waiting.append(turn)
+            SEARCH_ADMISSION_QUEUE_DEPTH.set(len(self._waiting))
+
+        if turn.wait(self.queue_timeout):
+            return
+        with self._lock:
+            if turn.is_set():
+                # Handed a slot just as the wait timed out.
+                return
+            self._waiting.remove(turn)
+            SEARCH_ADMISSION_QUEUE_DEPTH.set(len(self._waiting))
+        SEARCH_ADMISSION_REJECTIONS.labels("queue_timeout").inc()
+        raise AdmissionRejected("Timed out waiting for a search slot", self.queue_timeout)
+
+    def release(self) -> None:
+        if self.max_concurrent <= 0:
+            return
+        with self._lock:
+            if self._waiting:
+                # Pass the slot straight to the oldest waiter; `_active` is unchanged.
+                self._waiting.pop(0).set()
+                SEARCH_ADMISSION_QUEUE_DEPTH.set(len(self._waiting))
+            else:
+                self._active -= 1
+                SEARCH_ADMISSION_IN_FLIGHT.set(self._active)
+
+
+def _rate_limit_backend():
+    local = LocalRateLimitBackend()
+    if settings.RATE_LIMIT_BACKEND == "database":
+        return DatabaseRateLimitBackend(SessionLocal, fallback=local)
+    return local
+
+
+search_rate_limiter = RateLimiter(_rate_limit_backend(), settings.SEARCH_RATE_LIMITS, settings.SEARCH_RATE_BURST)
+search_concurrency = ConcurrencyLimiter(
+    settings.SEARCH_MAX_CONCURRENT, settings.SEARCH_MAX_QUEUE, settings.SEARCH_QUEUE_TIMEOUT_SECONDS
+)
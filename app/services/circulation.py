@@ -0,0 +1,99 @@
+"""
+Incremental circulation rollups over the append-only loan ledger.
+
+Each refresh folds ledger rows with ids above the stored position into daily
+borrow counts per book, author and user. Rows younger than a short settle delay
+are left for the next run: ids are allocated before commit, so a transaction
+still in flight could otherwise commit an id below a position already recorded.
+"""
+import logging
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.crud.crud_circulation import circulation as crud_circulation
+from app.crud.crud_job_state import job_state as crud_job_state
+from app.db.session import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+JOB_NAME = "circulation_rollup"
+BATCH_SIZE = 5000
+SETTLE_SECONDS = 30
+
+
+class CirculationRollupJob:
+    def __init__(self, session_factory: Callable[[], Session], interval_seconds: float):
+        self._session_factory = session_factory
+        self.interval_seconds = interval_seconds
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self.interval_seconds <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="circulation-rollup", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def refresh(self, db: Session, now: Optional[datetime] = None) -> int:
+        """Fold new ledger rows into the rollups; returns how many rows were folded in."""
+        before = (now or datetime.utcnow()) - timedelta(seconds=SETTLE_SECONDS)
+        folded = 0
+        while True:
+            # One transaction per batch, each holding the job row lock, so a crash loses nothing.
+            try:
+                state = crud_job_state.lock(db, JOB_NAME)
+                fetched = crud_circulation.events_after(db, position=state.position or 0, limit=BATCH_SIZE)
+                # Stop at the first unsettled row so the position never passes an id still being committed.
+                settled = next((i for i, event in enumerate(fetched) if event.occurred_at >= before), len(fetched))
+                events = fetched[:settled]
+                counts: Counter = Counter()
+                for event in events:
+                    if event.event_type != "checkout":
+                        continue
+                    day = event.occurred_at.date()
+                    counts[("book", str(event.book_id), day)] += 1
+                    if event.author:
+                        counts[("author", event.author, day)] += 1
+                    if event.user_id is not None:
+                        counts[("user", str(event.user_id), day)] += 1
+                crud_circulation.add_borrows(db, counts)
+                if events:
+                    state.position = events[-1].id
+                    state.high_water_mark = events[-1].occurred_at
+                state.last_run_at = datetime.utcnow()
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+            folded += len(events)
+            if len(events) < BATCH_SIZE:
+                break
+        if folded:
+            logger.info("Circulation rollups: folded in %s loan events.", folded)
+        return folded
+
+    def refreshed_through(self, db: Session) -> Optional[datetime]:
+        """Time of the newest ledger row reflected in the rollups."""
+        state = crud_job_state.get(db, JOB_NAME)
+        return state.high_water_mark if state is not None else None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_seconds):
+            db = self._session_factory()
+            try:
+                self.refresh(db)
+            except Exception as e:
+                logger.error("Error refreshing circulation rollups: %s", e, exc_info=True)
+            finally:
+                db.close()
+
+
+circulation_rollups = CirculationRollupJob(SessionLocal, settings.CIRCULATION_ROLLUP_INTERVAL_SECONDS)
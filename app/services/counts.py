@@ -0,0 +1,107 @@
+"""
+Cheap row totals for paginated list endpoints.
+
+A filtered list is counted exactly, but only up to `COUNT_EXACT_LIMIT` rows
+(`SELECT count(*) FROM (... LIMIT n + 1)`), so a broad filter costs at most a
+bounded scan. Past that limit, or for an unfiltered table on PostgreSQL, the
+planner's estimate is used instead: `pg_class.reltuples` for a whole table and
+the row estimate of `EXPLAIN` for a filtered query. Results are cached for a few
+seconds per table; writes through this process drop the table's cached counts.
+"""
+import json
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Dict, Hashable, Optional
+
+from fastapi import Response
+from sqlalchemy import func, select, text
+from sqlalchemy.orm import Query, Session
+
+from app.core.config import settings
+from app.utils.cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class CountResult:
+    total: int
+    exact: bool
+
+
+class RowCounter:
+    def __init__(self, exact_limit: int, ttl: float, maxsize: int = 1024):
+        self.exact_limit = exact_limit
+        self._cache: LRUCache[CountResult] = LRUCache(maxsize, ttl=ttl)
+        # Bumping a table's generation orphans its cached counts; the LRU evicts them.
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def invalidate(self, table: str) -> None:
+        with self._lock:
+            self._generations[table] = self._generations.get(table, 0) + 1
+
+    def count(self, db: Session, query: Query, *, table: str, key: Hashable = None) -> CountResult:
+        """
+        Total rows matched by `query` (without offset/limit). `key` identifies the
+        filter (None for the whole table) and must be hashable.
+        """
+        cache_key = (table, self._generations.get(table, 0), key)
+        cached = self._cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        postgres = db.get_bind().dialect.name == "postgresql"
+        result = None
+        if key is None and postgres:
+            estimate = self._table_estimate(db, table)
+            if estimate is not None and estimate > self.exact_limit:
+                result = CountResult(total=estimate, exact=False)
+        if result is None:
+            result = self._bounded_count(db, query)
+        if result is None:
+            estimate = self._query_estimate(db, query) if postgres else None
+            if estimate is not None:
+                # The bounded count proved there are more rows than the limit.
+                result = CountResult(total=max(estimate, self.exact_limit + 1), exact=False)
+            else:
+                result = CountResult(total=query.order_by(None).count(), exact=True)
+        self._cache.put(cache_key, result)
+        return result
+
+    def _bounded_count(self, db: Session, query: Query) -> Optional[CountResult]:
+        """Exact count if it is at most `exact_limit`, otherwise None."""
+        bounded = query.order_by(None).with_entities(text("1")).limit(self.exact_limit + 1).subquery()
+        total = db.execute(select(func.count()).select_from(bounded)).scalar_one()
+        return CountResult(total=total, exact=True) if total <= self.exact_limit else None
+
+    def _table_estimate(self, db: Session, table: str) -> Optional[int]:
+        reltuples = db.execute(
+            text("SELECT reltuples FROM pg_class WHERE oid = to_regclass(quote_ident(:table))"), {"table": table}
+        ).scalar()
+        # reltuples is -1 (PostgreSQL 14+) or 0 for a table that was never analyzed.
+        if reltuples is None or reltuples <= 0:
+            return None
+        return int(reltuples)
+
+    def _query_estimate(self, db: Session, query: Query) -> Optional[int]:
+        compiled = query.order_by(None).statement.compile(dialect=db.get_bind().dialect)
+        try:
+            # A savepoint keeps a failed EXPLAIN from aborting the request's transaction.
+            with db.begin_nested():
+                plan = db.connection().exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params).scalar()
+        except Exception as e:
+            logger.warning("Error estimating row count: %s", e)
+            return None
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def set_total_headers(response: Response, result: CountResult) -> None:
+    response.headers["X-Total-Count"] = str(result.total)
+    response.headers["X-Total-Count-Exact"] = "true" if result.exact else "false"
+
+
+row_counter = RowCounter(settings.COUNT_EXACT_LIMIT, settings.COUNT_CACHE_TTL_SECONDS)
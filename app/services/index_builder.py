@@ -0,0 +1,86 @@
+"""
+Out-of-process builds of the semantic search index.
+
+Decoding stored embeddings is pure Python and holds the GIL for most of a build,
+so an in-process rebuild starves the threadpool serving requests. With
+`SEARCH_BUILD_OUT_OF_PROCESS` enabled, a spawned builder process reads the
+embeddings over its own connection and writes a snapshot directory; the serving
+process only maps the finished files and swaps them in.
+"""
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+from typing import Any, Dict, Optional
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import NullPool
+
+from app.services.index_store import write_snapshot_dir
+
+logger = logging.getLogger(__name__)
+
+
+def build_snapshot_dir(
+    database_url: str, index_factory: str, embedding_decoder: Any, directory: str, shards: int = 1,
+    embedding_model: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Builder process entry point: build the index from the database and write it to `directory`.
+    Returns the snapshot metadata.
+    """
+    # Imported here: the builder runs in a freshly spawned interpreter.
+    from app.crud.crud_book import book as crud_book
+    from app.services.search_service import SearchService
+
+    engine = create_engine(database_url, poolclass=NullPool)
+    try:
+        with Session(engine) as db:
+            rows = crud_book.get_stored_embeddings(db, model=embedding_model)
+    finally:
+        engine.dispose()
+    built = SearchService(index_factory, embedding_decoder, shards=shards).build_from_rows(rows)
+    return write_snapshot_dir(
+        directory, built.index, built.id_map.book_ids, built.dimension, {"embedding_model": embedding_model}
+    )
+
+
+class ProcessIndexBuilder:
+    """
+    Runs `build_snapshot_dir` in a single long-lived builder process, started on first use.
+
+    The database must be reachable from another process, so in-memory SQLite is not supported.
+    """
+
+    def __init__(self, database_url: str):
+        self.database_url = database_url
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def build(
+        self, index_factory: str, embedding_decoder: Any, directory: str, shards: int = 1,
+        embedding_model: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        with self._lock:
+            if self._pool is None:
+                # Spawn rather than fork: the serving process has live threads and DB connections.
+                self._pool = ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn"))
+            pool = self._pool
+        try:
+            return pool.submit(
+                build_snapshot_dir, self.database_url, index_factory, embedding_decoder, directory, shards, embedding_model
+            ).result()
+        except BrokenProcessPool:
+            logger.error("Search index builder process died; a new one will be started for the next build.")
+            with self._lock:
+                if self._pool is pool:
+                    self._pool = None
+            raise
+
+    def shutdown(self) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,116 @@
+"""
+Cross-process notification of newly published search index versions.
+
+`PostgresIndexNotifier` uses LISTEN/NOTIFY so every worker hears about a new
+snapshot immediately; `PollingIndexNotifier` watches the snapshot store's CURRENT
+pointer and is used for other databases. Both re-check the store periodically so
+a notification missed during a reconnect is picked up anyway.
+"""
+import logging
+import re
+import select
+import threading
+from typing import Callable, Optional
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import NullPool
+
+from app.core.config import settings
+from app.services.index_store import IndexSnapshotStore
+
+logger = logging.getLogger(__name__)
+
+VersionCallback = Callable[[int], None]
+
+_CHANNEL_RE = re.compile(r"^[a-z_][a-z0-9_]*$")
+
+
+class PollingIndexNotifier:
+    def __init__(self, store: IndexSnapshotStore, interval: float):
+        self.store = store
+        self.interval = interval
+        self._callback: Optional[VersionCallback] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, callback: VersionCallback) -> None:
+        if self._thread is not None:
+            return
+        self._callback = callback
+        self._thread = threading.Thread(target=self._run, name="search-index-listener", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def notify(self, version: int) -> None:
+        """The CURRENT pointer itself is the signal; nothing else to send."""
+
+    def _check_store(self) -> None:
+        version = self.store.current_version()
+        if version is not None:
+            self._deliver(version)
+
+    def _deliver(self, version: int) -> None:
+        try:
+            self._callback(version)
+        except Exception as e:
+            logger.error("Failed to switch to search index v%s: %s", version, e, exc_info=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._check_store()
+
+
+class PostgresIndexNotifier(PollingIndexNotifier):
+    def __init__(self, store: IndexSnapshotStore, interval: float, database_url: str, channel: str):
+        super().__init__(store, interval)
+        if not _CHANNEL_RE.match(channel):
+            raise ValueError(f"Invalid NOTIFY channel name: {channel!r}")
+        self.channel = channel
+        self._engine = create_engine(database_url, poolclass=NullPool)
+
+    def notify(self, version: int) -> None:
+        with self._engine.begin() as conn:
+            conn.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": self.channel, "payload": str(version)})
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self._listen()
+            except Exception as e:
+                logger.warning("Search index LISTEN connection lost: %s; reconnecting.", e)
+                self._stop.wait(self.interval)
+
+    def _listen(self) -> None:
+        raw = self._engine.raw_connection()
+        try:
+            conn = raw.driver_connection
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                cursor.execute(f"LISTEN {self.channel}")
+            # Catch up on anything published while we were not listening.
+            self._check_store()
+            while not self._stop.is_set():
+                readable, _, _ = select.select([conn], [], [], self.interval)
+                if not readable:
+                    self._check_store()
+                    continue
+                conn.poll()
+                latest = None
+                while conn.notifies:
+                    payload = conn.notifies.pop(0).payload
+                    if payload.isdigit():
+                        latest = max(latest or 0, int(payload))
+                if latest is not None:
+                    self._deliver(latest)
+        finally:
+            raw.close()
+
+
+def create_notifier(store: IndexSnapshotStore) -> PollingIndexNotifier:
+    if settings.DATABASE_URL.startswith("postgresql"):
+        return PostgresIndexNotifier(
+            store, settings.SEARCH_INDEX_POLL_SECONDS, settings.DATABASE_URL, settings.SEARCH_INDEX_NOTIFY_CHANNEL
+        )
+    return PollingIndexNotifier(store, settings.SEARCH_INDEX_POLL_SECONDS)
@@ -0,0 +1,116 @@
+"""
+Background maintenance of the semantic search index.
+
+Writes call `request_rebuild()` instead of rebuilding inline. Requests are
+coalesced: a rebuild starts once no new request has arrived for the debounce
+window (or the oldest pending request has waited `max_delay`), runs on a
+dedicated thread with its own DB session, and requests that arrive while it is
+running are folded into exactly one follow-up rebuild. Requests that name the
+changed book let a sharded index rebuild only the shards those books live in; a
+single request without one makes the whole batch a full rebuild.
+"""
+import logging
+import threading
+import time
+from typing import Callable, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.metrics import SEARCH_INDEX_REBUILD_REQUESTS
+from app.db.session import SessionLocal
+from app.services.search_service import search_service
+
+logger = logging.getLogger(__name__)
+
+
+class IndexMaintenanceScheduler:
+    def __init__(
+        self,
+        # Called with the changed book ids, or None for a full rebuild.
+        rebuild: Callable[[Session, Optional[Set[int]]], None],
+        session_factory: Callable[[], Session],
+        debounce_seconds: float,
+        max_delay_seconds: float,
+    ):
+        self._rebuild = rebuild
+        self._session_factory = session_factory
+        self.debounce_seconds = debounce_seconds
+        self.max_delay_seconds = max_delay_seconds
+        self._cond = threading.Condition()
+        self._first_request: Optional[float] = None
+        self._last_request: Optional[float] = None
+        self._pending = 0
+        self._dirty: Optional[Set[int]] = set()
+        self._stopped = False
+        self._thread: Optional[threading.Thread] = None
+
+    def request_rebuild(self, reason: str = "", book_id: Optional[int] = None) -> None:
+        """Ask for a rebuild, covering just `book_id` if given; returns immediately."""
+        SEARCH_INDEX_REBUILD_REQUESTS.inc()
+        now = time.monotonic()
+        with self._cond:
+            if self._first_request is None:
+                self._first_request = now
+            self._last_request = now
+            self._pending += 1
+            if book_id is None:
+                self._dirty = None
+            elif self._dirty is not None:
+                self._dirty.add(book_id)
+            self._ensure_thread()
+            self._cond.notify()
+        logger.debug("Search index rebuild requested (%s).", reason or "unspecified")
+
+    def stop(self) -> None:
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+
+    def _ensure_thread(self) -> None:
+        # Started lazily so a pre-forking server never inherits a running thread.
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="search-index-maintenance", daemon=True)
+            self._thread.start()
+
+    def _wait_for_batch(self) -> Tuple[int, Optional[Set[int]]]:
+        with self._cond:
+            while not self._stopped:
+                if not self._pending:
+                    self._cond.wait()
+                    continue
+                now = time.monotonic()
+                quiet_until = self._last_request + self.debounce_seconds
+                deadline = min(quiet_until, self._first_request + self.max_delay_seconds)
+                if now >= deadline:
+                    pending, dirty = self._pending, self._dirty
+                    self._pending, self._dirty = 0, set()
+                    self._first_request = self._last_request = None
+                    return pending, dirty
+                self._cond.wait(deadline - now)
+            return 0, None
+
+    def _run(self) -> None:
+        while True:
+            coalesced, dirty = self._wait_for_batch()
+            if not coalesced:
+                return
+            logger.info("Rebuilding search index for %d coalesced request(s).", coalesced)
+            db = self._session_factory()
+            try:
+                self._rebuild(db, dirty)
+            except Exception as e:
+                logger.error("Error rebuilding search index: %s", e, exc_info=True)
+            finally:
+                db.close()
+
+
+index_scheduler = IndexMaintenanceScheduler(
+    search_service.build_index,
+    # Rebuilds follow writes, so they read the primary: a lagging replica would publish an
+    # index missing the very write that asked for it, and nothing would ask again.
+    SessionLocal,
+    debounce_seconds=settings.SEARCH_REBUILD_DEBOUNCE_SECONDS,
+    max_delay_seconds=settings.SEARCH_REBUILD_MAX_DELAY_SECONDS,
+)
+search_service.enable_background_rebuilds(index_scheduler.request_rebuild)
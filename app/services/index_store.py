@@ -0,0 +1,285 @@
+"""
+Versioned on-disk snapshots of the semantic search index.
+
+A snapshot is a directory `v<version>-<pid>-<random>/` holding the book id array
+and either the raw float32 vectors (flat indexes) or a serialized FAISS index,
+plus `meta.json`. `CURRENT` names the published version and its directory. Workers map snapshots read-only, so every
+worker on a host shares one copy of the vectors through the page cache.
+"""
+from __future__ import annotations
+
+import fcntl
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from app.services.sharded_index import ShardedIndex
+from app.utils.lazy_import import lazy_import
+
+faiss = lazy_import("faiss")
+np = lazy_import("numpy")
+
+logger = logging.getLogger(__name__)
+
+CURRENT_FILE = "CURRENT"
+LOCK_FILE = ".lock"
+KEEP_VERSIONS = 3
+STALE_BUILD_SECONDS = 24 * 3600
+
+
+class SnapshotMissing(Exception):
+    """The requested snapshot version is gone, normally pruned after newer ones were published."""
+
+
+def _parse_version(name: str) -> Optional[int]:
+    """The version of a snapshot directory name, `v<version>` or `v<version>-<suffix>`."""
+    if not name.startswith("v"):
+        return None
+    number = name[1:].split("-", 1)[0]
+    return int(number) if number.isdigit() else None
+
+
+class BookIdMap:
+    """
+    Maps FAISS positions to book ids and back over one sorted int64 array.
+
+    Unlike a pair of dicts, the array can be memory-mapped and shared between workers.
+    """
+
+    def __init__(self, book_ids: np.ndarray):
+        # Any empty sequence is accepted, so an empty map needs no numpy import.
+        self.book_ids = book_ids
+
+    def __len__(self) -> int:
+        return len(self.book_ids)
+
+    @property
+    def nbytes(self) -> int:
+        return int(getattr(self.book_ids, "nbytes", 0))
+
+    def book_id(self, position: int) -> Optional[int]:
+        if 0 <= position < len(self.book_ids):
+            return int(self.book_ids[position])
+        return None
+
+    def position(self, book_id: int) -> Optional[int]:
+        if not len(self.book_ids):
+            return None
+        position = int(np.searchsorted(self.book_ids, book_id))
+        if position < len(self.book_ids) and self.book_ids[position] == book_id:
+            return position
+        return None
+
+
+class MappedFlatIndex:
+    """
+    Exact L2 search over a read-only memory-mapped (n, d) float32 array.
+
+    Exposes the subset of the faiss.Index API SearchService uses; `faiss.knn`
+    searches the mapped array in place instead of copying it into an IndexFlat.
+    """
+
+    def __init__(self, vectors: np.ndarray):
+        self.vectors = vectors
+        self.ntotal, self.d = vectors.shape
+        self.code_size = self.d * 4
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        return faiss.knn(np.ascontiguousarray(queries, dtype=np.float32), self.vectors, k)
+
+    def reconstruct(self, position: int) -> np.ndarray:
+        return np.array(self.vectors[position], dtype=np.float32)
+
+
+@dataclass
+class IndexSnapshot:
+    version: int
+    index: Optional[Any]
+    id_map: BookIdMap
+    dimension: int
+    meta: Dict[str, Any]
+
+
+def _flat_vectors(index: Any) -> Optional[np.ndarray]:
+    if isinstance(index, MappedFlatIndex):
+        return index.vectors
+    if isinstance(index, faiss.IndexFlat) and index.metric_type == faiss.METRIC_L2:
+        return index.reconstruct_n(0, index.ntotal)
+    return None
+
+
+def _write_index(directory: str, prefix: str, index: Optional[Any]) -> str:
+    vectors = _flat_vectors(index) if index is not None else None
+    if index is None:
+        return "empty"
+    if vectors is not None:
+        np.save(os.path.join(directory, f"{prefix}vectors.npy"), np.ascontiguousarray(vectors, dtype=np.float32))
+        return "flat"
+    faiss.write_index(index, os.path.join(directory, f"{prefix}index.faiss"))
+    return "faiss"
+
+
+def _read_index(directory: str, prefix: str, kind: str) -> Optional[Any]:
+    if kind == "empty":
+        return None
+    if kind == "flat":
+        return MappedFlatIndex(np.load(os.path.join(directory, f"{prefix}vectors.npy"), mmap_mode="r"))
+    return faiss.read_index(os.path.join(directory, f"{prefix}index.faiss"), faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+
+
+def _load_ids(path: str) -> np.ndarray:
+    ids = np.load(path, mmap_mode="r")
+    # numpy cannot map a zero-length array.
+    return ids if len(ids) else np.empty(0, dtype=np.int64)
+
+
+def write_snapshot_dir(
+    directory: str, index: Optional[Any], book_ids: np.ndarray, dimension: int, meta: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """Serialize an index and its id array into `directory` (which must exist)."""
+    np.save(os.path.join(directory, "ids.npy"), np.ascontiguousarray(book_ids, dtype=np.int64))
+    extra: Dict[str, Any] = {}
+    if isinstance(index, ShardedIndex):
+        # One file set per shard, so each maps independently; positions are recomputed on load.
+        kind = "sharded"
+        shard_kinds = []
+        for shard, (shard_index, shard_ids) in enumerate(zip(index.shards, index.shard_book_ids)):
+            np.save(os.path.join(directory, f"shard-{shard}.ids.npy"), np.ascontiguousarray(shard_ids, dtype=np.int64))
+            shard_kinds.append(_write_index(directory, f"shard-{shard}.", shard_index))
+        extra["shard_kinds"] = shard_kinds
+    else:
+        kind = _write_index(directory, "", index)
+    full_meta = {**(meta or {}), **extra, "kind": kind, "dimension": dimension, "ntotal": int(len(book_ids))}
+    with open(os.path.join(directory, "meta.json"), "w") as fh:
+        json.dump(full_meta, fh)
+    return full_meta
+
+
+def read_snapshot_dir(directory: str, version: int = 0) -> IndexSnapshot:
+    """Map a snapshot directory read-only. Files may be unlinked afterwards; the mapping stays valid."""
+    with open(os.path.join(directory, "meta.json")) as fh:
+        meta = json.load(fh)
+    # numpy cannot map a zero-length array.
+    book_ids = np.load(os.path.join(directory, "ids.npy"), mmap_mode="r" if meta["ntotal"] else None)
+    if meta["kind"] == "sharded":
+        index = ShardedIndex(
+            [_read_index(directory, f"shard-{shard}.", kind) for shard, kind in enumerate(meta["shard_kinds"])],
+            [_load_ids(os.path.join(directory, f"shard-{shard}.ids.npy")) for shard in range(len(meta["shard_kinds"]))],
+        )
+    else:
+        index = _read_index(directory, "", meta["kind"])
+    return IndexSnapshot(version=version, index=index, id_map=BookIdMap(book_ids),
+                         dimension=int(meta["dimension"]), meta=meta)
+
+
+class IndexSnapshotStore:
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _read_current(self) -> Tuple[Optional[int], Optional[str]]:
+        """`(version, directory name)` from CURRENT; the name is absent in pointers of older releases."""
+        try:
+            with open(os.path.join(self.directory, CURRENT_FILE)) as fh:
+                parts = fh.read().split()
+            return int(parts[0]), (parts[1] if len(parts) > 1 else None)
+        except (FileNotFoundError, ValueError, IndexError):
+            return None, None
+
+    def _version_dirs(self, version: int) -> List[str]:
+        return [name for name in os.listdir(self.directory) if _parse_version(name) == version]
+
+    def _version_dir(self, version: int) -> str:
+        current, name = self._read_current()
+        if current != version or name is None:
+            # Not the published one: any directory of that version, the newest if a publish ever collided.
+            names = self._version_dirs(version)
+            if not names:
+                raise SnapshotMissing(f"Search index snapshot v{version} no longer exists")
+            name = max(names, key=lambda n: os.path.getmtime(os.path.join(self.directory, n)))
+        return os.path.join(self.directory, name)
+
+    @contextmanager
+    def build_lock(self) -> Iterator[None]:
+        """Host-wide exclusive lock so only one worker builds and publishes at a time."""
+        with open(os.path.join(self.directory, LOCK_FILE), "a+") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def current_version(self) -> Optional[int]:
+        return self._read_current()[0]
+
+    def read_meta(self, version: int) -> Dict[str, Any]:
+        with open(os.path.join(self._version_dir(version), "meta.json")) as fh:
+            return json.load(fh)
+
+    def new_staging_dir(self) -> str:
+        """Private directory on the store's filesystem, for building a snapshot out of process."""
+        return tempfile.mkdtemp(prefix="build-", dir=self.directory)
+
+    def publish(self, index: Optional[Any], book_ids: np.ndarray, dimension: int, meta: Optional[Dict[str, Any]] = None) -> int:
+        """
+        Write a new snapshot and point CURRENT at it. Callers must hold `build_lock()`.
+        """
+        staging = self.new_staging_dir()
+        write_snapshot_dir(staging, index, book_ids, dimension, meta)
+        return self.publish_directory(staging)
+
+    def publish_directory(self, staging: str, meta: Optional[Dict[str, Any]] = None) -> int:
+        """
+        Publish a directory written by `write_snapshot_dir` as the next version.
+        Callers must hold `build_lock()`.
+        """
+        version = (self.current_version() or 0) + 1
+        meta_path = os.path.join(staging, "meta.json")
+        with open(meta_path) as fh:
+            merged = {**json.load(fh), **(meta or {}), "version": version}
+        with open(meta_path, "w") as fh:
+            json.dump(merged, fh)
+
+        # Unique even if two builders ever publish the same version number at once.
+        name = f"v{version}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        os.rename(staging, os.path.join(self.directory, name))
+        pointer = os.path.join(self.directory, f"{CURRENT_FILE}.{os.getpid()}.tmp")
+        with open(pointer, "w") as fh:
+            fh.write(f"{version} {name}")
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(pointer, os.path.join(self.directory, CURRENT_FILE))
+        self._prune(version)
+        logger.info("Published search index snapshot v%d (%d vectors, %s).", version, merged["ntotal"], merged["kind"])
+        return version
+
+    def load(self, version: int) -> IndexSnapshot:
+        """Map `version`; raises SnapshotMissing if it was pruned, even while being read."""
+        directory = self._version_dir(version)
+        try:
+            return read_snapshot_dir(directory, version)
+        except (OSError, RuntimeError) as e:
+            # faiss reports a missing file as a RuntimeError.
+            if not os.path.isdir(directory):
+                raise SnapshotMissing(f"Search index snapshot v{version} was removed while loading") from e
+            raise
+
+    def _prune(self, current: int) -> None:
+        # Leftovers of builds that died before publishing.
+        for name in os.listdir(self.directory):
+            if name.startswith("build-"):
+                path = os.path.join(self.directory, name)
+                if time.time() - os.path.getmtime(path) > STALE_BUILD_SECONDS:
+                    shutil.rmtree(path, ignore_errors=True)
+        # Unlinking is safe for workers still mapping an old version: the pages stay valid until unmapped.
+        for name in os.listdir(self.directory):
+            version = _parse_version(name)
+            if version is not None and version <= current - KEEP_VERSIONS:
+                shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
@@ -0,0 +1,149 @@
+"""
+Background re-embedding for embedding model changes.
+
+When `EMBEDDING_MODEL` differs from the active model, the job embeds every book
+with the new model into the `bookembedding` staging table, batch by batch, while
+search keeps serving the old model's index and embedding queries with the old
+model. Once `EMBEDDING_CUTOVER_COVERAGE` of the catalog is staged it builds the
+new index from the staged vectors (the old one still serving), then in one
+transaction moves the staged vectors into `book` and makes the new model active,
+and publishes the new index, which switches query embeddings over with the same
+swap. Books still on the old model afterwards are re-embedded in place and
+indexed as they are done; staged rows and pending models left from abandoned
+migrations are cleaned up.
+"""
+import json
+import logging
+import threading
+from typing import Callable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.crud.crud_book import embedding_text
+from app.crud.crud_embedding import EmbeddedRow, embedding as crud_embedding
+from app.crud.crud_job_state import job_state as crud_job_state
+from app.db.session import SessionLocal
+from app.services.index_scheduler import index_scheduler
+from app.services.search_service import search_service
+from app.utils.embedding import get_embeddings
+
+logger = logging.getLogger(__name__)
+
+JOB_NAME = "reembed"
+
+
+class ReembedJob:
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        interval_seconds: float,
+        batch_size: int,
+        cutover_coverage: float,
+    ):
+        self._session_factory = session_factory
+        self.interval_seconds = interval_seconds
+        self.batch_size = batch_size
+        self.cutover_coverage = cutover_coverage
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self.interval_seconds <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="reembed", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def follow_active_model(self, db: Session) -> None:
+        """Rebuild this worker's index if another worker cut over (not needed with shared snapshots)."""
+        active = crud_embedding.active_model_name(db)
+        if search_service.is_built and search_service.embedding_model != active:
+            index_scheduler.request_rebuild("embedding model changed")
+
+    def run_once(self, db: Session, target: Optional[str] = None) -> int:
+        """One pass towards `target` (default `EMBEDDING_MODEL`); returns the number of books embedded."""
+        target = target or settings.EMBEDDING_MODEL
+        active = crud_embedding.ensure_active_model(db).name
+        if active == target:
+            embedded = self._catch_up(db, active)
+            deleted = crud_embedding.clean_up(db)
+            if deleted:
+                logger.info("Removed %d staged embeddings of abandoned model migrations.", deleted)
+            return embedded
+
+        crud_embedding.set_pending(db, target)
+        embedded = 0
+        while not self._stop.is_set():
+            books = crud_embedding.books_without(db, target, limit=self.batch_size)
+            if not books:
+                break
+            crud_embedding.stage(db, target, self._embed(books, target))
+            embedded += len(books)
+        staged, total = crud_embedding.coverage(db, target)
+        logger.info("Re-embedding with %s: %d of %d books staged.", target, staged, total)
+        if total and staged / total >= self.cutover_coverage:
+            self.cut_over(db, target)
+        return embedded
+
+    def cut_over(self, db: Session, target: str) -> None:
+        # The new index is built before anything changes, while the old one keeps serving.
+        built = search_service.build_from_rows(crud_embedding.staged_embeddings(db, target))
+        switched = crud_embedding.cut_over(db, target, built.dimension or None)
+        search_service.publish_built(db, built, target)
+        logger.info("Switched semantic search to %s: %d books moved to the new vectors.", target, switched)
+        # Books written between the build and the cutover are picked up by a normal rebuild.
+        index_scheduler.request_rebuild("embedding model cutover")
+
+    def _catch_up(self, db: Session, active: str) -> int:
+        """Re-embed, in place, books whose searched vector is from an older model."""
+        embedded = 0
+        while not self._stop.is_set():
+            books = crud_embedding.books_on_other_models(db, active, limit=self.batch_size)
+            if not books:
+                break
+            crud_embedding.replace_active(db, active, self._embed(books, active))
+            for book_id, *_ in books:
+                index_scheduler.request_rebuild("re-embedded", book_id)
+            embedded += len(books)
+        if embedded:
+            logger.info("Re-embedded %d books with %s.", embedded, active)
+        return embedded
+
+    @staticmethod
+    def _embed(books: List[Tuple[int, str, str, Optional[str]]], model: str) -> List[EmbeddedRow]:
+        """One provider call per batch; books with no text are recorded with no vector."""
+        texts = {book_id: embedding_text(title, author, description) for book_id, title, author, description in books}
+        wanted = [book_id for book_id, text in texts.items() if text]
+        vectors = dict(zip(wanted, get_embeddings([texts[book_id] for book_id in wanted], model))) if wanted else {}
+        return [
+            (book_id, json.dumps(vectors[book_id]), len(vectors[book_id])) if book_id in vectors else (book_id, None, None)
+            for book_id in texts
+        ]
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_seconds):
+            db = self._session_factory()
+            # Held for the whole pass in its own transaction, so only one worker spends embedding calls.
+            lock_db = self._session_factory()
+            try:
+                self.follow_active_model(db)
+                if crud_job_state.try_lock(lock_db, JOB_NAME) is not None:
+                    self.run_once(db)
+            except Exception as e:
+                db.rollback()
+                logger.error("Error re-embedding books: %s", e, exc_info=True)
+            finally:
+                lock_db.rollback()
+                lock_db.close()
+                db.close()
+
+
+reembed_job = ReembedJob(
+    SessionLocal,
+    settings.EMBEDDING_REEMBED_INTERVAL_SECONDS,
+    settings.EMBEDDING_REEMBED_BATCH_SIZE,
+    settings.EMBEDDING_CUTOVER_COVERAGE,
+)
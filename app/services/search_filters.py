@@ -0,0 +1,207 @@
+"""
+Attribute filters for semantic search, applied inside the vector search.
+
+`FilterColumns` caches the filterable book columns as numpy arrays aligned to
+index positions. A `SearchFilters` resolves against them to a boolean mask, and
+`filtered_search` restricts the k-NN search to the masked positions (a FAISS
+`IDSelectorBitmap` for FAISS indexes, masked exact distances for mapped flat
+indexes), so a filtered query still gets a full top-k without over-fetching.
+Indexes that take no search parameters (PQ and HNSW in faiss 1.7.4) are
+searched exactly over the decoded vectors of the masked positions instead.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+from app.services.index_store import MappedFlatIndex
+from app.services.sharded_index import ShardedIndex
+from app.utils.lazy_import import lazy_import
+
+faiss = lazy_import("faiss")
+np = lazy_import("numpy")
+
+# Smallest int32: marks books without a publication year.
+MISSING_YEAR = -(2**31)
+# Distance matrix rows computed at once by the masked flat search (rows x ntotal float32).
+FLAT_QUERY_BLOCK = 64
+# Masked positions decoded at once when an index cannot take an ID selector (positions x dimension float32).
+DECODE_BLOCK = 16384
+
+# FAISS index classes found to reject search parameters; they are not tried again.
+_NO_SELECTOR: Set[type] = set()
+
+
+@dataclass(frozen=True)
+class SearchFilters:
+    is_available: Optional[bool] = None
+    author: Optional[str] = None
+    publisher: Optional[str] = None
+    year_from: Optional[int] = None
+    year_to: Optional[int] = None
+
+    @property
+    def is_empty(self) -> bool:
+        return all(value is None for value in (self.is_available, self.author, self.publisher, self.year_from, self.year_to))
+
+    def matches(self, book: Any) -> bool:
+        """Re-check a hydrated book, in case the cached columns were stale."""
+        if self.is_available is not None and bool(book.is_available) != self.is_available:
+            return False
+        if self.author is not None and (book.author or "").casefold() != self.author.casefold():
+            return False
+        if self.publisher is not None and (book.publisher or "").casefold() != self.publisher.casefold():
+            return False
+        year = book.publication_year
+        if self.year_from is not None and (year is None or year < self.year_from):
+            return False
+        if self.year_to is not None and (year is None or year > self.year_to):
+            return False
+        return True
+
+
+def _encode(values: Iterable[Optional[str]]) -> Tuple[np.ndarray, Dict[str, int]]:
+    """Dictionary-encode case-folded strings; None becomes -1."""
+    codes: Dict[str, int] = {}
+    encoded = [codes.setdefault(value.casefold(), len(codes)) if value is not None else -1 for value in values]
+    return np.array(encoded, dtype=np.int32), codes
+
+
+class FilterColumns:
+    """
+    Filterable columns for the books in one index snapshot, one entry per index position.
+    """
+
+    def __init__(self, version: int, available: np.ndarray, authors: np.ndarray, author_codes: Dict[str, int],
+                 publishers: np.ndarray, publisher_codes: Dict[str, int], years: np.ndarray, loaded_at: float):
+        self.version = version
+        self.available = available
+        self.authors = authors
+        self.author_codes = author_codes
+        self.publishers = publishers
+        self.publisher_codes = publisher_codes
+        self.years = years
+        self.loaded_at = loaded_at
+
+    @classmethod
+    def from_rows(cls, version: int, index_book_ids: np.ndarray, rows: Iterable[Tuple], loaded_at: float) -> "FilterColumns":
+        """
+        `rows` are `(id, is_available, author, publisher, publication_year)` ordered by id.
+        Books in the index but no longer in the database never match.
+        """
+        rows = list(rows)
+        ids = np.array([row[0] for row in rows], dtype=np.int64)
+        positions = np.searchsorted(ids, index_book_ids)
+        found = positions < len(ids)
+        found[found] = ids[positions[found]] == index_book_ids[found]
+        positions = np.where(found, positions, 0)
+
+        available = np.array([bool(row[1]) for row in rows], dtype=bool)
+        authors, author_codes = _encode(row[2] for row in rows)
+        publishers, publisher_codes = _encode(row[3] for row in rows)
+        years = np.array([row[4] if row[4] is not None else MISSING_YEAR for row in rows], dtype=np.int32)
+
+        def align(column: np.ndarray, fill: Any) -> np.ndarray:
+            if not len(rows):
+                return np.full(len(index_book_ids), fill, dtype=column.dtype)
+            return np.where(found, column[positions], fill)
+
+        return cls(
+            version=version,
+            available=align(available, False),
+            authors=align(authors, -1),
+            author_codes=author_codes,
+            publishers=align(publishers, -1),
+            publisher_codes=publisher_codes,
+            years=align(years, MISSING_YEAR),
+            loaded_at=loaded_at,
+        )
+
+    def mask(self, filters: SearchFilters) -> np.ndarray:
+        """Boolean mask over index positions; deleted books only pass an empty filter set."""
+        mask = np.ones(len(self.available), dtype=bool)
+        if filters.is_available is not None:
+            mask &= self.available if filters.is_available else ~self.available
+        if filters.author is not None:
+            mask &= self.authors == self.author_codes.get(filters.author.casefold(), -2)
+        if filters.publisher is not None:
+            mask &= self.publishers == self.publisher_codes.get(filters.publisher.casefold(), -2)
+        if filters.year_from is not None:
+            mask &= self.years >= filters.year_from
+        if filters.year_to is not None:
+            mask &= (self.years <= filters.year_to) & (self.years != MISSING_YEAR)
+        return mask
+
+
+def filtered_search(index: Any, queries: np.ndarray, k: int, mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """k-NN over only the positions set in `mask`. Missing results are -1, as in FAISS."""
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+    if isinstance(index, ShardedIndex):
+        return index.search_masked(queries, k, mask, filtered_search)
+    if isinstance(index, MappedFlatIndex):
+        return _masked_flat_search(index.vectors, queries, k, mask)
+    if type(index) in _NO_SELECTOR:
+        return _decoded_search(index, queries, k, mask)
+
+    # IDSelectorBitmap reads bit i of byte i // 8, least significant bit first.
+    bitmap = np.packbits(mask, bitorder="little")
+    selector = faiss.IDSelectorBitmap(len(mask), faiss.swig_ptr(bitmap))
+    try:
+        faiss.extract_index_ivf(index)
+        params = faiss.SearchParametersIVF(sel=selector)
+    except RuntimeError:
+        params = faiss.SearchParameters(sel=selector)
+    # `bitmap` must stay referenced until the search returns; the selector only holds a pointer.
+    try:
+        distances, labels = index.search(queries, k, params=params)
+    except RuntimeError as e:
+        if "not supported" not in str(e):
+            raise
+        _NO_SELECTOR.add(type(index))
+        return _decoded_search(index, queries, k, mask)
+    finally:
+        del bitmap
+    return distances, labels
+
+
+def _decoded_search(index: Any, queries: np.ndarray, k: int, mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Exact k-NN over the vectors `index` reconstructs for the masked positions, a block at a
+    time. For PQ these are the decoded codes, so the distances are the ones PQ search reports.
+    """
+    distances = np.full((len(queries), k), np.inf, dtype=np.float32)
+    labels = np.full((len(queries), k), -1, dtype=np.int64)
+    positions = np.flatnonzero(mask)
+    for start in range(0, len(positions), DECODE_BLOCK):
+        block = positions[start:start + DECODE_BLOCK]
+        vectors = index.reconstruct_batch(block)
+        block_distances, block_labels = _masked_flat_search(vectors, queries, k, np.ones(len(block), dtype=bool))
+        found = block_labels >= 0
+        block_labels[found] = block[block_labels[found]]
+        # Keep the best k of the results so far and this block's.
+        merged_distances = np.concatenate([distances, block_distances], axis=1)
+        merged_labels = np.concatenate([labels, block_labels], axis=1)
+        order = np.argsort(merged_distances, axis=1, kind="stable")[:, :k]
+        distances = np.take_along_axis(merged_distances, order, axis=1)
+        labels = np.take_along_axis(merged_labels, order, axis=1)
+    return distances, labels
+
+
+def _masked_flat_search(vectors: np.ndarray, queries: np.ndarray, k: int, mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    distances = np.full((len(queries), k), np.inf, dtype=np.float32)
+    labels = np.full((len(queries), k), -1, dtype=np.int64)
+    allowed = int(mask.sum())
+    if not allowed:
+        return distances, labels
+    take = min(k, allowed)
+    excluded = ~mask
+    for start in range(0, len(queries), FLAT_QUERY_BLOCK):
+        block = queries[start:start + FLAT_QUERY_BLOCK]
+        block_distances = faiss.pairwise_distances(block, vectors)
+        block_distances[:, excluded] = np.inf
+        top = np.argpartition(block_distances, take - 1, axis=1)[:, :take]
+        top_distances = np.take_along_axis(block_distances, top, axis=1)
+        order = np.argsort(top_distances, axis=1)
+        labels[start:start + len(block), :take] = np.take_along_axis(top, order, axis=1)
+        distances[start:start + len(block), :take] = np.take_along_axis(top_distances, order, axis=1)
+    return distances, labels
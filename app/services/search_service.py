@@ -1,163 +1,897 @@
-import numpy as np
-import faiss
-from typing import List, Dict, Any, Optional
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
 from sqlalchemy.orm import Session
 import logging
 import json # For parsing stored embeddings
+import os
+import secrets
+import shutil
+import tempfile
+import threading
+import time
 
-from app.utils.embedding import get_embedding # Fallback if needed
+from app.core.metrics import (
+    SEARCH_CURSOR_PAGES,
+    SEARCH_INDEX_BYTES,
+    SEARCH_INDEX_DIMENSION,
+    SEARCH_INDEX_REBUILD_DURATION,
+    SEARCH_INDEX_REBUILDS,
+    SEARCH_INDEX_VECTORS,
+    SEARCH_PHASE_DURATION,
+    SEARCH_RESULT_CACHE,
+)
+from app.utils.embedding import get_embeddings
+from app.core.config import settings
 from app.crud.crud_book import book as crud_book
-from app.db.models.book import Book
+from app.crud.crud_embedding import embedding as crud_embedding
+from app.utils.cache import LRUCache
+from app.utils.lazy_import import lazy_import
+from app.utils.singleflight import SingleFlight
+from app.services.index_builder import ProcessIndexBuilder
+from app.services.index_notifier import create_notifier
+from app.services.index_store import (
+    BookIdMap, IndexSnapshot, IndexSnapshotStore, MappedFlatIndex, SnapshotMissing, read_snapshot_dir,
+)
+from app.services.search_filters import FilterColumns, SearchFilters, filtered_search
+from app.services.sharded_index import ShardedIndex, query_executor, set_query_threads, shard_of
+
+# Imported on first use so application start-up does not pay for them.
+faiss = lazy_import("faiss")
+np = lazy_import("numpy")
 
 logger = logging.getLogger(__name__)
 
+EmbeddingDecoder = Callable[[str], Sequence[float]]
+
+# Vectors used to train quantizers (SQ ranges, PQ and IVF centroids).
+TRAINING_SAMPLE_SIZE = 100_000
+
+# Index positions and distances of one query's hits, best first.
+Hits = Tuple["np.ndarray", "np.ndarray"]
+
+
+@dataclass
+class ResultCursor:
+    """Server-side state of a paged semantic search."""
+    query_vector: np.ndarray
+    # Candidates best first, by book id so they stay valid across index swaps.
+    book_ids: np.ndarray
+    distances: np.ndarray
+    # True once the candidates cover every book the query can match.
+    exhausted: bool
+
+
+def normalise_query(query: str) -> str:
+    """
+    Cache and single-flight key: queries differing only in case or whitespace share
+    cached results and one in-flight search. Only the original text is embedded.
+    """
+    return " ".join(query.split()).casefold()
+
+
+def decode_json_embedding(stored_embedding: str) -> List[float]:
+    """
+    Parse an embedding stored as a JSON list (the format written by CRUDBook).
+    """
+    embedding_vector = json.loads(stored_embedding)
+    if not isinstance(embedding_vector, list) or not all(isinstance(n, (int, float)) for n in embedding_vector):
+        raise ValueError("Parsed embedding is not a list of numbers.")
+    return embedding_vector
+
+
+def _is_exact(index: Any) -> bool:
+    if isinstance(index, ShardedIndex):
+        return all(_is_exact(shard) for shard in index.shards if shard is not None)
+    return isinstance(index, (MappedFlatIndex, faiss.IndexFlat))
+
+
+def _empty_snapshot(version: int = 0, dimension: Optional[int] = None) -> IndexSnapshot:
+    return IndexSnapshot(version=version, index=None, id_map=BookIdMap(()),
+                         dimension=dimension or 0, meta={})
+
 
 class SearchService:
-    def __init__(self):
-        self.index: Optional[faiss.Index] = None
-        self.book_id_to_faiss_idx: Dict[int, int] = {}
-        self.faiss_idx_to_book_id: Dict[int, int] = {}
-        self.is_built = False
-        self.dimension: Optional[int] = None # OpenAI ada-002 is 1536
+    def __init__(
+        self,
+        index_factory: str = "Flat",
+        embedding_decoder: EmbeddingDecoder = decode_json_embedding,
+        rerank_factor: int = 0,
+        shards: int = 1,
+    ):
+        # Any faiss.index_factory description; "Flat" is exact L2 search, "SQ8",
+        # "SQfp16" and "PQ<m>" compress vectors at some cost in recall.
+        self.index_factory = index_factory
+        self.embedding_decoder = embedding_decoder
+        # For compressed indexes, fetch k * rerank_factor candidates and re-order them
+        # by exact distance to the stored embeddings; 0 or 1 disables re-ranking.
+        self.rerank_factor = rerank_factor
+        # With more than one shard, books are split by `id % shards` into separate
+        # indexes that are searched in parallel and rebuilt independently.
+        self.shards = max(1, shards)
+        # The index and its id map are only ever replaced together, by swapping this
+        # one reference. Readers take it once per request so a concurrent rebuild can
+        # never pair an old index with a new id map.
+        self._snapshot = _empty_snapshot()
+        self._swap_lock = threading.Lock()
+        self.store: Optional[IndexSnapshotStore] = None
+        self.notifier = None
+        self.builder: Optional[ProcessIndexBuilder] = None
+        # Asks the index scheduler for a rebuild; searches never build on the request thread.
+        self._request_rebuild: Optional[Callable[[str], None]] = None
+        self._filter_columns: Optional[FilterColumns] = None
+        self._filter_lock = threading.Lock()
+        # (index version, book id, k) -> neighbour positions and distances, self excluded.
+        self._similar_cache: LRUCache[Tuple[np.ndarray, np.ndarray]] = LRUCache(settings.SEARCH_SIMILAR_CACHE_SIZE)
+        # (index version, normalised query, k, filters) -> hits; hydrated per request.
+        self._result_cache: LRUCache[Hits] = LRUCache(
+            settings.SEARCH_RESULT_CACHE_SIZE, ttl=settings.SEARCH_RESULT_CACHE_TTL_SECONDS
+        )
+        self._in_flight: SingleFlight[Hits] = SingleFlight()
+        # (cursor id, normalised query, filters) -> candidates of a paged search; unlike
+        # cached hits, kept across index swaps.
+        self._cursors: LRUCache[ResultCursor] = LRUCache(
+            settings.SEARCH_CURSOR_CACHE_SIZE, ttl=settings.SEARCH_CURSOR_TTL_SECONDS
+        )
+
+    # Read-only views of the current snapshot.
+    @property
+    def snapshot(self) -> IndexSnapshot:
+        return self._snapshot
+
+    @property
+    def index(self) -> Optional[Any]:
+        return self._snapshot.index
+
+    @property
+    def id_map(self) -> BookIdMap:
+        return self._snapshot.id_map
+
+    @property
+    def dimension(self) -> Optional[int]:
+        return self._snapshot.dimension or None # OpenAI ada-002 is 1536
+
+    @property
+    def version(self) -> int:
+        # Bumped on every build or snapshot load; shared across workers when snapshots are enabled.
+        return self._snapshot.version
+
+    @property
+    def embedding_model(self) -> Optional[str]:
+        # Queries must be embedded with the model that produced the indexed vectors.
+        return self._snapshot.meta.get("embedding_model")
+
+    @property
+    def is_built(self) -> bool:
+        return self._snapshot.index is not None
+
+    def enable_snapshots(self, store: IndexSnapshotStore, notifier) -> None:
+        """
+        Share the index between worker processes through memory-mapped snapshots.
+        """
+        self.store = store
+        self.notifier = notifier
+
+    def enable_process_builds(self, builder: ProcessIndexBuilder) -> None:
+        """
+        Build in a separate process; this one only maps and swaps in the result.
+        """
+        self.builder = builder
+
+    def enable_background_rebuilds(self, request_rebuild: Callable[[str], None]) -> None:
+        """
+        Have searches that find no index ask for a (coalesced) background rebuild.
+        """
+        self._request_rebuild = request_rebuild
+
+    def _index_ready(self) -> bool:
+        """Whether there is an index to search; if not, a background rebuild is requested."""
+        if self.is_built:
+            return True
+        if self._request_rebuild is not None:
+            self._request_rebuild("search without an index")
+        return False
+
+    def shutdown(self) -> None:
+        if self.notifier is not None:
+            self.notifier.stop()
+        if self.builder is not None:
+            self.builder.shutdown()
 
-    def build_index(self, db: Session):
+    def initialize(self, db: Session):
+        """
+        Startup entry point. With snapshots enabled, reuse the published snapshot if it
+        still matches the catalog; otherwise one worker builds it while the rest wait
+        on the lock and then map the result.
+        """
+        if self.store is None:
+            self.build_index(db)
+            return
+        try:
+            with self.store.build_lock():
+                version = self.store.current_version()
+                fingerprint = crud_book.get_catalog_fingerprint(db)
+                meta = self.store.read_meta(version) if version is not None else {}
+                if (
+                    meta.get("catalog_fingerprint") == fingerprint
+                    and meta.get("embedding_model") == crud_embedding.active_model_name(db)
+                ):
+                    self.load_snapshot(version)
+                else:
+                    self._rebuild(db)
+        finally:
+            # Even if this worker failed to build, it can still pick up another worker's snapshot.
+            self.notifier.start(self._on_version_published)
+
+    def build_index(self, db: Session, book_ids: Optional[Iterable[int]] = None):
         """
         Build or rebuild the FAISS index from books using stored embeddings.
+        Only reads, but rebuilds after a write need a primary session to see it. With a sharded index,
+        passing the changed `book_ids` rebuilds just the shards that own them.
+        """
+        if self.store is None:
+            self._rebuild(db, book_ids)
+            return
+        with self.store.build_lock():
+            self._rebuild(db, book_ids)
+
+    def _rebuild(self, db: Session, book_ids: Optional[Iterable[int]] = None):
+        start = time.perf_counter()
+        try:
+            fingerprint = crud_book.get_catalog_fingerprint(db) if self.store is not None else None
+            model = crud_embedding.active_model_name(db)
+            if book_ids is None or not self._rebuild_shards(db, fingerprint, model, book_ids):
+                logger.info("Building FAISS index from stored %s embeddings...", model)
+                if self.builder is not None:
+                    self._build_out_of_process(fingerprint, model)
+                else:
+                    self._build_in_process(db, fingerprint, model)
+        except Exception:
+            SEARCH_INDEX_REBUILDS.labels("error").inc()
+            raise
+        finally:
+            SEARCH_INDEX_REBUILD_DURATION.observe(time.perf_counter() - start)
+        SEARCH_INDEX_REBUILDS.labels("built" if self.is_built else "empty").inc()
+
+    def _build_in_process(self, db: Session, fingerprint: Optional[str], model: str):
+        built = self.build_from_rows(crud_book.get_stored_embeddings(db, model=model))
+        built.meta["embedding_model"] = model
+        self._publish(built, fingerprint)
+
+    def _rebuild_shards(self, db: Session, fingerprint: Optional[str], model: str, book_ids: Iterable[int]) -> bool:
         """
-        logger.info("Building FAISS index from stored embeddings...")
-        books_from_db = crud_book.get_multi(db, limit=100000) # Get all books
+        Rebuild only the shards owning `book_ids`, reusing the others as they are.
+        Runs in this process even with out-of-process builds, since one shard is a
+        small fraction of the work. Returns False when a full rebuild is needed instead.
+        """
+        if self.store is not None:
+            # Patch the newest published index, which another worker may have built.
+            version = self.store.current_version()
+            if version is not None and version > self.version:
+                self.load_snapshot(version)
+        current = self._snapshot
+        if not isinstance(current.index, ShardedIndex) or current.index.nshards != self.shards:
+            return False
+        if current.meta.get("embedding_model") != model:
+            return False
+        dirty = sorted({int(shard) for shard in shard_of(list(book_ids), self.shards)})
+        replaced = {}
+        for shard in dirty:
+            try:
+                shard_ids, vectors = self._decode_rows(
+                    crud_book.get_stored_embeddings(db, shard=(shard, self.shards), model=model)
+                )
+            except ValueError:
+                return False
+            if vectors is not None and vectors.shape[1] != current.dimension:
+                return False
+            replaced[shard] = (self._new_index(vectors) if vectors is not None else None, shard_ids)
+        index = current.index.with_shards(replaced)
+        logger.info("Rebuilt search index shard(s) %s; %d items in total.", dirty, index.ntotal)
+        self._publish(
+            IndexSnapshot(
+                version=0, index=index, id_map=BookIdMap(index.book_ids), dimension=current.dimension,
+                meta={"embedding_model": model},
+            ),
+            fingerprint,
+        )
+        return True
 
-        if not books_from_db:
-            logger.info("No books found in DB to build index.")
-            self.index = None
-            self.book_id_to_faiss_idx = {}
-            self.faiss_idx_to_book_id = {}
-            self.is_built = False
+    def publish_built(self, db: Session, built: IndexSnapshot, embedding_model: str):
+        """
+        Publish an index built by the caller, e.g. for a new embedding model, in place
+        of the current one. Queries switch to `embedding_model` with the same swap.
+        """
+        built.meta["embedding_model"] = embedding_model
+        if self.store is None:
+            self._publish(built, None)
             return
+        with self.store.build_lock():
+            self._publish(built, crud_book.get_catalog_fingerprint(db))
+
+    def _publish(self, built: IndexSnapshot, fingerprint: Optional[str]):
+        if self.store is not None:
+            version = self.store.publish(
+                built.index, built.id_map.book_ids, built.dimension,
+                {
+                    "index_factory": self.index_factory, "catalog_fingerprint": fingerprint,
+                    "embedding_model": built.meta.get("embedding_model"),
+                },
+            )
+            self.load_snapshot(version)
+            self.notifier.notify(version)
+        else:
+            self._swap(built)
 
-        embeddings_list: List[List[float]] = []
-        valid_books_for_index: List[Book] = []
-
-        for book_item in books_from_db:
-            if book_item.embedding:
-                try:
-                    embedding_vector = json.loads(book_item.embedding) # Parse JSON string
-                    if not isinstance(embedding_vector, list) or not all(isinstance(n, (int, float)) for n in embedding_vector):
-                        raise ValueError("Parsed embedding is not a list of numbers.")
-                    embeddings_list.append(embedding_vector)
-                    valid_books_for_index.append(book_item)
-                except (json.JSONDecodeError, ValueError) as e:
-                    logger.warning(f"Book ID {book_item.id} ('{book_item.title}'): Error parsing stored embedding: {e}. Skipping.")
+    def _build_out_of_process(self, fingerprint: Optional[str], model: str):
+        if self.store is not None:
+            staging = self.store.new_staging_dir()
+        else:
+            staging = tempfile.mkdtemp(prefix="search-index-")
+        try:
+            self.builder.build(self.index_factory, self.embedding_decoder, staging, self.shards, model)
+            if self.store is not None:
+                version = self.store.publish_directory(
+                    staging,
+                    {"index_factory": self.index_factory, "catalog_fingerprint": fingerprint, "embedding_model": model},
+                )
+                staging = None
+                self.load_snapshot(version)
+                self.notifier.notify(version)
             else:
-                logger.warning(f"Book ID {book_item.id} ('{book_item.title}') has no stored embedding. Skipping.")
-                # Optionally, generate embedding here if missing (adds overhead to build_index):
-                # text_content = f"{book_item.title} {book_item.author} {book_item.description or ''}".strip()
-                # if text_content:
-                #     try:
-                #         logger.info(f"Generating missing embedding for book ID {book_item.id}")
-                #         embedding_vector = get_embedding(text_content)
-                #         book_item.embedding = json.dumps(embedding_vector)
-                #         db.add(book_item) # Save the newly generated embedding
-                #         db.commit() 
-                #         embeddings_list.append(embedding_vector)
-                #         valid_books_for_index.append(book_item)
-                #     except Exception as gen_e:
-                #         logger.error(f"Failed to generate missing embedding for book {book_item.id}: {gen_e}")
-                # else:
-                #     logger.warning(f"Book ID {book_item.id} also has no content for on-the-fly embedding generation.")
-
-        if not embeddings_list:
+                # The mapping outlives the files, so the private copy can go straight away.
+                self._swap(read_snapshot_dir(staging))
+        finally:
+            if staging is not None and os.path.isdir(staging):
+                shutil.rmtree(staging, ignore_errors=True)
+
+    def _swap(self, snapshot: IndexSnapshot, version: Optional[int] = None) -> bool:
+        """
+        Atomically publish a fully built snapshot to readers. Versions only move forward.
+        """
+        with self._swap_lock:
+            current = self._snapshot
+            if version is None:
+                version = current.version + 1
+            elif version <= current.version:
+                return False
+            snapshot.version = version
+            if not snapshot.dimension:
+                snapshot.dimension = current.dimension
+            self._snapshot = snapshot
+        # Entries are keyed by version; drop the old ones rather than wait for eviction.
+        self._similar_cache.clear()
+        self._result_cache.clear()
+        self._update_index_gauges(snapshot)
+        return True
+
+    def load_snapshot(self, version: int):
+        try:
+            snapshot = self.store.load(version)
+        except SnapshotMissing:
+            # Pruned before this worker got to it: newer versions were published, load the current one.
+            current = self.store.current_version()
+            if current is None or current == version:
+                raise
+            logger.info("Search index snapshot v%d was pruned; loading current v%d.", version, current)
+            if current <= self.version:
+                return
+            version, snapshot = current, self.store.load(current)
+        if self._swap(snapshot, version):
+            logger.info("Switched to search index snapshot v%d.", version)
+
+    def _on_version_published(self, version: int):
+        if version > self.version:
+            self.load_snapshot(version)
+
+    def filter_columns(self, db: Session, snapshot: IndexSnapshot) -> FilterColumns:
+        """
+        Filterable columns aligned to `snapshot`, cached until the index changes, a local
+        write invalidates them, or `SEARCH_FILTER_CACHE_TTL_SECONDS` passes.
+        """
+        columns = self._filter_columns
+        if self._filter_columns_fresh(columns, snapshot):
+            return columns
+        with self._filter_lock:
+            columns = self._filter_columns
+            if not self._filter_columns_fresh(columns, snapshot):
+                columns = FilterColumns.from_rows(
+                    snapshot.version, np.asarray(snapshot.id_map.book_ids),
+                    crud_book.get_filter_columns(db), time.monotonic(),
+                )
+                self._filter_columns = columns
+            return columns
+
+    @staticmethod
+    def _filter_columns_fresh(columns: Optional[FilterColumns], snapshot: IndexSnapshot) -> bool:
+        return (
+            columns is not None
+            and columns.version == snapshot.version
+            and time.monotonic() - columns.loaded_at < settings.SEARCH_FILTER_CACHE_TTL_SECONDS
+        )
+
+    def invalidate_filter_columns(self):
+        """Call after changing a filterable column of a book."""
+        self._filter_columns = None
+
+    def _update_index_gauges(self, snapshot: IndexSnapshot):
+        index = snapshot.index
+        ntotal = index.ntotal if index is not None else 0
+        code_size = getattr(index, "code_size", snapshot.dimension * 4) if index is not None else 0
+        SEARCH_INDEX_VECTORS.set(ntotal)
+        SEARCH_INDEX_DIMENSION.set(snapshot.dimension)
+        SEARCH_INDEX_BYTES.set(ntotal * code_size + snapshot.id_map.nbytes)
+
+    def build_from_rows(self, rows: Iterable[Tuple[int, Optional[str]]]) -> IndexSnapshot:
+        """
+        Build a new, unpublished index snapshot from `(book_id, stored_embedding)` pairs.
+        """
+        try:
+            book_ids, np_embeddings = self._decode_rows(rows)
+        except ValueError as e:
+            logger.error("%s Index build failed.", e)
+            return _empty_snapshot()
+        if np_embeddings is None:
             logger.info("No valid embeddings found in books to build index after processing.")
-            self.index = None
-            self.book_id_to_faiss_idx = {}
-            self.faiss_idx_to_book_id = {}
-            self.is_built = False
-            return
-        
-        current_dimension = len(embeddings_list[0])
-        if self.dimension is None:
-            self.dimension = current_dimension
-        elif self.dimension != current_dimension:
+            return _empty_snapshot()
+
+        dimension = np_embeddings.shape[1]
+        if self.dimension is not None and self.dimension != dimension:
             logger.error(
-                f"Embedding dimension mismatch during index build. Expected {self.dimension}, found {current_dimension}. "
-                f"This suggests an issue with embedding consistency in the DB. Re-initializing index with new dimension."
+                "Embedding dimension mismatch during index build. Expected %s, found %s. "
+                "This suggests an issue with embedding consistency in the DB. Re-initializing index with new dimension.",
+                self.dimension, dimension,
             )
-            self.dimension = current_dimension
 
-        self.index = faiss.IndexFlatL2(self.dimension)
-        self.book_id_to_faiss_idx = {}
-        self.faiss_idx_to_book_id = {}
-        
         try:
-            np_embeddings = np.array(embeddings_list, dtype=np.float32)
-            if np_embeddings.shape[1] != self.dimension:
-                logger.error(f"Numpy array dimension ({np_embeddings.shape[1]}) does not match expected dimension ({self.dimension}). Index build failed.")
-                self.is_built = False
-                return
-            self.index.add(np_embeddings)
-        except ValueError as ve:
-            logger.error(f"ValueError adding embeddings to FAISS index (likely due to inconsistent dimensions): {ve}. Index build failed.", exc_info=True)
-            self.is_built = False
-            return
+            if self.shards > 1:
+                index = self._new_sharded_index(book_ids, np_embeddings)
+            else:
+                index = self._new_index(np_embeddings)
+        except (ValueError, RuntimeError) as e:
+            logger.error("Error building FAISS index (%s): %s. Index build failed.", self.index_factory, e, exc_info=True)
+            return _empty_snapshot()
 
-        for i, book_obj in enumerate(valid_books_for_index):
-            self.book_id_to_faiss_idx[book_obj.id] = i
-            self.faiss_idx_to_book_id[i] = book_obj.id
-        
-        self.is_built = True
-        logger.info(f"FAISS index built successfully with {self.index.ntotal} items from stored embeddings.")
+        logger.info(
+            "FAISS index (%s, %d shard(s)) built successfully with %s items from stored embeddings.",
+            self.index_factory, self.shards, index.ntotal,
+        )
+        return IndexSnapshot(version=0, index=index, id_map=BookIdMap(book_ids), dimension=dimension, meta={})
 
-    def semantic_search(self, db: Session, query: str, k: int = 5) -> List[Dict[str, Any]]:
+    def _decode_rows(self, rows: Iterable[Tuple[int, Optional[str]]]) -> Tuple[np.ndarray, Optional[np.ndarray]]:
         """
-        Perform semantic search using FAISS.
-        Builds index on first call if not already built.
+        Decode `(book_id, stored_embedding)` pairs into book ids in ascending order and
+        the matching float32 matrix (None if no row had a usable embedding). Raises
+        ValueError when embeddings disagree on their dimension.
         """
-        if not self.is_built or self.index is None:
-            logger.info("FAISS index not built or is None. Attempting to build now.")
-            self.build_index(db)
-            if not self.is_built or self.index is None:
-                logger.error("Failed to build FAISS index for semantic search.")
-                return []
-        
-        if self.index.ntotal == 0:
+        rows = rows if isinstance(rows, list) else list(rows)
+        # Decoded vectors go straight into one float32 matrix rather than a list of
+        # Python float lists, which would cost several times the index itself.
+        np_embeddings: Optional[np.ndarray] = None
+        valid_book_ids: List[int] = []
+
+        for book_id, stored_embedding in rows:
+            if not stored_embedding:
+                logger.warning("Book ID %s has no stored embedding. Skipping.", book_id)
+                continue
+            try:
+                embedding_vector = self.embedding_decoder(stored_embedding)
+            except ValueError as e:
+                logger.warning("Book ID %s: Error parsing stored embedding: %s. Skipping.", book_id, e)
+                continue
+            if np_embeddings is None:
+                np_embeddings = np.empty((len(rows), len(embedding_vector)), dtype=np.float32)
+            if len(embedding_vector) != np_embeddings.shape[1]:
+                raise ValueError(
+                    f"Book ID {book_id}: embedding has {len(embedding_vector)} dimensions, "
+                    f"expected {np_embeddings.shape[1]}."
+                )
+            np_embeddings[len(valid_book_ids)] = embedding_vector
+            valid_book_ids.append(book_id)
+
+        book_ids = np.array(valid_book_ids, dtype=np.int64)
+        if np_embeddings is None:
+            return book_ids, None
+        np_embeddings = np_embeddings[:len(valid_book_ids)]
+        # The id map is searched by book id, so keep positions in id order.
+        if len(book_ids) > 1 and not np.all(book_ids[:-1] < book_ids[1:]):
+            order = np.argsort(book_ids, kind="stable")
+            book_ids, np_embeddings = book_ids[order], np_embeddings[order]
+        return book_ids, np_embeddings
+
+    def _new_sharded_index(self, book_ids: np.ndarray, vectors: np.ndarray) -> ShardedIndex:
+        owner = shard_of(book_ids, self.shards)
+        parts = [(book_ids[owner == shard], vectors[owner == shard]) for shard in range(self.shards)]
+        # Shards are trained and filled concurrently; FAISS releases the GIL for both.
+        indexes = list(query_executor().map(lambda part: self._new_index(part[1]) if len(part[0]) else None, parts))
+        return ShardedIndex(indexes, [shard_ids for shard_ids, _ in parts])
+
+    def _new_index(self, vectors: np.ndarray) -> faiss.Index:
+        index = faiss.index_factory(vectors.shape[1], self.index_factory, faiss.METRIC_L2)
+        if not index.is_trained:
+            # Quantizer training saturates long before the full catalog; a sample is enough.
+            sample = vectors
+            if len(vectors) > TRAINING_SAMPLE_SIZE:
+                rng = np.random.default_rng(0)
+                sample = vectors[np.sort(rng.choice(len(vectors), TRAINING_SAMPLE_SIZE, replace=False))]
+            index.train(sample)
+        index.add(vectors)
+        return index
+
+    def _reranks(self, snapshot: IndexSnapshot) -> bool:
+        return self.rerank_factor > 1 and not _is_exact(snapshot.index)
+
+    def rerank(
+        self, db: Session, queries: np.ndarray, faiss_indices: np.ndarray, snapshot: IndexSnapshot, k: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Re-order each row of candidate positions by exact L2 distance to the
+        full-precision embeddings stored in the DB, keeping the best k.
+        """
+        id_map = snapshot.id_map
+        positions = np.unique(faiss_indices[faiss_indices >= 0])
+        book_ids = [id_map.book_id(int(position)) for position in positions]
+        vectors: Dict[int, np.ndarray] = {}
+        for book_id, stored_embedding in crud_book.get_stored_embeddings(db, book_ids=book_ids):
+            if not stored_embedding:
+                continue
+            try:
+                vector = np.asarray(self.embedding_decoder(stored_embedding), dtype=np.float32)
+            except ValueError:
+                continue
+            if len(vector) == snapshot.dimension:
+                vectors[id_map.position(book_id)] = vector
+
+        distances = np.full((len(queries), k), -1.0, dtype=np.float32)
+        labels = np.full((len(queries), k), -1, dtype=np.int64)
+        for row, (query, candidates) in enumerate(zip(queries, faiss_indices)):
+            candidates = [int(position) for position in candidates if position in vectors]
+            if not candidates:
+                continue
+            exact = ((np.stack([vectors[position] for position in candidates]) - query) ** 2).sum(axis=1)
+            best = np.argsort(exact)[:k]
+            labels[row, :len(best)] = np.asarray(candidates)[best]
+            distances[row, :len(best)] = exact[best]
+        return distances, labels
+
+    def semantic_search(
+        self, db: Session, query: str, k: int = 5, filters: Optional[SearchFilters] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Perform semantic search using FAISS. `filters` restrict the search itself,
+        so up to k matching books are returned. Without an index, returns nothing
+        and requests a background rebuild.
+        """
+        return self.semantic_search_batch(db, [query], k, filters)[0]
+
+    def semantic_search_batch(
+        self, db: Session, queries: Sequence[str], k: int = 5, filters: Optional[SearchFilters] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Search for several queries at once: one batched embedding call, one matrix
+        search and one query to hydrate every hit. Returns one result list per query.
+
+        Hits are cached per (index version, normalised query, k, filters) for
+        `SEARCH_RESULT_CACHE_TTL_SECONDS`, and concurrent single-query searches that
+        miss the cache with the same key share one embedding call and index search.
+        Books are still loaded per request, so deleted or edited books never leak out.
+        """
+        no_results: List[List[Dict[str, Any]]] = [[] for _ in queries]
+        if not queries:
+            return no_results
+        if not self._index_ready():
+            logger.info("No FAISS index to search; a background rebuild was requested.")
+            return no_results
+
+        snapshot = self._snapshot
+        if snapshot.index is None or snapshot.index.ntotal == 0:
             logger.info("FAISS index is empty. No items to search.")
+            return no_results
+
+        if filters is not None and filters.is_empty:
+            filters = None
+        normalised = [normalise_query(query) for query in queries]
+        # The first query text seen for each key is the one embedded.
+        texts: Dict[str, str] = {}
+        for key, query in zip(normalised, queries):
+            texts.setdefault(key, query)
+        unique_queries = list(texts)
+        hits: Dict[str, Hits] = {}
+        missing = []
+        for query in unique_queries:
+            cached = self._result_cache.get((snapshot.version, query, k, filters))
+            if cached is None:
+                missing.append(query)
+            else:
+                hits[query] = cached
+        SEARCH_RESULT_CACHE.labels("hit").inc(len(unique_queries) - len(missing))
+        if len(missing) == 1:
+            key = (snapshot.version, missing[0], k, filters)
+            hits[missing[0]], shared = self._in_flight.do(
+                key, lambda: self._search_and_cache(db, missing, [texts[missing[0]]], k, filters, snapshot)[0]
+            )
+            SEARCH_RESULT_CACHE.labels("coalesced" if shared else "miss").inc()
+        elif missing:
+            # A batch is already one embedding call and one search; it is not coalesced further.
+            SEARCH_RESULT_CACHE.labels("miss").inc(len(missing))
+            hits.update(zip(
+                missing, self._search_and_cache(db, missing, [texts[query] for query in missing], k, filters, snapshot)
+            ))
+
+        with SEARCH_PHASE_DURATION.labels("hydration").time():
+            hydrated = self.hydrate_batch(
+                db, [hits[query][0] for query in unique_queries], [hits[query][1] for query in unique_queries], snapshot
+            )
+        if filters is not None:
+            # The cached columns (and cached hits) may trail a write made since.
+            hydrated = [[result for result in results if filters.matches(result["book"])] for results in hydrated]
+        by_query = dict(zip(unique_queries, hydrated))
+        return [list(by_query[query]) for query in normalised]
+
+    def semantic_search_page(
+        self,
+        db: Session,
+        query: str,
+        limit: int,
+        filters: Optional[SearchFilters] = None,
+        cursor_id: Optional[str] = None,
+        offset: int = 0,
+        on_rerun: Optional[Callable[[], None]] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        """
+        One page of semantic search results, plus `{"id", "offset"}` for the next page
+        (None after the last one, or at `SEARCH_CURSOR_MAX_RESULTS`).
+
+        The first page embeds the query once and keeps its vector and the top
+        `SEARCH_CURSOR_CANDIDATES` candidates under a new cursor id for
+        `SEARCH_CURSOR_TTL_SECONDS`. Later pages only load their own slice of books;
+        the candidate list is extended from the cached vector if a client pages past
+        it. A cursor that has expired, or was issued by another worker, is re-run
+        under the same id; `on_rerun` is called first (the route charges the rate limit
+        there), and may raise to refuse it.
+        """
+        if filters is not None and filters.is_empty:
+            filters = None
+        if not self._index_ready():
+            return [], None
+        snapshot = self._snapshot
+        if snapshot.index is None or snapshot.index.ntotal == 0 or offset >= settings.SEARCH_CURSOR_MAX_RESULTS:
+            return [], None
+        limit = min(limit, settings.SEARCH_CURSOR_MAX_RESULTS - offset)
+
+        normalised = normalise_query(query)
+        wanted = offset + limit + 1 # one past the page, to know whether another follows
+        # The query is part of the key, so a cursor id presented with another query never matches.
+        cursor = self._cursors.get((cursor_id, normalised, filters)) if cursor_id else None
+        if cursor is not None:
+            SEARCH_CURSOR_PAGES.labels("cached").inc()
+        else:
+            if cursor_id and on_rerun is not None:
+                on_rerun()
+            SEARCH_CURSOR_PAGES.labels("rerun" if cursor_id else "first").inc()
+            with SEARCH_PHASE_DURATION.labels("embedding").time():
+                query_vector = np.asarray(get_embeddings([query], snapshot.meta.get("embedding_model"))[0], dtype=np.float32)
+            if len(query_vector) != snapshot.dimension:
+                logger.error(
+                    "Query embedding dimension (%d) mismatch with index dimension (%s). Cannot perform search.",
+                    len(query_vector), snapshot.dimension,
+                )
+                return [], None
+            cursor = ResultCursor(query_vector, np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32), False)
+            cursor_id = cursor_id or secrets.token_urlsafe(16)
+            wanted = max(wanted, settings.SEARCH_CURSOR_CANDIDATES)
+        if len(cursor.book_ids) < wanted and not cursor.exhausted:
+            fetch = min(max(wanted, 2 * len(cursor.book_ids)), settings.SEARCH_CURSOR_MAX_RESULTS + 1)
+            cursor = self._extend_cursor(db, cursor, fetch, filters, snapshot)
+        self._cursors.put((cursor_id, normalised, filters), cursor)
+
+        page = slice(offset, offset + limit)
+        hits = [
+            (int(book_id), float(1 / (1 + distance)) if distance >= 0 else 0.0)
+            for book_id, distance in zip(cursor.book_ids[page], cursor.distances[page])
+        ]
+        with SEARCH_PHASE_DURATION.labels("hydration").time():
+            results = self._load_hits(db, [hits])[0]
+        if filters is not None:
+            results = [result for result in results if filters.matches(result["book"])]
+        has_more = len(cursor.book_ids) > offset + limit and offset + limit < settings.SEARCH_CURSOR_MAX_RESULTS
+        return results, ({"id": cursor_id, "offset": offset + limit} if has_more else None)
+
+    def _extend_cursor(
+        self, db: Session, cursor: ResultCursor, fetch: int, filters: Optional[SearchFilters], snapshot: IndexSnapshot
+    ) -> ResultCursor:
+        """Search the current index for `fetch` candidates, keeping the ones the cursor already has in front."""
+        searchable = snapshot.index.ntotal
+        mask = None
+        if filters is not None:
+            with SEARCH_PHASE_DURATION.labels("filter").time():
+                mask = self.filter_columns(db, snapshot).mask(filters)
+                searchable = int(mask.sum())
+        fetch = min(fetch, searchable)
+        if not fetch:
+            return ResultCursor(cursor.query_vector, cursor.book_ids, cursor.distances, True)
+        query_matrix = cursor.query_vector.reshape(1, -1)
+        with SEARCH_PHASE_DURATION.labels("faiss_search").time():
+            if mask is None:
+                distances, faiss_indices = snapshot.index.search(query_matrix, fetch)
+            else:
+                distances, faiss_indices = filtered_search(snapshot.index, query_matrix, fetch, mask)
+        if self._reranks(snapshot):
+            with SEARCH_PHASE_DURATION.labels("rerank").time():
+                distances, faiss_indices = self.rerank(db, query_matrix, faiss_indices, snapshot, fetch)
+
+        found = faiss_indices[0] >= 0
+        book_ids = np.asarray(snapshot.id_map.book_ids)[faiss_indices[0][found]]
+        distances = distances[0][found]
+        # Earlier pages were served from the old list, so its order is kept as it was.
+        new = ~np.isin(book_ids, cursor.book_ids)
+        return ResultCursor(
+            cursor.query_vector,
+            np.concatenate([cursor.book_ids, book_ids[new]]),
+            np.concatenate([cursor.distances, distances[new]]),
+            exhausted=fetch >= searchable,
+        )
+
+    def _search_and_cache(
+        self,
+        db: Session,
+        keys: List[str],
+        queries: List[str],
+        k: int,
+        filters: Optional[SearchFilters],
+        snapshot: IndexSnapshot,
+    ) -> List[Hits]:
+        """Search the query texts and cache each one's hits under its normalised key."""
+        results = self._search(db, queries, k, filters, snapshot)
+        for key, query_hits in zip(keys, results):
+            self._result_cache.put((snapshot.version, key, k, filters), query_hits)
+        return results
+
+    def _search(
+        self, db: Session, queries: List[str], k: int, filters: Optional[SearchFilters], snapshot: IndexSnapshot
+    ) -> List[Hits]:
+        """Index positions and distances of the top k hits for each query, best first."""
+        no_hits = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32))
+        mask = None
+        if filters is not None:
+            with SEARCH_PHASE_DURATION.labels("filter").time():
+                mask = self.filter_columns(db, snapshot).mask(filters)
+                allowed = int(mask.sum())
+            if not allowed:
+                return [no_hits for _ in queries]
+            k = min(k, allowed)
+
+        with SEARCH_PHASE_DURATION.labels("embedding").time():
+            query_embeddings = get_embeddings(queries, snapshot.meta.get("embedding_model"))
+
+        for query_embedding_vector in query_embeddings:
+            if len(query_embedding_vector) != snapshot.dimension:
+                logger.error(
+                    "Query embedding dimension (%d) mismatch with index dimension (%s). "
+                    "Cannot perform search. Check OpenAI model or index integrity.",
+                    len(query_embedding_vector), snapshot.dimension,
+                )
+                return [no_hits for _ in queries] # Do not attempt rebuild here, as query dimension is the problem
+
+        query_matrix = np.array(query_embeddings, dtype=np.float32)
+        reranking = self._reranks(snapshot)
+        fetch_k = min(k * self.rerank_factor, allowed if mask is not None else snapshot.index.ntotal) if reranking else k
+        with SEARCH_PHASE_DURATION.labels("faiss_search").time():
+            if mask is None:
+                distances, faiss_indices = snapshot.index.search(query_matrix, min(fetch_k, snapshot.index.ntotal))
+            else:
+                distances, faiss_indices = filtered_search(snapshot.index, query_matrix, fetch_k, mask)
+        if reranking:
+            with SEARCH_PHASE_DURATION.labels("rerank").time():
+                distances, faiss_indices = self.rerank(db, query_matrix, faiss_indices, snapshot, k)
+        return list(zip(faiss_indices, distances))
+
+    def similar_books(self, db: Session, book: Any, k: int = 5) -> List[Dict[str, Any]]:
+        """
+        Books nearest to `book`'s own vector, excluding the book itself. Needs no
+        embedding call; neighbours are cached per book until the index changes.
+        """
+        if not self._index_ready():
+            return []
+        snapshot = self._snapshot
+        if snapshot.index is None or snapshot.index.ntotal == 0:
             return []
 
-        query_embedding_vector = get_embedding(query)
-        
-        if self.dimension is None:
-             logger.error("Index dimension is not set. Cannot perform search. Attempting to rebuild index.")
-             self.build_index(db)
-             if not self.is_built or self.index is None or self.dimension is None:
-                logger.error("Failed to set index dimension after rebuild. Search aborted.")
+        key = (snapshot.version, book.id, k)
+        neighbours = self._similar_cache.get(key)
+        if neighbours is None:
+            vector = self._book_vector(book, snapshot)
+            if vector is None:
+                logger.info("Book ID %s has no usable vector; no similar books.", book.id)
                 return []
+            with SEARCH_PHASE_DURATION.labels("faiss_search").time():
+                distances, faiss_indices = snapshot.index.search(
+                    vector.reshape(1, -1), min(k + 1, snapshot.index.ntotal)
+                )
+            own_position = snapshot.id_map.position(book.id)
+            keep = [i for i, idx in enumerate(faiss_indices[0]) if idx != -1 and idx != own_position][:k]
+            neighbours = (faiss_indices[0][keep], distances[0][keep])
+            self._similar_cache.put(key, neighbours)
 
-        if len(query_embedding_vector) != self.dimension:
-            logger.error(
-                f"Query embedding dimension ({len(query_embedding_vector)}) mismatch with index dimension ({self.dimension}). "
-                f"Cannot perform search. Check OpenAI model or index integrity."
+        with SEARCH_PHASE_DURATION.labels("hydration").time():
+            return self.hydrate(db, neighbours[0], neighbours[1], snapshot)
+
+    def _book_vector(self, book: Any, snapshot: IndexSnapshot) -> Optional[np.ndarray]:
+        position = snapshot.id_map.position(book.id)
+        if position is not None:
+            try:
+                return np.asarray(snapshot.index.reconstruct(position), dtype=np.float32)
+            except RuntimeError:
+                pass # e.g. an IVF index without a direct map; use the stored embedding instead
+        if not book.embedding:
+            return None
+        try:
+            vector = np.array(self.embedding_decoder(book.embedding), dtype=np.float32)
+        except ValueError as e:
+            logger.warning("Book ID %s: Error parsing stored embedding: %s.", book.id, e)
+            return None
+        return vector if len(vector) == snapshot.dimension else None
+
+    def hydrate(
+        self,
+        db: Session,
+        faiss_indices: Sequence[int],
+        distances: Sequence[float],
+        snapshot: Optional[IndexSnapshot] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Turn one row of FAISS results into `{"book", "score"}` dicts, best first.
+        `snapshot` must be the one that produced the results (defaults to the current one).
+        """
+        return self.hydrate_batch(db, [faiss_indices], [distances], snapshot)[0]
+
+    def hydrate_batch(
+        self,
+        db: Session,
+        faiss_indices: Sequence[Sequence[int]],
+        distances: Sequence[Sequence[float]],
+        snapshot: Optional[IndexSnapshot] = None,
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Like `hydrate` for every row of a batched search, loading all hit books with one query.
+        """
+        id_map = (snapshot or self._snapshot).id_map
+        hits_per_row: List[List[Tuple[int, float]]] = []
+        for row_indices, row_distances in zip(faiss_indices, distances):
+            hits = []
+            for faiss_idx, distance in zip(row_indices, row_distances):
+                if faiss_idx == -1:
+                    continue
+                book_id = id_map.book_id(int(faiss_idx))
+                if book_id:
+                    score = float(1 / (1 + distance)) if distance >= 0 else 0.0
+                    hits.append((book_id, score))
+            hits_per_row.append(hits)
+        return self._load_hits(db, hits_per_row)
+
+    @staticmethod
+    def _load_hits(db: Session, hits_per_row: List[List[Tuple[int, float]]]) -> List[List[Dict[str, Any]]]:
+        """Turn rows of `(book_id, score)` into `{"book", "score"}` dicts, best first, skipping deleted books."""
+        wanted = {book_id for hits in hits_per_row for book_id, _ in hits}
+        books = {book.id: book for book in crud_book.get_many(db, wanted)}
+        return [
+            sorted(
+                ({"book": books[book_id], "score": score} for book_id, score in hits if book_id in books),
+                key=lambda x: x["score"], reverse=True,
             )
-            return [] # Do not attempt rebuild here, as query dimension is the problem
+            for hits in hits_per_row
+        ]
 
-        distances, faiss_indices = self.index.search(
-            np.array([query_embedding_vector], dtype=np.float32),
-            min(k, self.index.ntotal) 
-        )
-        
-        results = []
-        for i, faiss_idx in enumerate(faiss_indices[0]):
-            if faiss_idx == -1: 
-                continue
-            book_id = self.faiss_idx_to_book_id.get(int(faiss_idx))
-            if book_id:
-                book_obj = crud_book.get(db, book_id=book_id)
-                if book_obj:
-                    score = float(1 / (1 + distances[0][i])) if distances[0][i] >= 0 else 0.0
-                    results.append({
-                        "book": book_obj,
-                        "score": score
-                    })
-                    
-        return sorted(results, key=lambda x: x["score"], reverse=True)
-
-search_service = SearchService() 
\ No newline at end of file
+set_query_threads(settings.SEARCH_QUERY_THREADS)
+search_service = SearchService(
+    settings.SEARCH_INDEX_FACTORY, rerank_factor=settings.SEARCH_RERANK_FACTOR, shards=settings.SEARCH_INDEX_SHARDS
+)
+if settings.SEARCH_INDEX_DIR:
+    _snapshot_store = IndexSnapshotStore(settings.SEARCH_INDEX_DIR)
+    search_service.enable_snapshots(_snapshot_store, create_notifier(_snapshot_store))
+if settings.SEARCH_BUILD_OUT_OF_PROCESS:
+    search_service.enable_process_builds(
+        # The primary, like in-process rebuilds: builds follow writes a replica may not have yet.
+        ProcessIndexBuilder(settings.DATABASE_URL)
+    ) 
\ No newline at end of file
@@ -0,0 +1,138 @@
+"""
+Sharded vector index for large catalogs.
+
+Books are split into S shards by `book_id % S`, and each shard has its own FAISS
+(or mapped flat) index, so one shard can be rebuilt without touching the others.
+A query is sent to every shard at once on a thread pool (FAISS releases the GIL
+while it searches), and the per-shard top-k lists, each sorted by distance, are
+merged with a heap.
+
+`ShardedIndex` exposes the same positions as a single index would: the position
+of a book is its rank in the sorted union of all shard book ids. The search
+service's id map, filter columns, re-ranking and hydration therefore work
+unchanged.
+"""
+from __future__ import annotations
+
+import heapq
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from app.utils.lazy_import import lazy_import
+
+np = lazy_import("numpy")
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+_query_threads = 0
+
+
+def set_query_threads(threads: int) -> None:
+    """Threads used to fan a query out over shards; 0 means one per CPU. Replaces the running pool."""
+    global _executor, _query_threads
+    with _executor_lock:
+        _query_threads = threads
+        old, _executor = _executor, None
+    if old is not None:
+        old.shutdown(wait=False)
+
+
+def query_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=_query_threads or os.cpu_count() or 1, thread_name_prefix="search-shard"
+            )
+        return _executor
+
+
+def shard_of(book_ids: Any, shards: int) -> np.ndarray:
+    return np.asarray(book_ids, dtype=np.int64) % shards
+
+
+class ShardedIndex:
+    def __init__(self, shards: Sequence[Optional[Any]], shard_book_ids: Sequence[np.ndarray]):
+        # `shards[s]` indexes `shard_book_ids[s]` (sorted) in order; None for an empty shard.
+        self.shards = list(shards)
+        self.shard_book_ids = [np.asarray(ids, dtype=np.int64) for ids in shard_book_ids]
+        non_empty = [ids for ids in self.shard_book_ids if len(ids)]
+        self.book_ids = np.sort(np.concatenate(non_empty)) if non_empty else np.empty(0, dtype=np.int64)
+        # Global position of each shard-local position.
+        self.positions = [np.searchsorted(self.book_ids, ids) for ids in self.shard_book_ids]
+        self.ntotal = len(self.book_ids)
+        present = [shard for shard in self.shards if shard is not None]
+        self.d = present[0].d if present else 0
+        self.code_size = present[0].code_size if present else 0
+
+    @property
+    def nshards(self) -> int:
+        return len(self.shards)
+
+    def with_shards(self, replaced: Dict[int, Tuple[Optional[Any], np.ndarray]]) -> "ShardedIndex":
+        """A new index with some shards swapped out; the others are shared, not copied."""
+        shards, shard_book_ids = list(self.shards), list(self.shard_book_ids)
+        for shard, (index, book_ids) in replaced.items():
+            shards[shard], shard_book_ids[shard] = index, book_ids
+        return ShardedIndex(shards, shard_book_ids)
+
+    def search(self, queries: np.ndarray, k: int, params: Any = None) -> Tuple[np.ndarray, np.ndarray]:
+        queries = np.ascontiguousarray(queries, dtype=np.float32)
+        return self._merge(self._fan_out(lambda shard: self._search_shard(shard, queries, k)), len(queries), k)
+
+    def search_masked(
+        self, queries: np.ndarray, k: int, mask: np.ndarray,
+        masked_search: Callable[[Any, np.ndarray, int, np.ndarray], Tuple[np.ndarray, np.ndarray]],
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """As `search`, over only the global positions set in `mask`, using `masked_search` per shard."""
+        queries = np.ascontiguousarray(queries, dtype=np.float32)
+        return self._merge(
+            self._fan_out(lambda shard: self._search_shard(shard, queries, k, mask, masked_search)), len(queries), k
+        )
+
+    def reconstruct(self, position: int) -> np.ndarray:
+        book_id = int(self.book_ids[position])
+        shard = book_id % self.nshards
+        local = int(np.searchsorted(self.shard_book_ids[shard], book_id))
+        return self.shards[shard].reconstruct(local)
+
+    def _fan_out(self, fn: Callable[[int], Any]) -> List[Any]:
+        busy = [shard for shard, index in enumerate(self.shards) if index is not None and index.ntotal]
+        if len(busy) <= 1:
+            return [fn(shard) for shard in busy]
+        return list(query_executor().map(fn, busy))
+
+    def _search_shard(
+        self, shard: int, queries: np.ndarray, k: int,
+        mask: Optional[np.ndarray] = None, masked_search: Optional[Callable] = None,
+    ) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        index = self.shards[shard]
+        if mask is None:
+            distances, labels = index.search(queries, min(k, index.ntotal))
+        else:
+            local_mask = mask[self.positions[shard]]
+            if not local_mask.any():
+                return None
+            distances, labels = masked_search(index, queries, k, local_mask)
+        positions = self.positions[shard]
+        return distances, np.where(labels >= 0, positions[np.maximum(labels, 0)], -1)
+
+    @staticmethod
+    def _merge(results: List[Optional[Tuple[np.ndarray, np.ndarray]]], nq: int, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        distances = np.full((nq, k), np.inf, dtype=np.float32)
+        labels = np.full((nq, k), -1, dtype=np.int64)
+        results = [result for result in results if result is not None]
+        for row in range(nq):
+            # Each shard's row is already sorted by distance, so a k-way heap merge suffices.
+            runs = [
+                [(float(distance), int(label)) for distance, label in zip(shard_distances[row], shard_labels[row]) if label >= 0]
+                for shard_distances, shard_labels in results
+            ]
+            best = list(islice(heapq.merge(*runs), k))
+            if best:
+                distances[row, :len(best)] = [distance for distance, _ in best]
+                labels[row, :len(best)] = [label for _, label in best]
+        return distances, labels
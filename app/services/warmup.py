@@ -0,0 +1,113 @@
+"""
+Background start-up: load the search index and warm pools and caches without
+holding up the server, and report readiness for `/health/ready`.
+"""
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+from app.db.session import ReadSessionLocal, engine
+from app.services.search_service import search_service
+from app.utils import embedding
+
+logger = logging.getLogger(__name__)
+
+
+class Readiness:
+    """Progress of the start-up warm-up, shared by the warm-up thread and the health routes."""
+
+    def __init__(self):
+        self.started_at: Optional[float] = None
+        self.db_warm = threading.Event()
+        self.index_loaded = threading.Event()
+        self.index_error: Optional[str] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def index_loading(self) -> bool:
+        return self.started_at is not None and not self.index_loaded.is_set()
+
+    def report(self) -> Dict[str, Any]:
+        if not self.index_loaded.is_set():
+            index_state = "loading" if self.started_at is not None else "not started"
+        elif self.index_error is not None:
+            index_state = "failed"
+        else:
+            index_state = "loaded" if search_service.is_built else "empty"
+        return {
+            "ready": self.db_warm.is_set() and self.index_loaded.is_set(),
+            "db_pool": "warm" if self.db_warm.is_set() else "cold",
+            "search_index": index_state,
+            "search_index_version": search_service.version,
+            "search_index_error": self.index_error,
+            "uptime_seconds": round(time.monotonic() - self.started_at, 3) if self.started_at is not None else 0.0,
+        }
+
+
+def prime_db_pool(db_engine: Engine, connections: int) -> None:
+    """Open `connections` pooled connections at once and return them to the pool."""
+    opened = []
+    try:
+        for _ in range(max(1, connections)):
+            conn = db_engine.connect()
+            opened.append(conn)
+            conn.execute(text("SELECT 1"))
+    finally:
+        for conn in opened:
+            conn.close()
+
+
+def warm_up(state: Readiness) -> None:
+    """
+    Prime the DB pool, load or build the search index, then warm the caches the
+    first requests would otherwise fill. A failure in one step does not skip the others.
+    """
+    try:
+        prime_db_pool(engine, settings.WARMUP_DB_CONNECTIONS)
+        state.db_warm.set()
+    except Exception as e:
+        logger.error("Error warming the database pool: %s", e, exc_info=True)
+
+    db = ReadSessionLocal()
+    try:
+        logger.info("Loading search index in the background...")
+        search_service.initialize(db)
+        logger.info("Search index ready (version %s).", search_service.version)
+    except Exception as e:
+        state.index_error = str(e)
+        logger.error("Error building FAISS index on startup: %s", e, exc_info=True)
+    finally:
+        state.index_loaded.set()
+
+    try:
+        embedding.get_client()
+        snapshot = search_service.snapshot
+        if snapshot.index is not None:
+            search_service.filter_columns(db, snapshot)
+    except Exception as e:
+        logger.warning("Error warming caches: %s", e, exc_info=True)
+    finally:
+        db.close()
+    if not state.db_warm.is_set():
+        # The pool may only have been unavailable briefly; the index load used it since.
+        try:
+            prime_db_pool(engine, 1)
+            state.db_warm.set()
+        except Exception as e:
+            logger.error("Database still unavailable after warm-up: %s", e)
+
+
+def start_background_warmup(state: Optional[Readiness] = None) -> threading.Thread:
+    state = state or readiness
+    state.started_at = time.monotonic()
+    state._thread = threading.Thread(target=warm_up, args=(state,), name="startup-warmup", daemon=True)
+    state._thread.start()
+    return state._thread
+
+
+readiness = Readiness()
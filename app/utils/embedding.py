@@ -1,16 +1,62 @@
-from typing import List
-import numpy as np
-from openai import OpenAI
+import threading
+from typing import Callable, List, Optional
 from app.core.config import settings
 
-client = OpenAI(api_key=settings.OPENAI_API_KEY)
+_client = None
+_client_lock = threading.Lock()
 
-def get_embedding(text: str) -> List[float]:
+# (texts, model) -> one vector per text.
+EmbeddingProvider = Callable[[List[str], str], List[List[float]]]
+
+# Inputs per embeddings request accepted by the OpenAI API.
+EMBEDDING_BATCH_SIZE = 2048
+
+
+def get_client():
     """
-    Get embedding for text using OpenAI's API.
+    The shared OpenAI client, created on first use; importing the SDK is slow.
     """
-    response = client.embeddings.create(
-        model="text-embedding-ada-002",
-        input=text
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from openai import OpenAI
+                _client = OpenAI(api_key=settings.OPENAI_API_KEY)
+    return _client
+
+
+def _openai_embeddings(texts: List[str], model: str) -> List[List[float]]:
+    response = get_client().embeddings.create(
+        model=model,
+        input=texts
     )
-    return response.data[0].embedding 
\ No newline at end of file
+    return [item.embedding for item in response.data]
+
+
+_provider: EmbeddingProvider = _openai_embeddings
+
+
+def set_embedding_provider(provider: EmbeddingProvider) -> None:
+    """
+    Replace the embedding backend, e.g. with a local stand-in for benchmarks.
+    """
+    global _provider
+    _provider = provider
+
+
+def get_embedding(text: str, model: Optional[str] = None) -> List[float]:
+    """
+    Get embedding for text using OpenAI's API, with `model` or `EMBEDDING_MODEL`.
+    """
+    return _provider([text], model or settings.EMBEDDING_MODEL)[0]
+
+
+def get_embeddings(texts: List[str], model: Optional[str] = None) -> List[List[float]]:
+    """
+    Get embeddings for many texts with as few provider calls as possible, in input order.
+    """
+    model = model or settings.EMBEDDING_MODEL
+    embeddings: List[List[float]] = []
+    for start in range(0, len(texts), EMBEDDING_BATCH_SIZE):
+        embeddings.extend(_provider(texts[start:start + EMBEDDING_BATCH_SIZE], model))
+    return embeddings
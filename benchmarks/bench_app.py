@@ -0,0 +1,17 @@
+"""
+ASGI entry point for benchmarks: the real application with local stand-ins installed.
+
+    uvicorn benchmarks.bench_app:app --workers 4
+
+Each worker imports this module, so every worker gets the fakes.
+"""
+import os
+
+from benchmarks import fakes
+
+fakes.install(
+    dimension=int(os.environ.get("BENCH_EMBEDDING_DIM", "1536")),
+    latency_ms=float(os.environ.get("BENCH_EMBEDDING_LATENCY_MS", "0")),
+)
+
+from app.main import app  # noqa: E402
@@ -0,0 +1,100 @@
+"""
+Local stand-ins for the external services the app depends on.
+
+`install()` swaps Google ID-token verification and the OpenAI embedding call for
+deterministic in-process fakes so the real app can be driven without network access.
+"""
+import math
+import os
+import time
+import zlib
+from typing import Any, Dict, List, Optional
+
+# Placeholder values for the required Settings fields; never used to reach a real service.
+DEFAULT_ENV = {
+    "PROJECT_NAME": "Book Management Benchmark",
+    "SECRET_KEY": "bench-secret-key",
+    "GOOGLE_CLIENT_ID": "bench-client-id",
+    "GOOGLE_CLIENT_SECRET": "bench-client-secret",
+    "GOOGLE_REDIRECT_URI": "http://localhost:8000/api/v1/auth/callback",
+    "OPENAI_API_KEY": "bench-openai-key",
+}
+
+BENCH_TOKEN_PREFIX = "bench-token-"
+BENCH_ISSUER = "accounts.google.com"
+
+
+def apply_default_env(database_url: str) -> Dict[str, str]:
+    """Fill in required settings so `app.core.config` can be imported; returns the environment."""
+    for key, value in DEFAULT_ENV.items():
+        os.environ.setdefault(key, value)
+    os.environ["DATABASE_URL"] = database_url
+    return dict(os.environ)
+
+
+def bench_token(user_index: int) -> str:
+    return f"{BENCH_TOKEN_PREFIX}{user_index}"
+
+
+def bench_google_id(user_index: int) -> str:
+    return f"bench-google-{user_index}"
+
+
+def bench_email(user_index: int) -> str:
+    return f"bench-user-{user_index}@example.com"
+
+
+def fake_verify_oauth2_token(
+    token: str, request: Any = None, audience: Optional[str] = None, clock_skew_in_seconds: int = 0
+) -> Dict[str, Any]:
+    """Drop-in for `google.oauth2.id_token.verify_oauth2_token` accepting `bench-token-<n>`."""
+    if not token.startswith(BENCH_TOKEN_PREFIX):
+        raise ValueError("Not a benchmark token")
+    try:
+        user_index = int(token[len(BENCH_TOKEN_PREFIX):])
+    except ValueError:
+        raise ValueError("Malformed benchmark token")
+    return {
+        "iss": BENCH_ISSUER,
+        "sub": bench_google_id(user_index),
+        "email": bench_email(user_index),
+        "name": f"Bench User {user_index}",
+    }
+
+
+class FakeEmbeddingProvider:
+    """
+    Feature-hashing embedder: texts sharing words get nearby unit vectors, so
+    semantic search results are stable and meaningful across runs.
+    """
+
+    def __init__(self, dimension: int = 1536, latency_ms: float = 0.0):
+        self.dimension = dimension
+        self.latency_ms = latency_ms
+
+    def embed_one(self, text: str) -> List[float]:
+        vector = [0.0] * self.dimension
+        for word in text.lower().split():
+            digest = zlib.crc32(word.encode("utf-8"))
+            sign = 1.0 if digest & 1 else -1.0
+            vector[digest % self.dimension] += sign
+            vector[(digest >> 8) % self.dimension] += 0.5 * sign
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def __call__(self, texts: List[str], model: Optional[str] = None) -> List[List[float]]:
+        if self.latency_ms:
+            # One simulated network round trip per provider call, like the real API.
+            time.sleep(self.latency_ms / 1000.0)
+        return [self.embed_one(text) for text in texts]
+
+
+def install(dimension: int = 1536, latency_ms: float = 0.0) -> FakeEmbeddingProvider:
+    """Patch the process so the app never calls Google or OpenAI."""
+    from google.oauth2 import id_token
+    from app.utils import embedding
+
+    id_token.verify_oauth2_token = fake_verify_oauth2_token
+    provider = FakeEmbeddingProvider(dimension=dimension, latency_ms=latency_ms)
+    embedding.set_embedding_provider(provider)
+    return provider
@@ -0,0 +1,342 @@
+"""
+End-to-end load test for the Book Management API.
+
+Starts the real application (`benchmarks.bench_app` under uvicorn) against a local
+SQLite or Postgres database with fake Google and OpenAI stand-ins, seeds books and
+users, drives a weighted mix of endpoints at a fixed concurrency and reports
+throughput and p50/p95/p99 latency per endpoint as JSON.
+
+    python -m benchmarks.load_test --books 5000 --users 200 --concurrency 16 --duration 60 \
+        --output bench_results/load.json --compare bench_results/baseline.json
+
+Use `--base-url` to drive an already running server seeded by a previous run.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+from urllib.parse import quote
+
+import requests
+
+from benchmarks.fakes import FakeEmbeddingProvider, apply_default_env, bench_email, bench_google_id, bench_token
+from benchmarks.report import REPO_ROOT, load_report, print_comparison, run_metadata, summarize_latencies, write_report
+
+DEFAULT_MIX = "list=30,detail=25,keyword_search=15,semantic_search=10,checkout_checkin=10,write=10"
+
+WORDS = (
+    "adventure ancient atlas battle biography castle century chronicle city code dragon dream empire "
+    "engine forest garden ghost glass harbor history island journey kingdom letters light machine "
+    "memory mountain mystery night ocean orchard poetry quantum river science secret shadow silence "
+    "star storm summer theory time traveler valley voyage war water winter wisdom world"
+).split()
+
+
+def _phrase(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def configure_environment(args: argparse.Namespace) -> Dict[str, str]:
+    os.environ["BENCH_EMBEDDING_DIM"] = str(args.embedding_dim)
+    os.environ["BENCH_EMBEDDING_LATENCY_MS"] = str(args.embedding_latency_ms)
+    os.environ["PYTHONPATH"] = os.pathsep.join(filter(None, [REPO_ROOT, os.environ.get("PYTHONPATH")]))
+    return apply_default_env(args.database_url)
+
+
+def seed_database(args: argparse.Namespace) -> List[int]:
+    """Create the schema and insert `--books` books and `--users` users; returns book ids."""
+    from sqlalchemy import func, insert, select, update
+
+    from app.core.config import settings
+    from app.core.roles import UserRole
+    from app.db.base import Base
+    from app.db.models import Book, User
+    from app.db.session import SessionLocal, engine
+
+    if args.reset:
+        Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+
+    rng = random.Random(args.seed)
+    embedder = FakeEmbeddingProvider(dimension=args.embedding_dim)
+    librarians = max(1, args.users // 10)
+
+    with SessionLocal() as db:
+        if not db.scalar(select(func.count()).select_from(User)):
+            db.execute(insert(User), [
+                {
+                    "email": bench_email(i),
+                    "full_name": f"Bench User {i}",
+                    "google_id": bench_google_id(i),
+                    "is_active": True,
+                    "is_superuser": False,
+                    "role": UserRole.LIBRARIAN if i < librarians else UserRole.CUSTOMER,
+                }
+                for i in range(args.users)
+            ])
+            db.commit()
+
+        existing_books = db.scalar(select(func.count()).select_from(Book))
+        if not existing_books:
+            batch = []
+            for i in range(args.books):
+                title = _phrase(rng, 3).title()
+                author = f"{rng.choice(WORDS).title()} {rng.choice(WORDS).title()}"
+                description = _phrase(rng, 25)
+                batch.append({
+                    "title": title,
+                    "author": author,
+                    "isbn": f"{i:013d}",
+                    "description": description,
+                    "publication_year": rng.randint(1900, 2024),
+                    "publisher": f"{rng.choice(WORDS).title()} Press",
+                    "is_available": True,
+                    "embedding": json.dumps(embedder.embed_one(f"{title} {author} {description}")),
+                    "embedding_model": settings.EMBEDDING_MODEL,
+                    "embedding_dimension": args.embedding_dim,
+                })
+                if len(batch) >= 1000:
+                    db.execute(insert(Book), batch)
+                    batch = []
+            if batch:
+                db.execute(insert(Book), batch)
+            db.commit()
+        elif existing_books != args.books:
+            sys.stderr.write(f"Database already holds {existing_books} books; pass --reset to reseed.\n")
+        # Books seeded before vectors recorded their model would otherwise never be indexed.
+        db.execute(
+            update(Book)
+            .where(Book.embedding_model.is_(None), Book.embedding.is_not(None))
+            .values(embedding_model=settings.EMBEDDING_MODEL, embedding_dimension=args.embedding_dim)
+        )
+        db.commit()
+
+        return list(db.scalars(select(Book.id).order_by(Book.id)))
+
+
+def start_server(args: argparse.Namespace, env: Dict[str, str]) -> subprocess.Popen:
+    command = [
+        sys.executable, "-m", "uvicorn", "benchmarks.bench_app:app",
+        "--host", "127.0.0.1", "--port", str(args.port),
+        "--workers", str(args.workers), "--log-level", "warning",
+    ]
+    process = subprocess.Popen(command, env=env, cwd=REPO_ROOT)
+    deadline = time.monotonic() + args.startup_timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited during startup with code {process.returncode}")
+        try:
+            # Ready means the search index has loaded, so no measured request sees a cold start.
+            if requests.get(f"http://127.0.0.1:{args.port}/health/ready", timeout=1).status_code == 200:
+                return process
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"Server did not become ready within {args.startup_timeout}s")
+
+
+class Client:
+    """One load-generating thread; keeps its own HTTP session and latency samples."""
+
+    def __init__(self, base_url: str, api_prefix: str, worker_id: int, args: argparse.Namespace, book_ids: List[int]):
+        self.base = base_url.rstrip("/") + api_prefix
+        self.rng = random.Random(args.seed * 1000 + worker_id)
+        self.session = requests.Session()
+        self.book_ids = book_ids
+        librarians = max(1, args.users // 10)
+        self.customer_token = bench_token(self.rng.randrange(librarians, max(librarians + 1, args.users)))
+        self.librarian_token = bench_token(self.rng.randrange(0, librarians))
+        self.measure_from = 0.0
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Counter] = defaultdict(Counter)
+
+    def call(self, name: str, method: str, path: str, token: Optional[str] = None, **kwargs) -> Optional[int]:
+        headers = {"Authorization": f"Bearer {token or self.customer_token}"}
+        start = time.perf_counter()
+        try:
+            status = self.session.request(method, self.base + path, headers=headers, timeout=60, **kwargs).status_code
+        except requests.RequestException:
+            status = None
+        if start >= self.measure_from:
+            self.latencies[name].append((time.perf_counter() - start) * 1000.0)
+            self.statuses[name][str(status) if status is not None else "error"] += 1
+        return status
+
+    def random_book(self) -> int:
+        return self.rng.choice(self.book_ids)
+
+
+def op_list(client: Client) -> None:
+    skip = client.rng.randrange(0, max(1, len(client.book_ids) - 20))
+    client.call("list", "GET", "/books/", params={"skip": skip, "limit": 20})
+
+
+def op_detail(client: Client) -> None:
+    client.call("detail", "GET", f"/books/{client.random_book()}")
+
+
+def op_keyword_search(client: Client) -> None:
+    client.call("keyword_search", "GET", f"/books/search/{quote(client.rng.choice(WORDS))}", params={"limit": 20})
+
+
+def op_semantic_search(client: Client) -> None:
+    client.call("semantic_search", "GET", f"/search/semantic/{quote(_phrase(client.rng, 3))}", params={"k": 5})
+
+
+def op_semantic_batch(client: Client) -> None:
+    queries = [_phrase(client.rng, 3) for _ in range(20)]
+    client.call("semantic_batch", "POST", "/search/semantic/batch", json={"queries": queries, "k": 5})
+
+
+def op_checkout_checkin(client: Client) -> None:
+    book_id = client.random_book()
+    due_date = (datetime.utcnow() + timedelta(days=14)).isoformat()
+    if client.call("checkout", "POST", f"/books/{book_id}/checkout", json={"due_date": due_date}) == 200:
+        client.call("checkin", "POST", f"/books/{book_id}/checkin")
+
+
+def op_write(client: Client) -> None:
+    client.call(
+        "write", "PUT", f"/books/{client.random_book()}",
+        token=client.librarian_token, json={"description": _phrase(client.rng, 25)},
+    )
+
+
+OPERATIONS: Dict[str, Callable[[Client], None]] = {
+    "list": op_list,
+    "detail": op_detail,
+    "keyword_search": op_keyword_search,
+    "semantic_search": op_semantic_search,
+    "semantic_batch": op_semantic_batch,
+    "checkout_checkin": op_checkout_checkin,
+    "write": op_write,
+}
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise SystemExit(f"Unknown operation '{name}'; choose from {', '.join(OPERATIONS)}")
+        weights[name] = float(weight or 1)
+    return {name: weight for name, weight in weights.items() if weight > 0}
+
+
+def run_workload(args: argparse.Namespace, base_url: str, book_ids: List[int]) -> Dict:
+    weights = parse_mix(args.mix)
+    names, values = list(weights), list(weights.values())
+    clients = [Client(base_url, args.api_prefix, i, args, book_ids) for i in range(args.concurrency)]
+
+    start = time.perf_counter()
+    measure_from = start + args.warmup
+    stop_at = measure_from + args.duration
+    for client in clients:
+        client.measure_from = measure_from
+
+    def worker(client: Client) -> None:
+        while time.perf_counter() < stop_at:
+            OPERATIONS[client.rng.choices(names, values)[0]](client)
+
+    threads = [threading.Thread(target=worker, args=(client,), daemon=True) for client in clients]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = max(time.perf_counter() - measure_from, 1e-9)
+
+    endpoints = {}
+    total_requests = total_errors = 0
+    for name in sorted({name for client in clients for name in client.latencies}):
+        latencies = [value for client in clients for value in client.latencies[name]]
+        statuses = Counter()
+        for client in clients:
+            statuses.update(client.statuses[name])
+        errors = sum(count for status, count in statuses.items() if status == "error" or status.startswith("5"))
+        total_requests += len(latencies)
+        total_errors += errors
+        endpoints[name] = {
+            "requests": len(latencies),
+            "errors": errors,
+            "throughput_rps": round(len(latencies) / elapsed, 2),
+            "status_codes": dict(statuses),
+            "latency_ms": summarize_latencies(latencies),
+        }
+    return {
+        "measured_seconds": round(elapsed, 3),
+        "overall": {
+            "requests": total_requests,
+            "errors": total_errors,
+            "throughput_rps": round(total_requests / elapsed, 2),
+            "latency_ms": summarize_latencies(
+                [value for client in clients for values in client.latencies.values() for value in values]
+            ),
+        },
+        "endpoints": endpoints,
+    }
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default="sqlite:///./bench.db",
+                        help="SQLite or Postgres URL (default: %(default)s)")
+    parser.add_argument("--books", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--reset", action="store_true", help="Drop and recreate tables before seeding")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent client threads")
+    parser.add_argument("--duration", type=float, default=30.0, help="Measured seconds")
+    parser.add_argument("--warmup", type=float, default=5.0, help="Unmeasured seconds before measuring")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Weighted operations, e.g. %(default)s")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--base-url", help="Drive an already running server instead of starting one")
+    parser.add_argument("--api-prefix", default="/api/v1")
+    parser.add_argument("--embedding-dim", type=int, default=1536)
+    parser.add_argument("--embedding-latency-ms", type=float, default=0.0,
+                        help="Simulated embedding provider round trip")
+    parser.add_argument("--startup-timeout", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    parser.add_argument("--compare", help="Baseline JSON report to compare against")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = build_parser().parse_args(argv)
+    env = configure_environment(args)
+    book_ids = seed_database(args)
+
+    server = None
+    base_url = args.base_url
+    if not base_url:
+        server = start_server(args, env)
+        base_url = f"http://127.0.0.1:{args.port}"
+    try:
+        results = run_workload(args, base_url, book_ids)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+
+    config = {key: value for key, value in vars(args).items() if key not in ("output", "compare")}
+    report = {**run_metadata("load_test", config), **results}
+    write_report(report, args.output)
+
+    if args.compare:
+        baseline = load_report(args.compare)
+        rows = {name: {"rps": e["throughput_rps"], **e["latency_ms"]} for name, e in report["endpoints"].items()}
+        baseline_rows = {name: {"rps": e["throughput_rps"], **e["latency_ms"]} for name, e in baseline["endpoints"].items()}
+        print_comparison(rows, baseline_rows, ("rps", "p50", "p95", "p99"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Per-request cost of application logging, before and after the queue-based pipeline.
+
+Each mode runs in a fresh process. Worker threads replay the log calls that an
+authenticated request makes in `deps.get_current_user_model`, and the benchmark
+reports the time each simulated request spends inside logging calls:
+
+  * `basic`: the old setup. `logging.basicConfig` at INFO, five f-string INFO
+    lines per request, written synchronously by the request thread.
+  * `queue_same_lines`: the same five lines at INFO, %-formatted and handed to
+    the `QueueHandler`/`QueueListener` pipeline. This isolates the pipeline itself.
+  * `queue`: the current call sites, one DEBUG line per request, which is dropped
+    before formatting at INFO.
+
+`--sink-delay-ms` makes every write to the log sink sleep, standing in for a slow
+disk or a blocked stdout pipe. That is where writing off the request thread pays.
+
+    python -m benchmarks.logging_overhead --requests 20000 --threads 8 --sink-delay-ms 0.2 --output bench_results/logging.json
+"""
+import argparse
+import io
+import logging
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Any, Dict, List, Optional
+
+from benchmarks.report import load_report, print_comparison, run_metadata, summarize_latencies, write_report
+
+MODES = ("basic", "queue_same_lines", "queue")
+
+
+class SlowSink(io.TextIOBase):
+    """Discards output, sleeping `delay` seconds per write."""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.writes = 0
+
+    def write(self, text: str) -> int:
+        self.writes += 1
+        if self.delay:
+            time.sleep(self.delay)
+        return len(text)
+
+    def flush(self) -> None:
+        pass
+
+
+def _basic_request(logger: logging.Logger, user_index: int) -> None:
+    email = f"user{user_index}@example.com"
+    google_id = f"google-{user_index}"
+    logger.info("Starting user authentication process")
+    logger.info("Attempting to verify Google token")
+    logger.info(f"Successfully verified Google token for email: {email}")
+    logger.info(f"Looking up user with Google ID: {google_id}")
+    logger.info(f"Found existing user with ID: {user_index}")
+
+
+def _queue_same_lines_request(logger: logging.Logger, user_index: int) -> None:
+    email = f"user{user_index}@example.com"
+    google_id = f"google-{user_index}"
+    logger.info("Starting user authentication process")
+    logger.info("Attempting to verify Google token")
+    logger.info("Successfully verified Google token for email: %s", email)
+    logger.info("Looking up user with Google ID: %s", google_id)
+    logger.info("Found existing user with ID: %s", user_index)
+
+
+def _queue_request(logger: logging.Logger, user_index: int) -> None:
+    logger.debug("Authenticated user ID %s", user_index)
+
+
+REQUESTS = {"basic": _basic_request, "queue_same_lines": _queue_same_lines_request, "queue": _queue_request}
+
+
+def run_mode(case: Dict[str, Any]) -> Dict[str, Any]:
+    from app.core import logging_config
+    from app.core.request_context import reset_request_context, start_request_context
+
+    mode = case["mode"]
+    sink = SlowSink(case["sink_delay_ms"] / 1000.0)
+    if mode == "basic":
+        logging.basicConfig(level=logging.INFO, stream=sink)
+    else:
+        logging_config.configure_logging("INFO", "json", stream=sink)
+    logger = logging.getLogger("app.api.deps")
+    emit = REQUESTS[mode]
+
+    per_thread = case["requests"] // case["threads"]
+    latencies: List[List[float]] = [[] for _ in range(case["threads"])]
+
+    def worker(slot: int) -> None:
+        for i in range(per_thread):
+            token = start_request_context(f"bench-{slot}-{i}")
+            start = time.perf_counter()
+            emit(logger, slot * per_thread + i)
+            latencies[slot].append((time.perf_counter() - start) * 1e6)
+            reset_request_context(token)
+
+    threads = [threading.Thread(target=worker, args=(slot,)) for slot in range(case["threads"])]
+    wall_start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - wall_start
+    flush_start = time.perf_counter()
+    logging_config.shutdown_logging()
+    flush = time.perf_counter() - flush_start
+
+    return {
+        "mode": mode,
+        "requests": per_thread * case["threads"],
+        "lines_written": sink.writes,
+        "request_wall_s": round(wall, 3),
+        # Time the writer thread needed after the last request to drain the queue.
+        "drain_s": round(flush, 3),
+        "logging_us_per_request": summarize_latencies([value for values in latencies for value in values]),
+    }
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--threads", type=int, default=8, help="concurrent request threads (the app's threadpool)")
+    parser.add_argument("--sink-delay-ms", type=float, default=0.0, help="sleep per write to the log sink")
+    parser.add_argument("--modes", default=",".join(MODES))
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--compare", help="baseline report to diff against")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = build_parser().parse_args(argv)
+    modes = [mode.strip() for mode in args.modes.split(",")]
+    for mode in modes:
+        if mode not in MODES:
+            raise SystemExit(f"Unknown mode '{mode}'")
+
+    results = []
+    for mode in modes:
+        case = {"mode": mode, "requests": args.requests, "threads": args.threads, "sink_delay_ms": args.sink_delay_ms}
+        sys.stderr.write(f"Running {mode}...\n")
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+            results.append(pool.submit(run_mode, case).result())
+
+    config = {key: value for key, value in vars(args).items() if key not in ("output", "compare")}
+    write_report({**run_metadata("logging_overhead", config), "cases": results}, args.output)
+
+    if args.compare:
+        baseline = load_report(args.compare)
+        rows = {r["mode"]: _flatten(r) for r in results}
+        baseline_rows = {r["mode"]: _flatten(r) for r in baseline["cases"]}
+        print_comparison(rows, baseline_rows, ("p50_us", "p99_us", "mean_us", "request_wall_s"))
+
+
+def _flatten(result: Dict[str, Any]) -> Dict[str, float]:
+    latency = result["logging_us_per_request"]
+    return {
+        "p50_us": latency["p50"], "p99_us": latency["p99"], "mean_us": latency["mean"],
+        "request_wall_s": result["request_wall_s"],
+    }
+
+
+if __name__ == "__main__":
+    main()
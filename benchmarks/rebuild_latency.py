@@ -0,0 +1,151 @@
+"""
+Request latency while the search index is being rebuilt, with and without
+out-of-process builds (`SEARCH_BUILD_OUT_OF_PROCESS`).
+
+For each mode the real app is started, read traffic is driven once with the
+index quiet and once while a librarian keeps updating books so rebuilds run
+back to back, and p50/p95/p99 latency of both phases is reported alongside
+the number of rebuilds that completed.
+
+    python -m benchmarks.rebuild_latency --books 20000 --duration 30 --output bench_results/rebuild.json
+
+Large catalogs make the difference visible: a build must take noticeably longer
+than a request for the in-process mode to show stalls.
+"""
+import argparse
+import re
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+import requests
+
+from benchmarks.load_test import Client, configure_environment, run_workload, seed_database, start_server
+from benchmarks.report import load_report, print_comparison, run_metadata, write_report
+
+MODES = {"inline": "false", "process": "true"}
+
+_METRIC_RE = re.compile(r'^(search_index_rebuilds_total\{outcome="built"\}|search_index_rebuild_duration_seconds_sum) (\S+)$')
+
+
+def rebuild_stats(base_url: str) -> Dict[str, float]:
+    stats = {"rebuilds": 0.0, "rebuild_seconds": 0.0}
+    try:
+        text = requests.get(f"{base_url}/metrics", timeout=10).text
+    except requests.RequestException:
+        return stats
+    for line in text.splitlines():
+        match = _METRIC_RE.match(line)
+        if match:
+            key = "rebuilds" if match.group(1).startswith("search_index_rebuilds_total") else "rebuild_seconds"
+            stats[key] = float(match.group(2))
+    return stats
+
+
+def trigger_rebuilds(client: Client, interval: float, stop: threading.Event) -> None:
+    """Update a book every `interval` seconds; each update schedules a rebuild."""
+    while not stop.is_set():
+        client.call(
+            "trigger", "PUT", f"/books/{client.random_book()}",
+            token=client.librarian_token, json={"description": f"rebuild trigger {time.time()}"},
+        )
+        stop.wait(interval)
+
+
+def run_mode(args: argparse.Namespace, mode: str, book_ids: List[int]) -> Dict:
+    env = configure_environment(args)
+    env["SEARCH_BUILD_OUT_OF_PROCESS"] = MODES[mode]
+    env["SEARCH_REBUILD_DEBOUNCE_SECONDS"] = "0"
+    base_url = f"http://127.0.0.1:{args.port}"
+    server = start_server(args, env)
+    try:
+        quiet = run_workload(args, base_url, book_ids)
+
+        before = rebuild_stats(base_url)
+        stop = threading.Event()
+        trigger = Client(base_url, args.api_prefix, args.concurrency, args, book_ids)
+        thread = threading.Thread(target=trigger_rebuilds, args=(trigger, args.rebuild_interval, stop), daemon=True)
+        thread.start()
+        try:
+            rebuilding = run_workload(args, base_url, book_ids)
+        finally:
+            stop.set()
+            thread.join()
+        after = rebuild_stats(base_url)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    rebuilds = after["rebuilds"] - before["rebuilds"]
+    return {
+        "mode": mode,
+        "quiet": quiet["overall"],
+        "rebuilding": rebuilding["overall"],
+        "rebuilds_completed": int(rebuilds),
+        "mean_rebuild_seconds": round((after["rebuild_seconds"] - before["rebuild_seconds"]) / rebuilds, 3) if rebuilds else None,
+    }
+
+
+def _flatten(result: Dict) -> Dict[str, float]:
+    return {
+        "quiet_p50": result["quiet"]["latency_ms"]["p50"],
+        "quiet_p99": result["quiet"]["latency_ms"]["p99"],
+        "rebuild_p50": result["rebuilding"]["latency_ms"]["p50"],
+        "rebuild_p99": result["rebuilding"]["latency_ms"]["p99"],
+        "rebuild_rps": result["rebuilding"]["throughput_rps"],
+    }
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default="sqlite:///./bench.db",
+                        help="SQLite or Postgres URL (default: %(default)s)")
+    parser.add_argument("--books", type=int, default=20000)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--reset", action="store_true", help="Drop and recreate tables before seeding")
+    parser.add_argument("--modes", default=",".join(MODES), help=f"Any of: {', '.join(MODES)}")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent reader threads")
+    parser.add_argument("--duration", type=float, default=30.0, help="Measured seconds per phase")
+    parser.add_argument("--warmup", type=float, default=2.0, help="Unmeasured seconds before each phase")
+    parser.add_argument("--rebuild-interval", type=float, default=1.0, help="Seconds between rebuild-triggering writes")
+    parser.add_argument("--mix", default="list=1,detail=1", help="Reader operations, as in load_test")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--api-prefix", default="/api/v1")
+    parser.add_argument("--embedding-dim", type=int, default=1536)
+    parser.add_argument("--embedding-latency-ms", type=float, default=0.0)
+    parser.add_argument("--startup-timeout", type=float, default=300.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    parser.add_argument("--compare", help="Baseline JSON report to compare against")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = build_parser().parse_args(argv)
+    modes = [mode.strip() for mode in args.modes.split(",")]
+    for mode in modes:
+        if mode not in MODES:
+            raise SystemExit(f"Unknown mode '{mode}'")
+    configure_environment(args)
+    book_ids = seed_database(args)
+
+    results = []
+    for mode in modes:
+        sys.stderr.write(f"Running {mode} builds...\n")
+        results.append(run_mode(args, mode, book_ids))
+
+    config = {key: value for key, value in vars(args).items() if key not in ("output", "compare")}
+    report = {**run_metadata("rebuild_latency", config), "modes": results}
+    write_report(report, args.output)
+
+    if args.compare:
+        baseline = load_report(args.compare)
+        rows = {r["mode"]: _flatten(r) for r in results}
+        baseline_rows = {r["mode"]: _flatten(r) for r in baseline["modes"]}
+        print_comparison(rows, baseline_rows, ("quiet_p50", "quiet_p99", "rebuild_p50", "rebuild_p99", "rebuild_rps"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Shared helpers for benchmark scripts: percentiles, run metadata and JSON reports
+that can be diffed against a stored baseline.
+"""
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(sorted_values: Sequence[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted sequence."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100.0 * len(sorted_values)))
+    return float(sorted_values[rank - 1])
+
+
+def summarize_latencies(latencies_ms: List[float]) -> Dict[str, float]:
+    values = sorted(latencies_ms)
+    if not values:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "mean": 0.0, "max": 0.0}
+    return {
+        "p50": round(percentile(values, 50), 3),
+        "p95": round(percentile(values, 95), 3),
+        "p99": round(percentile(values, 99), 3),
+        "mean": round(sum(values) / len(values), 3),
+        "max": round(values[-1], 3),
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_metadata(benchmark: str, config: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "benchmark": benchmark,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_commit": git_commit(),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "config": config,
+    }
+
+
+def write_report(report: Dict[str, Any], output: Optional[str]) -> None:
+    text = json.dumps(report, indent=2, sort_keys=True, default=str)
+    if output:
+        directory = os.path.dirname(output)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(output, "w") as fh:
+            fh.write(text + "\n")
+    else:
+        sys.stdout.write(text + "\n")
+
+
+def load_report(path: str) -> Dict[str, Any]:
+    with open(path) as fh:
+        return json.load(fh)
+
+
+def print_comparison(
+    rows: Dict[str, Dict[str, float]], baseline_rows: Dict[str, Dict[str, float]], metrics: Sequence[str]
+) -> None:
+    """Print `metric: baseline -> current (+x%)` for every row present in both reports."""
+    for name in sorted(rows):
+        if name not in baseline_rows:
+            continue
+        parts = []
+        for metric in metrics:
+            current, previous = rows[name].get(metric), baseline_rows[name].get(metric)
+            if current is None or previous is None:
+                continue
+            change = ((current - previous) / previous * 100.0) if previous else 0.0
+            parts.append(f"{metric} {previous:.2f} -> {current:.2f} ({change:+.1f}%)")
+        if parts:
+            sys.stderr.write(f"{name:24s} " + "; ".join(parts) + "\n")
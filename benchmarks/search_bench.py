@@ -0,0 +1,304 @@
+"""
+Micro-benchmarks for `SearchService` index builds and queries at catalog scale.
+
+For every combination of catalog size, FAISS index type and embedding storage
+format, a fresh process:
+
+  * builds the index with `SearchService.build_index` from a cached synthetic
+    SQLite catalog and records build time and peak RSS,
+  * measures single-query search latency and batched multi-query throughput,
+  * measures hydration cost (`SearchService.hydrate`) for k hits,
+  * for approximate or compressed indexes (SQ8, SQfp16, PQ<m>, ...), measures
+    recall@k against exact search, with and without re-ranking k * factor
+    candidates against the stored full-precision embeddings (`--rerank-factors`).
+
+    python -m benchmarks.search_bench --sizes 10000,100000,1000000 --output bench_results/search.json
+    python -m benchmarks.search_bench --sizes 100000 --index-types Flat,HNSW32 \\
+        --storage-formats json,base64 --compare bench_results/search.json
+    python -m benchmarks.search_bench --sizes 100000 --index-types Flat,SQfp16,SQ8,PQ96,PQ48 --rerank-factors 4,10
+
+Catalogs are generated once per (size, dimension, format) under `--data-dir`.
+At 1536 dimensions a 1M-book JSON catalog is roughly 30 GB on disk; `base64`
+(raw float32) is about 8 GB.
+"""
+import argparse
+import base64
+import json
+import os
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from benchmarks.fakes import apply_default_env
+from benchmarks.report import load_report, print_comparison, run_metadata, summarize_latencies, write_report
+
+
+def encode_json(vector: np.ndarray) -> str:
+    return json.dumps([round(float(v), 7) for v in vector])
+
+
+def encode_base64(vector: np.ndarray) -> str:
+    return base64.b64encode(vector.astype("<f4").tobytes()).decode("ascii")
+
+
+def decode_base64(stored_embedding: str) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(stored_embedding), dtype="<f4")
+
+
+def _json_decoder() -> Callable[[str], Any]:
+    from app.services.search_service import decode_json_embedding
+    return decode_json_embedding
+
+
+# name -> (encoder used when generating the catalog, factory for the SearchService decoder)
+STORAGE_FORMATS: Dict[str, Tuple[Callable[[np.ndarray], str], Callable[[], Callable[[str], Any]]]] = {
+    "json": (encode_json, _json_decoder),
+    "base64": (encode_base64, lambda: decode_base64),
+}
+
+
+def synthetic_vectors(rng: np.random.Generator, count: int, dimension: int, centers: np.ndarray) -> np.ndarray:
+    """Unit vectors scattered around a fixed set of cluster centres, like real topic embeddings."""
+    assignments = rng.integers(0, len(centers), size=count)
+    vectors = centers[assignments] + 0.35 * rng.standard_normal((count, dimension)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors.astype(np.float32)
+
+
+def cluster_centers(dimension: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return rng.standard_normal((256, dimension)).astype(np.float32)
+
+
+def catalog_path(data_dir: str, size: int, dimension: int, storage_format: str) -> str:
+    # "_models": catalogs generated before vectors recorded their model are not reused.
+    return os.path.join(data_dir, f"catalog_{size}_{dimension}_{storage_format}_models.db")
+
+
+def ensure_catalog(path: str, size: int, dimension: int, storage_format: str, seed: int) -> None:
+    if os.path.exists(path):
+        return
+    from sqlalchemy import create_engine, insert
+
+    from app.core.config import settings
+    from app.db.base import Base
+    from app.db.models import Book
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    partial = path + ".partial"
+    if os.path.exists(partial):
+        os.remove(partial)
+    engine = create_engine(f"sqlite:///{partial}")
+    Base.metadata.create_all(engine)
+    encode = STORAGE_FORMATS[storage_format][0]
+    rng = np.random.default_rng(seed)
+    centers = cluster_centers(dimension, seed)
+    sys.stderr.write(f"Generating {size} books ({dimension}-d, {storage_format}) in {path}...\n")
+    with engine.begin() as conn:
+        for offset in range(0, size, 5000):
+            count = min(5000, size - offset)
+            vectors = synthetic_vectors(rng, count, dimension, centers)
+            conn.execute(insert(Book), [
+                {
+                    "title": f"Synthetic Book {offset + i}",
+                    "author": f"Author {(offset + i) % 997}",
+                    "isbn": f"{offset + i:013d}",
+                    "publication_year": 1900 + (offset + i) % 125,
+                    "publisher": f"Publisher {(offset + i) % 53}",
+                    "is_available": True,
+                    "embedding": encode(vectors[i]),
+                    "embedding_model": settings.EMBEDDING_MODEL,
+                    "embedding_dimension": dimension,
+                }
+                for i in range(count)
+            ])
+    engine.dispose()
+    os.replace(partial, path)
+
+
+def _peak_rss_bytes() -> int:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _current_rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return _peak_rss_bytes()
+
+
+def run_case(case: Dict[str, Any]) -> Dict[str, Any]:
+    """Runs in a fresh process so peak RSS belongs to this case alone."""
+    apply_default_env(f"sqlite:///{case['catalog']}")
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session
+
+    from app.services.search_service import SearchService
+
+    engine = create_engine(f"sqlite:///{case['catalog']}")
+    service = SearchService(
+        index_factory=case["index_type"],
+        embedding_decoder=STORAGE_FORMATS[case["storage_format"]][1](),
+    )
+    k = case["k"]
+    rss_before = _current_rss_bytes()
+
+    with Session(engine) as db:
+        start = time.perf_counter()
+        service.build_index(db)
+        build_seconds = time.perf_counter() - start
+        peak_rss = _peak_rss_bytes()
+        rss_after = _current_rss_bytes()
+        if not service.is_built:
+            return {**case, "error": "index was not built"}
+
+        rng = np.random.default_rng(case["seed"] + 1)
+        queries = synthetic_vectors(rng, case["queries"], service.dimension, cluster_centers(service.dimension, case["seed"]))
+
+        single = []
+        for query in queries[: case["single_queries"]]:
+            start = time.perf_counter()
+            service.index.search(query.reshape(1, -1), k)
+            single.append((time.perf_counter() - start) * 1000.0)
+
+        start = time.perf_counter()
+        service.index.search(queries, k)
+        batch_seconds = time.perf_counter() - start
+
+        hydration = []
+        for query in queries[: case["hydration_queries"]]:
+            distances, faiss_indices = service.index.search(query.reshape(1, -1), k)
+            db.expunge_all()
+            start = time.perf_counter()
+            service.hydrate(db, faiss_indices[0], distances[0])
+            hydration.append((time.perf_counter() - start) * 1000.0)
+
+        recall = None
+        rerank = {}
+        if case["index_type"] != "Flat":
+            from app.crud.crud_book import book as crud_book
+
+            # Exact ground truth; positions line up because both indexes are in book id order.
+            exact = SearchService("Flat", service.embedding_decoder).build_from_rows(crud_book.get_stored_embeddings(db))
+            recall_queries = queries[: case["recall_queries"]]
+            truth = exact.index.search(recall_queries, k)[1]
+            del exact
+            recall = _recall(service.index.search(recall_queries, k)[1], truth)
+            for factor in case["rerank_factors"]:
+                timings, found = [], []
+                for query in recall_queries:
+                    query = query.reshape(1, -1)
+                    start = time.perf_counter()
+                    candidates = service.index.search(query, min(k * factor, service.index.ntotal))[1]
+                    found.append(service.rerank(db, query, candidates, service.snapshot, k)[1][0])
+                    timings.append((time.perf_counter() - start) * 1000.0)
+                rerank[str(factor)] = {"recall_at_k": _recall(np.array(found), truth), "query_ms": summarize_latencies(timings)}
+
+    ntotal = service.index.ntotal
+    return {
+        **{key: case[key] for key in ("size", "index_type", "storage_format", "dimension", "k")},
+        "index_vectors": ntotal,
+        "build_seconds": round(build_seconds, 4),
+        "peak_rss_mb": round(peak_rss / 2**20, 1),
+        "rss_before_build_mb": round(rss_before / 2**20, 1),
+        "rss_after_build_mb": round(rss_after / 2**20, 1),
+        "index_bytes_per_vector": getattr(service.index, "code_size", service.dimension * 4),
+        "single_query_ms": summarize_latencies(single),
+        "batch_queries": len(queries),
+        "batch_queries_per_second": round(len(queries) / max(batch_seconds, 1e-9), 1),
+        "hydration_ms": summarize_latencies(hydration),
+        "recall_at_k": recall,
+        "rerank": rerank,
+    }
+
+
+def _recall(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(row[row >= 0]) & set(expected[expected >= 0])) for row, expected in zip(found, truth))
+    return round(hits / max(truth.size, 1), 4)
+
+
+def _flatten(result: Dict[str, Any]) -> Dict[str, float]:
+    return {
+        "build_s": result["build_seconds"],
+        "bytes_per_vec": result["index_bytes_per_vector"],
+        "recall": 1.0 if result.get("recall_at_k") is None else result["recall_at_k"],
+        "peak_rss_mb": result["peak_rss_mb"],
+        "query_p50_ms": result["single_query_ms"]["p50"],
+        "query_p99_ms": result["single_query_ms"]["p99"],
+        "batch_qps": result["batch_queries_per_second"],
+        "hydrate_p50_ms": result["hydration_ms"]["p50"],
+    }
+
+
+def _case_name(result: Dict[str, Any]) -> str:
+    return f"{result['size']}/{result['index_type']}/{result['storage_format']}"
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="Comma-separated catalog sizes")
+    parser.add_argument("--dimension", type=int, default=1536)
+    parser.add_argument("--index-types", default="Flat", help="Comma-separated faiss.index_factory strings")
+    parser.add_argument("--storage-formats", default="json", help=f"Any of: {', '.join(STORAGE_FORMATS)}")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=1000, help="Queries in the batched throughput run")
+    parser.add_argument("--single-queries", type=int, default=200, help="Queries timed one at a time")
+    parser.add_argument("--hydration-queries", type=int, default=50)
+    parser.add_argument("--recall-queries", type=int, default=200, help="Queries used to measure recall@k")
+    parser.add_argument("--rerank-factors", default="", help="Comma-separated candidate multipliers to re-rank, e.g. 4,10")
+    parser.add_argument("--data-dir", default="bench_results/catalogs")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    parser.add_argument("--compare", help="Baseline JSON report to compare against")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = build_parser().parse_args(argv)
+    apply_default_env("sqlite://")
+    sizes = [int(size) for size in args.sizes.split(",")]
+    index_types = [name.strip() for name in args.index_types.split(",")]
+    storage_formats = [name.strip() for name in args.storage_formats.split(",")]
+    rerank_factors = [int(factor) for factor in args.rerank_factors.split(",") if factor.strip()]
+    for storage_format in storage_formats:
+        if storage_format not in STORAGE_FORMATS:
+            raise SystemExit(f"Unknown storage format '{storage_format}'")
+
+    results = []
+    for size in sizes:
+        for storage_format in storage_formats:
+            catalog = catalog_path(args.data_dir, size, args.dimension, storage_format)
+            ensure_catalog(catalog, size, args.dimension, storage_format, args.seed)
+            for index_type in index_types:
+                case = {
+                    "catalog": catalog, "size": size, "dimension": args.dimension,
+                    "index_type": index_type, "storage_format": storage_format, "k": args.k,
+                    "queries": args.queries, "single_queries": args.single_queries,
+                    "hydration_queries": args.hydration_queries, "seed": args.seed,
+                    "recall_queries": args.recall_queries, "rerank_factors": rerank_factors,
+                }
+                sys.stderr.write(f"Running {size}/{index_type}/{storage_format}...\n")
+                with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+                    results.append(pool.submit(run_case, case).result())
+
+    config = {key: value for key, value in vars(args).items() if key not in ("output", "compare")}
+    report = {**run_metadata("search_bench", config), "cases": results}
+    write_report(report, args.output)
+
+    if args.compare:
+        baseline = load_report(args.compare)
+        rows = {_case_name(r): _flatten(r) for r in results if "error" not in r}
+        baseline_rows = {_case_name(r): _flatten(r) for r in baseline["cases"] if "error" not in r}
+        print_comparison(rows, baseline_rows, ("build_s", "bytes_per_vec", "recall", "peak_rss_mb", "query_p50_ms", "query_p99_ms", "batch_qps", "hydrate_p50_ms"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Scaling of the sharded semantic search index over shard and thread counts.
+
+Each (shards, threads) case runs in a fresh process on the same synthetic
+vectors, held in memory so the numbers are FAISS and fan-out cost alone, and
+records:
+
+  * full build time (shards are trained and filled on the query thread pool),
+  * the time to rebuild one shard after a write (decode its rows, build, swap),
+  * single-query latency, where the fan-out over shards is the only parallelism,
+  * batched throughput,
+  * recall@k against one unsharded index of the same type (1.0 for Flat).
+
+FAISS's own OpenMP threads are limited to `--omp-threads` (default 1) so the
+shard fan-out is what is measured. `--pin` restricts each case to as many CPUs
+as it has query threads, to chart scaling by core count on one machine.
+
+    python -m benchmarks.shard_bench --size 1000000 --shards 1,2,4,8 --threads 1,2,4,8 --output bench_results/shards.json
+    python -m benchmarks.shard_bench --size 1000000 --shards 8 --threads 8 --index-type SQ8 --compare bench_results/shards.json
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from benchmarks.fakes import apply_default_env
+from benchmarks.report import load_report, print_comparison, run_metadata, summarize_latencies, write_report
+from benchmarks.search_bench import cluster_centers, synthetic_vectors
+
+
+def decode_raw(stored_embedding: bytes) -> np.ndarray:
+    return np.frombuffer(stored_embedding, dtype=np.float32)
+
+
+def _rows(book_ids: np.ndarray, vectors: np.ndarray) -> List[Any]:
+    return [(int(book_id), vector.tobytes()) for book_id, vector in zip(book_ids, vectors)]
+
+
+def run_case(case: Dict[str, Any]) -> Dict[str, Any]:
+    apply_default_env("sqlite://")
+    import faiss
+
+    from app.services.search_service import SearchService
+    from app.services.sharded_index import set_query_threads, shard_of
+
+    if case["pin"] and hasattr(os, "sched_setaffinity"):
+        available = sorted(os.sched_getaffinity(0))
+        os.sched_setaffinity(0, available[: case["threads"]])
+    faiss.omp_set_num_threads(case["omp_threads"])
+    set_query_threads(case["threads"])
+
+    rng = np.random.default_rng(case["seed"])
+    centers = cluster_centers(case["dimension"], case["seed"])
+    vectors = synthetic_vectors(rng, case["size"], case["dimension"], centers)
+    book_ids = np.arange(1, case["size"] + 1, dtype=np.int64)
+    rows = _rows(book_ids, vectors)
+    queries = synthetic_vectors(np.random.default_rng(case["seed"] + 1), case["queries"], case["dimension"], centers)
+    k = case["k"]
+
+    service = SearchService(case["index_type"], decode_raw, shards=case["shards"])
+    start = time.perf_counter()
+    snapshot = service.build_from_rows(rows)
+    build_seconds = time.perf_counter() - start
+    index = snapshot.index
+
+    rebuild_seconds = None
+    if case["shards"] > 1:
+        in_shard = shard_of(book_ids, case["shards"]) == 0
+        shard_rows = _rows(book_ids[in_shard], vectors[in_shard])
+        start = time.perf_counter()
+        shard_ids, shard_vectors = service._decode_rows(shard_rows)
+        index.with_shards({0: (service._new_index(shard_vectors), shard_ids)})
+        rebuild_seconds = time.perf_counter() - start
+    del rows
+
+    single = []
+    for query in queries[: case["single_queries"]]:
+        start = time.perf_counter()
+        index.search(query.reshape(1, -1), k)
+        single.append((time.perf_counter() - start) * 1000.0)
+
+    start = time.perf_counter()
+    labels = index.search(queries, k)[1]
+    batch_seconds = time.perf_counter() - start
+
+    # Ground truth from one unsharded index; positions are comparable since both are in book id order.
+    reference = SearchService(case["index_type"], decode_raw)._new_index(vectors)
+    truth = reference.search(queries, k)[1]
+    recall = sum(len(set(row[row >= 0]) & set(expected[expected >= 0])) for row, expected in zip(labels, truth))
+
+    return {
+        **{key: case[key] for key in ("size", "dimension", "index_type", "shards", "threads", "omp_threads", "k")},
+        "cpus": len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count(),
+        "build_seconds": round(build_seconds, 3),
+        "shard_rebuild_seconds": None if rebuild_seconds is None else round(rebuild_seconds, 3),
+        "single_query_ms": summarize_latencies(single),
+        "batch_queries": len(queries),
+        "batch_queries_per_second": round(len(queries) / max(batch_seconds, 1e-9), 1),
+        "recall_vs_unsharded": round(recall / max(truth.size, 1), 4),
+    }
+
+
+def _case_name(result: Dict[str, Any]) -> str:
+    return f"{result['index_type']}/s{result['shards']}/t{result['threads']}"
+
+
+def _flatten(result: Dict[str, Any]) -> Dict[str, float]:
+    return {
+        "build_s": result["build_seconds"],
+        "shard_rebuild_s": result["shard_rebuild_seconds"] or result["build_seconds"],
+        "query_p50_ms": result["single_query_ms"]["p50"],
+        "query_p99_ms": result["single_query_ms"]["p99"],
+        "batch_qps": result["batch_queries_per_second"],
+        "recall": result["recall_vs_unsharded"],
+    }
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=200000)
+    parser.add_argument("--dimension", type=int, default=1536)
+    parser.add_argument("--index-type", default="Flat", help="faiss.index_factory string used for every shard")
+    parser.add_argument("--shards", default="1,2,4,8", help="Comma-separated shard counts")
+    parser.add_argument("--threads", default="1,2,4,8", help="Comma-separated query thread counts")
+    parser.add_argument("--omp-threads", type=int, default=1, help="FAISS OpenMP threads inside each shard search")
+    parser.add_argument("--pin", action="store_true", help="limit each case to as many CPUs as query threads")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=1000, help="Queries in the batched throughput run")
+    parser.add_argument("--single-queries", type=int, default=200, help="Queries timed one at a time")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    parser.add_argument("--compare", help="Baseline JSON report to compare against")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = build_parser().parse_args(argv)
+    shard_counts = [int(value) for value in args.shards.split(",")]
+    thread_counts = [int(value) for value in args.threads.split(",")]
+
+    results = []
+    for shards in shard_counts:
+        for threads in thread_counts:
+            case = {
+                "size": args.size, "dimension": args.dimension, "index_type": args.index_type,
+                "shards": shards, "threads": threads, "omp_threads": args.omp_threads, "pin": args.pin,
+                "k": args.k, "queries": args.queries, "single_queries": args.single_queries, "seed": args.seed,
+            }
+            sys.stderr.write(f"Running {args.index_type} with {shards} shard(s) on {threads} thread(s)...\n")
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+                results.append(pool.submit(run_case, case).result())
+
+    config = {key: value for key, value in vars(args).items() if key not in ("output", "compare")}
+    write_report({**run_metadata("shard_bench", config), "cases": results}, args.output)
+
+    if args.compare:
+        baseline = load_report(args.compare)
+        rows = {_case_name(r): _flatten(r) for r in results}
+        baseline_rows = {_case_name(r): _flatten(r) for r in baseline["cases"]}
+        print_comparison(rows, baseline_rows, ("build_s", "shard_rebuild_s", "query_p50_ms", "query_p99_ms", "batch_qps", "recall"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Test fixtures: the real app on a throwaway SQLite database, with the embedding
+call replaced by the benchmark fake and authentication by a fixed librarian.
+"""
+import os
+import tempfile
+
+import pytest
+
+from benchmarks.fakes import FakeEmbeddingProvider, apply_default_env
+
+apply_default_env(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.api import deps  # noqa: E402
+from app.core.roles import UserRole  # noqa: E402
+from app.crud.crud_embedding import embedding as crud_embedding  # noqa: E402
+from app.db.base import Base  # noqa: E402
+from app.db.models import Book, User  # noqa: E402
+from app.db.session import SessionLocal, engine  # noqa: E402
+from app.main import app  # noqa: E402
+from app.services.index_scheduler import index_scheduler  # noqa: E402
+from app.utils.embedding import set_embedding_provider  # noqa: E402
+
+EMBEDDING_DIMENSION = 8
+
+
+@pytest.fixture(scope="session")
+def librarian() -> User:
+    Base.metadata.create_all(engine)
+    with SessionLocal() as db:
+        user = User(email="librarian@example.com", google_id="test-librarian", role=UserRole.LIBRARIAN, is_active=True)
+        db.add(user)
+        db.commit()
+        db.refresh(user)
+        db.expunge(user)
+    yield user
+    Base.metadata.drop_all(engine)
+
+
+@pytest.fixture
+def client(librarian: User, monkeypatch) -> TestClient:
+    set_embedding_provider(FakeEmbeddingProvider(dimension=EMBEDDING_DIMENSION))
+    # Background index rebuilds would run statements while a test counts queries.
+    monkeypatch.setattr(index_scheduler, "request_rebuild", lambda *args, **kwargs: None)
+    # Each write then pays the active embedding model lookup once, so counts do not depend on timing.
+    crud_embedding._active_cache.clear()
+    app.dependency_overrides[deps.get_current_active_user] = lambda: librarian
+    app.dependency_overrides[deps.get_current_active_librarian_or_superuser] = lambda: librarian
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+
+
+@pytest.fixture
+def book_id(librarian: User) -> int:
+    with SessionLocal() as db:
+        book = Book(title="Dune", author="Frank Herbert", isbn=f"isbn-{os.urandom(4).hex()}", is_available=True)
+        db.add(book)
+        db.commit()
+        return book.id
@@ -0,0 +1,59 @@
+"""
+Statement counts of the book write endpoints.
+
+Delete is a single statement, and so is an update that leaves the embedded
+text alone. Create is the INSERT ... RETURNING plus a lookup of the active
+embedding model, which the fixtures make uncached so the counts are exact. A
+write to a book's title, author or description also looks the model up: after
+the UPDATE ... RETURNING commits, the new embedding is stored with a second
+UPDATE, and the book's vectors staged for a model migration are deleted.
+"""
+from app.db.profiler import assert_max_queries
+
+BOOKS = "/api/v1/books"
+
+
+def test_create_book_is_one_insert_after_the_model_lookup(client):
+    book = {"title": "Dune", "author": "Frank Herbert", "isbn": "9780441013593", "description": "Desert planet"}
+    with assert_max_queries(2) as queries:  # active model lookup + INSERT ... RETURNING
+        response = client.post(f"{BOOKS}/", json=book)
+    assert response.status_code == 200, response.text
+    assert response.json()["title"] == "Dune"
+    assert [s.split()[0] for s in queries.statements] == ["SELECT", "INSERT"]
+
+
+def test_update_without_content_change_is_one_statement(client, book_id):
+    with assert_max_queries(1):
+        response = client.put(f"{BOOKS}/{book_id}", json={"publisher": "Chilton"})
+    assert response.status_code == 200, response.text
+    assert response.json()["publisher"] == "Chilton"
+
+
+def test_update_with_content_change_reembeds(client, book_id):
+    # UPDATE ... RETURNING, active model lookup, DELETE staged vectors, UPDATE embedding.
+    with assert_max_queries(4) as queries:
+        response = client.put(f"{BOOKS}/{book_id}", json={"title": "Dune Messiah"})
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert body["title"] == "Dune Messiah"
+    assert body["embedding"] is not None
+    assert queries.count == 4
+
+
+def test_update_missing_book_is_404_after_one_statement(client):
+    with assert_max_queries(1):
+        response = client.put(f"{BOOKS}/999999", json={"title": "Nothing"})
+    assert response.status_code == 404
+
+
+def test_delete_book_is_one_statement(client, book_id):
+    with assert_max_queries(1):
+        response = client.delete(f"{BOOKS}/{book_id}")
+    assert response.status_code == 200, response.text
+    assert response.json()["id"] == book_id
+
+
+def test_delete_missing_book_is_404_after_one_statement(client):
+    with assert_max_queries(1):
+        response = client.delete(f"{BOOKS}/999999")
+    assert response.status_code == 404
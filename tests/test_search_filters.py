@@ -0,0 +1,56 @@
+"""
+Filtered k-NN search over compressed indexes.
+"""
+import numpy as np
+import pytest
+
+from app.services import search_filters
+from app.services.search_filters import filtered_search
+
+faiss = pytest.importorskip("faiss")
+
+DIMENSION = 16
+
+
+@pytest.fixture
+def vectors() -> np.ndarray:
+    return np.random.default_rng(7).standard_normal((600, DIMENSION)).astype(np.float32)
+
+
+@pytest.mark.parametrize("factory", ["PQ4", "HNSW16"])
+def test_filtered_search_on_index_without_selector_support(factory, vectors, monkeypatch):
+    monkeypatch.setattr(search_filters, "DECODE_BLOCK", 64)  # several blocks to merge
+    index = faiss.index_factory(DIMENSION, factory)
+    index.train(vectors)
+    index.add(vectors)
+    mask = np.zeros(len(vectors), dtype=bool)
+    mask[::3] = True
+    queries = vectors[:5] + 0.01
+
+    distances, labels = filtered_search(index, queries, 10, mask)
+
+    assert labels.shape == (5, 10)
+    assert (labels >= 0).all() and mask[labels].all()
+    assert (np.diff(distances, axis=1) >= 0).all()
+    if factory.startswith("HNSW"):
+        return  # approximate if this faiss version takes the selector
+    # PQ search is exhaustive: the same ranking as exact search over the decoded masked vectors.
+    allowed = np.flatnonzero(mask)
+    stored = index.reconstruct_batch(allowed)
+    expected = np.sort(faiss.pairwise_distances(queries, stored), axis=1)[:, :10]
+    # Compared by distance: books with the same code tie, in either order.
+    np.testing.assert_allclose(distances, expected, rtol=1e-4, atol=1e-4)
+
+
+def test_filtered_search_with_fewer_matches_than_k(vectors):
+    index = faiss.index_factory(DIMENSION, "PQ4")
+    index.train(vectors)
+    index.add(vectors)
+    mask = np.zeros(len(vectors), dtype=bool)
+    mask[[3, 30, 300]] = True
+
+    distances, labels = filtered_search(index, vectors[:2], 5, mask)
+
+    assert sorted(labels[0][:3]) == [3, 30, 300]
+    assert (labels[:, 3:] == -1).all()
+    assert np.isinf(distances[:, 3:]).all()
@@ -0,0 +1,51 @@
+"""
+Rate limiting of paged semantic search: pages served from a cached cursor are
+free, anything that re-runs the search is charged.
+"""
+import os
+
+import pytest
+
+from app.api import deps
+from app.db.session import SessionLocal
+from app.services.admission import LocalRateLimitBackend, RateLimiter
+from app.services.search_service import search_service
+from app.utils.cursor import encode_cursor
+
+PAGE = "/api/v1/search/semantic/desert planet/page"
+
+
+@pytest.fixture
+def one_search_per_minute(monkeypatch) -> None:
+    monkeypatch.setattr(deps, "search_rate_limiter", RateLimiter(LocalRateLimitBackend(), {"LIBRARIAN": 1}, 1))
+
+
+@pytest.fixture
+def indexed_books(client) -> None:
+    for title in ["Dune", "Dune Messiah", "Children of Dune"]:
+        book = {"title": title, "author": "Frank Herbert", "isbn": f"isbn-{os.urandom(4).hex()}", "description": "Desert planet"}
+        assert client.post("/api/v1/books/", json=book).status_code == 200
+    with SessionLocal() as db:
+        search_service.build_index(db)
+
+
+def test_cached_cursor_is_free_and_made_up_cursor_is_charged(client, indexed_books, one_search_per_minute):
+    first = client.get(PAGE, params={"limit": 1})
+    assert first.status_code == 200, first.text
+    next_cursor = first.json()["next_cursor"]
+    assert next_cursor
+
+    # The first page took the only token; the next one is served from the cached cursor.
+    second = client.get(PAGE, params={"limit": 1, "cursor": next_cursor})
+    assert second.status_code == 200, second.text
+
+    # A cursor this worker never issued re-runs the embedding call and index search.
+    made_up = client.get(PAGE, params={"limit": 1, "cursor": encode_cursor({"id": "made-up", "offset": 1})})
+    assert made_up.status_code == 429
+    assert "Retry-After" in made_up.headers
+
+
+def test_made_up_cursor_consumes_a_token(client, indexed_books, one_search_per_minute):
+    made_up = client.get(PAGE, params={"limit": 1, "cursor": encode_cursor({"id": "made-up", "offset": 0})})
+    assert made_up.status_code == 200, made_up.text
+    assert client.get(PAGE, params={"limit": 1}).status_code == 429
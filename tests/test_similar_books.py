@@ -0,0 +1,12 @@
+"""
+Parameter validation of the similar-books endpoint.
+"""
+import pytest
+
+from app.core.config import settings
+
+
+@pytest.mark.parametrize("k", [-1, 0, settings.SEARCH_SIMILAR_MAX_K + 1])
+def test_similar_books_rejects_k_out_of_range(client, book_id, k):
+    response = client.get(f"/api/v1/books/{book_id}/similar", params={"k": k})
+    assert response.status_code == 422